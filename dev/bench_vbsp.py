@@ -0,0 +1,705 @@
+"""Benchmark the VBSP map conversion, without needing Portal 2.
+
+This generates PeTI-style maps of increasing size, then runs vbsp.convert_map()
+on each (everything except the original VBSP), recording the time taken by
+each phase and the peak memory use. The converted maps can be compared
+against saved golden copies, so optimisations can't change the output.
+
+Usage:
+    python dev/bench_vbsp.py [CONFIG_DIR] [--sizes small,medium] [--repeat 3]
+        [--golden DIR] [--update-golden] [--regenerate] [--out results.json]
+
+By default this uses the fixed config in dev/bench_data/config/, converts the
+maps saved in dev/bench_data/maps/, and compares the output against
+dev/bench_data/golden/. That only needs this checkout, not Portal 2 or an
+exported game. If a change is meant to alter the output, rerun with
+--update-golden and commit the new copies. --regenerate rebuilds the saved
+maps from generate_map().
+
+CONFIG_DIR can instead be a copy of the bin/bee2/ folder from a game the BEE2
+has exported to (vbsp_config.cfg, instances.cfg, templates, pack_list.cfg...),
+to time a real configuration. The maps are then generated using its
+instances, and are only compared if --golden is passed.
+
+Each map is converted in a separate process, since VBSP keeps state in
+globals.
+
+Micro-benchmarks for individual algorithms can be run instead, without a
+config folder:
+    python dev/bench_vbsp.py --micro grid_optim [--repeat 3]
+"""
+import argparse
+import difflib
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_data')
+DEFAULT_CONFIG = os.path.join(DATA_DIR, 'config')
+# The maps are saved, so changes to generate_map() don't alter the output.
+MAPS_DIR = os.path.join(DATA_DIR, 'maps')
+DEFAULT_GOLDEN = os.path.join(DATA_DIR, 'golden')
+
+from srctools import Property, Vec, VMF
+
+import comp_consts as consts
+import instanceLocs
+
+# Name -> room size in voxels (x, y, z), item count, goo voxels,
+# antline length (in 16-unit segments).
+CORPUS = {
+    'small': ((4, 4, 3), 4, 0, 4),
+    'medium': ((10, 10, 4), 16, 16, 12),
+    'large': ((20, 20, 6), 48, 80, 24),
+    'huge': ((32, 32, 8), 128, 300, 48),
+}
+
+WALL_MATS = [consts.WhitePan.WHITE_1x1, consts.BlackPan.BLACK_1x1]
+FLOOR_MATS = [consts.WhitePan.WHITE_FLOOR, consts.BlackPan.BLACK_FLOOR]
+
+
+def first_inst(name: str) -> str:
+    """Get an instance filename for an item."""
+    return instanceLocs.resolve(name)[0]
+
+
+def add_antline(
+    vmf: VMF,
+    name: str,
+    cells: list,
+    floor_faces: dict,
+) -> None:
+    """Add antline overlays along a path of 16x16 cells on the floor.
+
+    This matches the layout the editor produces, so parse_antlines() can
+    reconstruct them.
+    """
+    def add_overlay(mat: str, mins: Vec, maxs: Vec, angles: str, length: int):
+        origin = (mins + maxs) / 2
+        origin.z = 0
+        face = floor_faces[origin.x // 128, origin.y // 128]
+        over = vmf.create_ent(
+            'info_overlay',
+            material=mat,
+            targetname=name,
+            origin=origin.join(' '),
+            basisorigin=origin.join(' '),
+            basisnormal='0 0 1',
+            basisu='1 0 0',
+            basisv='0 1 0',
+            angles=angles,
+            sides=str(face.id),
+        )
+        for i, (u, v) in enumerate([
+            (-8, -length / 2), (-8, length / 2),
+            (8, length / 2), (8, -length / 2),
+        ]):
+            over['uv{}'.format(i)] = '{:g} {:g} 0'.format(u, v)
+
+    # Corners are wherever the direction changes, straight runs between.
+    run = [cells[0]]
+    direction = None
+    for prev, cell in zip(cells, cells[1:]):
+        new_dir = (cell[0] - prev[0], cell[1] - prev[1])
+        if direction is not None and new_dir != direction:
+            # Finish the run before the corner, then place the corner.
+            corner = run.pop()
+            add_straight(add_overlay, run)
+            corner_pos = Vec(corner[0] * 16 + 8, corner[1] * 16 + 8, 0)
+            add_overlay(
+                consts.Antlines.CORNER,
+                corner_pos - (8, 8, 0), corner_pos + (8, 8, 0),
+                '0 0 0', 16,
+            )
+            run = []
+        run.append(cell)
+        direction = new_dir
+    add_straight(add_overlay, run)
+
+
+def add_straight(add_overlay, run: list) -> None:
+    """Add a straight antline covering these cells."""
+    if not run:
+        return
+    xs = [x for x, y in run]
+    ys = [y for x, y in run]
+    mins = Vec(min(xs) * 16, min(ys) * 16, 0)
+    maxs = Vec(max(xs) * 16 + 16, max(ys) * 16 + 16, 0)
+    along_x = len(set(xs)) > 1
+    add_overlay(
+        consts.Antlines.STRAIGHT,
+        mins, maxs,
+        '0 270 0' if along_x else '0 0 0',
+        16 * len(run),
+    )
+
+
+def generate_map(
+    seed: str,
+    size: tuple,
+    item_count: int,
+    goo_count: int,
+    antline_len: int,
+) -> VMF:
+    """Generate a PeTI-style map."""
+    rand = random.Random(seed)
+    vmf = VMF()
+    size_x, size_y, size_z = size
+
+    air = {
+        (x, y, z)
+        for x in range(size_x)
+        for y in range(size_y)
+        for z in range(size_z)
+    }
+    floor_cells = [(x, y) for x in range(size_x) for y in range(size_y)]
+    rand.shuffle(floor_cells)
+
+    # The entry and exit corridors are outside the room.
+    goo_cells = set(floor_cells[:goo_count])
+    item_cells = floor_cells[goo_count:goo_count + item_count]
+
+    # Solid voxels, with textures facing the room.
+    floor_faces = {}
+    solid = set()
+    for (x, y, z) in air:
+        for off in [
+            (-1, 0, 0), (1, 0, 0), (0, -1, 0),
+            (0, 1, 0), (0, 0, -1), (0, 0, 1),
+        ]:
+            pos = (x + off[0], y + off[1], z + off[2])
+            if pos not in air:
+                solid.add(pos)
+    for pos in sorted(solid):
+        origin = Vec(pos) * 128
+        brush = vmf.make_prism(origin, origin + 128).solid
+        for face in brush.sides:
+            norm = face.normal()
+            neighbour = Vec(pos) - norm
+            if neighbour.as_tuple() not in air:
+                face.mat = consts.Tools.NODRAW
+            elif norm.z < 0:
+                face.mat = rand.choice(FLOOR_MATS)
+                floor_faces[pos[0], pos[1]] = face
+            else:
+                face.mat = rand.choice(WALL_MATS)
+        vmf.add_brush(brush)
+
+    for (x, y) in goo_cells:
+        origin = Vec(x, y, 0) * 128
+        goo = vmf.make_prism(
+            origin, origin + (128, 128, 96),
+            mat=consts.Goo.CHEAP,
+        ).solid
+        vmf.add_brush(goo)
+
+    # Entry and exit corridors, in the -x wall.
+    entry_pos = Vec(-64, 64, 64)
+    exit_pos = Vec(-64, 64 + 128 * (size_y - 1), 64)
+    vmf.create_ent(
+        'func_instance',
+        targetname='entry_corridor',
+        file=first_inst('[spEntryCorr]'),
+        origin=entry_pos.join(' '),
+        angles='0 0 0',
+    ).fixup.update({'no_player_start': '0', 'corr_index': '1'})
+    vmf.create_ent(
+        'func_instance',
+        targetname='exit_corridor',
+        file=first_inst('[spExitCorr]'),
+        origin=exit_pos.join(' '),
+        angles='0 0 0',
+    ).fixup.update({'corr_index': '1'})
+    for pos in [entry_pos, exit_pos]:
+        vmf.create_ent(
+            'func_instance',
+            file=first_inst('[door_frame_sp]'),
+            origin=(pos + (0, 0, 128)).join(' '),
+            angles='0 0 0',
+        )
+    vmf.create_ent(
+        'func_instance',
+        file=first_inst('[spEntry]'),
+        origin=(entry_pos - (1024, 0, 0)).join(' '),
+        angles='0 0 0',
+    )
+    vmf.create_ent(
+        'func_instance',
+        file=first_inst('[spExit]'),
+        origin=(exit_pos - (1024, 0, 0)).join(' '),
+        angles='0 0 0',
+    )
+
+    # Alternate buttons and cubes, with antlines coming from the buttons.
+    for ind, (x, y) in enumerate(item_cells):
+        origin = Vec(x * 128 + 64, y * 128 + 64, 0)
+        if ind % 2:
+            vmf.create_ent(
+                'func_instance',
+                targetname='cube_{}'.format(ind),
+                file=first_inst('<ITEM_CUBE>'),
+                origin=(origin + (0, 0, 20)).join(' '),
+                angles='0 0 0',
+            ).fixup.update({
+                'cube_type': '0',
+                'dropper_enabled': '0',
+            })
+            continue
+        name = 'button_{}'.format(ind)
+        vmf.create_ent(
+            'func_instance',
+            targetname=name,
+            file=first_inst('<ITEM_BUTTON_FLOOR>'),
+            origin=origin.join(' '),
+            angles='0 0 0',
+        ).fixup.update({
+            'connectioncount': '0',
+            'indicator_name': name + '_overlay',
+        })
+        # Walk around the floor, turning occasionally.
+        cell = (x * 8 + rand.randrange(8), y * 8 + rand.randrange(8))
+        cells = [cell]
+        direction = rand.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+        for _ in range(antline_len):
+            if rand.random() < 0.2:
+                direction = direction[1], direction[0]
+            cell = cell[0] + direction[0], cell[1] + direction[1]
+            if (
+                not 0 <= cell[0] < size_x * 8 or
+                not 0 <= cell[1] < size_y * 8 or
+                cell in cells or
+                (cell[0] // 8, cell[1] // 8) in goo_cells
+            ):
+                break
+            cells.append(cell)
+        if len(cells) > 1:
+            add_antline(vmf, name + '_overlay', cells, floor_faces)
+
+    return vmf
+
+
+def read_text(path: str) -> str:
+    """Read a text file, which may be gzipped."""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt') as f:
+            return f.read()
+    with open(path) as f:
+        return f.read()
+
+
+def save_gzip(path: str, text: str) -> None:
+    """Write a gzipped text file.
+
+    The timestamp is left out, so unchanged files stay byte-identical.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        with gzip.GzipFile('', 'wb', fileobj=f, mtime=0) as gz:
+            gz.write(text.encode('utf8'))
+
+
+def canonical_vmf(path: str) -> list:
+    """Read a VMF, producing a sorted list of brushes and entities.
+
+    IDs and ordering aren't meaningful, so they're ignored when comparing.
+    """
+    vmf = VMF.parse(Property.parse(read_text(path), path))
+    blocks = []
+    for obj in vmf.brushes + vmf.entities:
+        buf = io.StringIO()
+        obj.export(buf, ind='')
+        blocks.append(''.join(
+            line + '\n'
+            for line in buf.getvalue().splitlines()
+            if not line.lstrip().startswith('"id"')
+        ))
+    blocks.sort()
+    return blocks
+
+
+def compare_golden(name: str, out_path: str, golden_dir: str, update: bool) -> bool:
+    """Compare the output against the golden copy, or save a new one.
+
+    Returns False if they differ.
+    """
+    golden_path = os.path.join(golden_dir, name + '.vmf.gz')
+    if update or not os.path.isfile(golden_path):
+        save_gzip(golden_path, read_text(out_path))
+        print('  Saved golden output to', golden_path)
+        return True
+    expected = ''.join(canonical_vmf(golden_path))
+    actual = ''.join(canonical_vmf(out_path))
+    if expected == actual:
+        print('  Output matches golden copy.')
+        return True
+    print('  Output differs from golden copy!')
+    diff = difflib.unified_diff(
+        expected.splitlines(), actual.splitlines(),
+        'golden', 'output', lineterm='',
+    )
+    for i, line in enumerate(diff):
+        if i > 60:
+            print('  ...')
+            break
+        print('  ' + line)
+    return False
+
+
+def run_child(map_path: str, out_path: str, result_path: str) -> None:
+    """Convert a single map, in the child process."""
+    import resource
+    import conditions
+    import vbsp
+    import vbsp_profile
+
+    conditions.import_conditions()
+    vbsp.convert_map(map_path, out_path)
+    vbsp_profile.end_phase()
+
+    with open(result_path, 'w') as f:
+        json.dump({
+            'phases': vbsp_profile.PHASES,
+            # Kilobytes on Linux.
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }, f)
+
+
+def random_grid(rand: random.Random, size: int, holes: int) -> dict:
+    """Generate a filled square grid with some rectangular holes."""
+    grid = {(x, y): True for x in range(size) for y in range(size)}
+    for _ in range(holes):
+        x = rand.randrange(size)
+        y = rand.randrange(size)
+        width = rand.randint(1, max(1, size // 4))
+        height = rand.randint(1, max(1, size // 4))
+        for pos_x in range(x, min(size, x + width)):
+            for pos_y in range(y, min(size, y + height)):
+                grid[pos_x, pos_y] = False
+    return grid
+
+
+def check_cover(grid: dict, rects: list) -> None:
+    """Check the rectangles exactly cover the filled cells."""
+    covered = set()
+    for min_x, min_y, max_x, max_y in rects:
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                if (x, y) in covered or not grid.get((x, y)):
+                    raise ValueError('Bad rectangle: {}'.format(
+                        (min_x, min_y, max_x, max_y),
+                    ))
+                covered.add((x, y))
+    if covered != {pos for pos, filled in grid.items() if filled}:
+        raise ValueError('Not all cells are covered!')
+
+
+def micro_grid_optim(repeat: int) -> None:
+    """Compare the greedy and exact rectangle partitions."""
+    import grid_optim
+
+    rand = random.Random('grid_optim')
+    print('{:>6} {:>6} {:>12} {:>12} {:>12} {:>12}'.format(
+        'size', 'holes', 'greedy rects', 'exact rects',
+        'greedy ms', 'exact ms',
+    ))
+    for size, holes in [(8, 4), (16, 12), (32, 40), (64, 150)]:
+        grid = random_grid(rand, size, holes)
+        counts = []
+        times = []
+        for exact in [False, True]:
+            rects = list(grid_optim.optimise(grid, exact))
+            check_cover(grid, rects)
+            counts.append(len(rects))
+            timer = timeit.Timer(lambda: list(grid_optim.optimise(grid, exact)))
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat, number)) / number
+            times.append(best * 1000)
+        print('{:>6} {:>6} {:>12} {:>12} {:>12.3f} {:>12.3f}'.format(
+            size, holes, *counts, *times,
+        ))
+
+
+def micro_template_rotate(repeat: int) -> None:
+    """Compare importing templates with and without the rotation cache."""
+    import template_brush
+
+    rand = random.Random('template_rotate')
+    temp_vmf = VMF()
+    world = []
+    for _ in range(12):
+        mins = Vec(
+            rand.randrange(-8, 8),
+            rand.randrange(-8, 8),
+            rand.randrange(-8, 8),
+        ) * 16
+        world.append(temp_vmf.make_prism(
+            mins, mins + (rand.randint(1, 8) * 16, 64, 32),
+        ).solid)
+    # Templates are usually placed at a few orientations.
+    placements = [
+        (
+            Vec(rand.randrange(-64, 64), rand.randrange(-64, 64), 0) * 128,
+            Vec(0, rand.choice([0, 90, 180, 270]), rand.choice([0, 90])),
+        )
+        for _ in range(500)
+    ]
+    map_vmf = VMF()
+
+    def uncached() -> None:
+        """Copy and rotate the brushes for every import."""
+        for origin, angles in placements:
+            for orig_brush in world:
+                brush = orig_brush.copy(
+                    vmf_file=map_vmf,
+                    side_mapping={},
+                    keep_vis=False,
+                )
+                brush.localise(origin, angles)
+
+    def cached() -> None:
+        """Rotate each orientation once, then copy and translate."""
+        template_brush._ROTATED_BRUSHES.clear()
+        for origin, angles in placements:
+            rot_world, rot_detail, rot_ids = template_brush._rotate_brushes(
+                'bench', {''}, angles, world, [],
+            )
+            for rot_brush in rot_world:
+                brush = rot_brush.copy(
+                    vmf_file=map_vmf,
+                    side_mapping={},
+                    keep_vis=False,
+                )
+                brush.translate(origin)
+                for face in brush:
+                    face.uaxis.offset = (face.uaxis.offset + 1024) % 2048 - 1024
+                    face.vaxis.offset = (face.vaxis.offset + 1024) % 2048 - 1024
+
+    for name, func in [('uncached', uncached), ('cached', cached)]:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print('  {:>10}: {:.1f}ms for {} imports of {} brushes'.format(
+            name, best * 1000, len(placements), len(world),
+        ))
+
+
+def micro_clump_lookup(repeat: int) -> None:
+    """Check and time GenClump's bucketed lookup against a linear scan."""
+    from collections import namedtuple
+    import texturing
+
+    Tile = namedtuple('Tile', 'pos normal')
+    rand = random.Random('clump_lookup')
+
+    def linear_scan(gen: texturing.GenClump, loc: Vec):
+        """The original lookup, checking every clump in order."""
+        for clump in gen._clump_locs:
+            if (
+                clump.x1 <= loc.x <= clump.x2 and
+                clump.y1 <= loc.y <= clump.y2 and
+                clump.z1 <= loc.z <= clump.z2
+            ):
+                return clump.seed
+        return None
+
+    for size in [8, 16, 32]:
+        # A random floor, with locations both on and off it.
+        tiles = [
+            Tile(Vec(x, y, 0) * 128 + 64, Vec(0, 0, 1))
+            for x in range(size)
+            for y in range(size)
+            if rand.random() < 0.8
+        ]
+        gen = texturing.GenClump(
+            texturing.GenCat.NORMAL,
+            texturing.Orient.FLOOR,
+            texturing.Portalable.WHITE,
+            {'clump_length': 4, 'clump_width': 2, 'clump_debug': False},
+            {},
+        )
+        gen.setup('bench_{}'.format(size), tiles)
+        locs = [
+            Vec(
+                rand.randrange(-2, size + 2),
+                rand.randrange(-2, size + 2),
+                rand.randrange(-1, 2),
+            ) * 128 + 64
+            for _ in range(2000)
+        ]
+        mismatches = sum(
+            gen._find_clump(loc) != linear_scan(gen, loc)
+            for loc in locs
+        )
+        times = []
+        for func in [linear_scan, texturing.GenClump._find_clump]:
+            best = min(timeit.repeat(
+                lambda: [func(gen, loc) for loc in locs],
+                number=1, repeat=repeat,
+            ))
+            times.append(best * 1000)
+        print(
+            '  {0}x{0}: {1} clumps, {2} mismatches, '
+            'linear {3:.2f}ms, bucketed {4:.2f}ms for {5} lookups'.format(
+                size, len(gen._clump_locs), mismatches, *times, len(locs),
+            )
+        )
+        if mismatches:
+            raise ValueError('Bucketed lookups differ from the linear scan!')
+
+
+# Name -> function(repeat), for --micro.
+MICRO = {
+    'grid_optim': micro_grid_optim,
+    'template_rotate': micro_template_rotate,
+    'clump_lookup': micro_clump_lookup,
+}
+
+
+def main(argv: list) -> int:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the VBSP map conversion.',
+    )
+    parser.add_argument(
+        'config', nargs='?', default=DEFAULT_CONFIG,
+        help='A copy of the bin/bee2/ folder to use. '
+             'Defaults to the fixed config in dev/bench_data/config/.',
+    )
+    parser.add_argument(
+        '--sizes', default=','.join(CORPUS),
+        help='Comma-separated maps to run, from: ' + ', '.join(CORPUS),
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=1,
+        help='Run each map this many times, keeping the fastest.',
+    )
+    parser.add_argument(
+        '--golden',
+        help='Folder with golden copies of the output to compare to. '
+             'Defaults to dev/bench_data/golden/ with the fixed config.',
+    )
+    parser.add_argument(
+        '--update-golden', action='store_true',
+        help='Overwrite the golden copies with the new output.',
+    )
+    parser.add_argument(
+        '--regenerate', action='store_true',
+        help='Rebuild the saved maps in dev/bench_data/maps/.',
+    )
+    parser.add_argument('--out', help='Write the results to this JSON file.')
+    parser.add_argument(
+        '--micro', action='append', choices=sorted(MICRO),
+        help='Run this micro-benchmark instead of converting maps.',
+    )
+    args = parser.parse_args(argv)
+
+    if args.micro:
+        for name in args.micro:
+            print(name + ':')
+            MICRO[name](args.repeat)
+        return 0
+    missing = [
+        filename for filename in
+        ['vbsp_config.cfg', 'instances.cfg', 'pack_list.cfg', 'templates.vmf']
+        if not os.path.isfile(os.path.join(args.config, filename))
+    ]
+    if missing:
+        parser.error('Config folder is missing: ' + ', '.join(missing))
+
+    # The saved maps use the instances from the fixed config.
+    use_saved = os.path.samefile(args.config, DEFAULT_CONFIG)
+    if args.golden is None and use_saved:
+        args.golden = DEFAULT_GOLDEN
+
+    with open(os.path.join(args.config, 'instances.cfg')) as f:
+        instanceLocs.load_conf(Property.parse(f, 'instances.cfg'))
+
+    results = {}
+    matches = True
+    with tempfile.TemporaryDirectory(prefix='bee2_bench_') as work_dir:
+        shutil.copytree(args.config, os.path.join(work_dir, 'bee2'))
+        os.makedirs(os.path.join(work_dir, 'maps', 'styled'))
+
+        for name in args.sizes.split(','):
+            size, items, goo, antline_len = CORPUS[name]
+            map_path = os.path.join(work_dir, 'maps', name + '.vmf')
+            out_path = os.path.join(work_dir, 'maps', 'styled', name + '.vmf')
+            result_path = os.path.join(work_dir, name + '.json')
+            saved_path = os.path.join(MAPS_DIR, name + '.vmf.gz')
+            if use_saved and not args.regenerate and os.path.isfile(saved_path):
+                map_text = read_text(saved_path)
+            else:
+                buf = io.StringIO()
+                generate_map(name, size, items, goo, antline_len).export(buf)
+                map_text = buf.getvalue()
+                if use_saved:
+                    save_gzip(saved_path, map_text)
+                    print('  Saved map to', saved_path)
+            with open(map_path, 'w') as f:
+                f.write(map_text)
+
+            print('{}: {} voxels, {} items, {} goo, antlines {} long'.format(
+                name, size, items, goo, antline_len,
+            ))
+            best = None
+            for _ in range(args.repeat):
+                subprocess.run(
+                    [
+                        sys.executable, os.path.abspath(__file__),
+                        '--child', map_path, out_path, result_path,
+                    ],
+                    cwd=work_dir,
+                    env=dict(os.environ, PYTHONPATH=SRC_DIR),
+                    check=True,
+                )
+                with open(result_path) as f:
+                    result = json.load(f)
+                if best is None:
+                    best = result
+                else:
+                    # Keep the fastest time for each phase.
+                    best['phases'] = [
+                        [phase, min(old_time, new_time)]
+                        for (phase, old_time), (_, new_time) in
+                        zip(best['phases'], result['phases'])
+                    ]
+                    best['peak_rss_kb'] = max(
+                        best['peak_rss_kb'],
+                        result['peak_rss_kb'],
+                    )
+            best['total'] = sum(time for phase, time in best['phases'])
+            results[name] = best
+
+            for phase, time in best['phases']:
+                print('  {:>24}: {:.3f}s'.format(phase, time))
+            print('  {:>24}: {:.3f}s'.format('total', best['total']))
+            print('  {:>24}: {:.1f}MB'.format(
+                'peak memory', best['peak_rss_kb'] / 1024,
+            ))
+
+            if args.golden:
+                if not compare_golden(
+                    name, out_path,
+                    args.golden, args.update_golden,
+                ):
+                    matches = False
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 0 if matches else 1
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        run_child(*sys.argv[2:5])
+    else:
+        sys.exit(main(sys.argv[1:]))
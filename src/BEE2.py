@@ -44,6 +44,8 @@ DEFAULT_SETTINGS = {
         'log_missing_ent_count': '0',
         # Warn if a file is missing that a packfile refers to
         'log_incorrect_packfile': '0',
+        # Read packages using multiple threads
+        'parallel_package_load': '1',
 
         # Show the log window on startup
         'show_log_win': '0',
@@ -93,6 +95,7 @@ pack_data, package_sys = packageLoader.load_packages(
         'Debug', 'log_incorrect_packfile'),
     has_tag_music=gameMan.MUSIC_TAG_LOC is not None,
     has_mel_music=gameMan.MUSIC_MEL_VPK is not None,
+    parallel=GEN_OPTS.get_bool('Debug', 'parallel_package_load'),
 )
 
 # Load filesystems into various modules
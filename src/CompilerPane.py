@@ -43,6 +43,8 @@ COMPILE_DEFAULTS = {
         'use_voice_priority': '1',
         'packfile_dump_dir': '',
         'packfile_dump_enable': '0',
+        'profile_compile': '0',
+        'profile_cprofile': '0',
     },
     'Corridor': {
         'sp_entry': '1',
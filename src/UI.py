@@ -36,7 +36,7 @@ import backup as backup_win
 import tooltip
 import signage_ui
 
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 
 LOGGER = srctools.logger.get_logger(__name__)
@@ -169,6 +169,8 @@ class Item:
         self.filter_tags.add(
             tagsPane.add_tag(Section.PACK, self.pak_id, pretty=self.pak_name)
         )
+        # The tag index uses the old filter_tags.
+        tagsPane.invalidate_index()
 
     def get_icon(self, subKey, allow_single=False, single_num=1):
         """Get an icon for the given subkey.
@@ -299,6 +301,8 @@ class PalItem(Label):
         self.visible = True
         # Used to distinguish between picker and palette items
         self.is_pre = is_pre
+        # Where flow_picker() last placed us, or None if hidden.
+        self.picker_pos: Optional[Tuple[int, int]] = None
         self.needs_unlock = item.item.needs_unlock
         self.load_data()
 
@@ -444,6 +448,7 @@ def quit_application() -> None:
     item_opts.save_check()
     CompilerPane.COMPILE_CFG.save_check()
     gameMan.save()
+    img.save_icon_cache()
 
     # Destroy the TK windows
     TK_ROOT.quit()
@@ -1582,15 +1587,18 @@ def flow_picker(e=None):
         width = 1  # we got way too small, prevent division by zero
     vis_items = [it for it in pal_items if it.visible]
     num_items = len(vis_items)
+    # Only move items which have changed position.
     for i, item in enumerate(vis_items):
         item.is_pre = False
-        item.place(
-            x=((i % width) * 65 + 1),
-            y=((i // width) * 65 + 1),
-            )
-
-    for item in (it for it in pal_items if not it.visible):
-        item.place_forget()
+        pos = ((i % width) * 65 + 1, (i // width) * 65 + 1)
+        if item.picker_pos != pos:
+            item.place(x=pos[0], y=pos[1])
+            item.picker_pos = pos
+
+    for item in pal_items:
+        if not item.visible and item.picker_pos is not None:
+            item.place_forget()
+            item.picker_pos = None
     height = (num_items // width + 1) * 65 + 2
     pal_canvas['scrollregion'] = (
         0,
@@ -2026,6 +2034,7 @@ def init_windows() -> None:
 
         for item in itertools.chain(item_list.values(), pal_picked, pal_items):
             item.load_data()  # Refresh everything
+        tagsPane.build_index()
 
         # Update variant selectors on the itemconfig pane
         for func in itemconfig.ITEM_VARIANT_LOAD:
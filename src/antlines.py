@@ -5,7 +5,6 @@ from collections import namedtuple
 from srctools import Vec, Property, conv_float, Entity, VMF, logger
 from srctools.vmf import overlay_bounds, make_overlay
 import comp_consts as const
-from collections import defaultdict
 from typing import List, Dict, Tuple, TYPE_CHECKING, Iterator, Optional, Set
 
 from enum import Enum
@@ -326,6 +325,14 @@ class Antline:
         )
 
 
+def _point_key(name_id: int, point: Vec) -> Tuple[int, int, int, int]:
+    """Compute the join_points key for a position on an antline.
+
+    Points are always on the 8-unit grid, so integers are exact.
+    """
+    return name_id, round(point.x), round(point.y), round(point.z)
+
+
 def parse_antlines(vmf: VMF) -> Tuple[
     Dict[str, List[Antline]],
     Dict[int, List[Segment]]
@@ -340,15 +347,19 @@ def parse_antlines(vmf: VMF) -> Tuple[
 
     LOGGER.info('Parsing antlines...')
 
-    # segment -> found neighbours of it.
-    overlay_joins = defaultdict(set)  # type: Dict[Segment, Set[Segment]]
+    # All the segments we found, segments are referred to by index in here.
+    segments = []  # type: List[Segment]
+    seg_names = []  # type: List[str]
+    # segment index -> indexes of found neighbours of it.
+    overlay_joins = []  # type: List[Set[int]]
 
-    segment_to_name = {}  # type: Dict[Segment, str]
+    # Targetnames are swapped for an integer ID, so keys hash quickly.
+    name_ids = {}  # type: Dict[str, int]
 
     # Points on antlines where two can connect. For corners that's each side,
     # for straight it's each end. Combine that with the targetname
     # so we only join related antlines.
-    join_points = {}  # type: Dict[Tuple[str, float, float, float], Segment]
+    join_points = {}  # type: Dict[Tuple[int, int, int, int], int]
 
     mat_straight = const.Antlines.STRAIGHT
     mat_corner = const.Antlines.CORNER
@@ -406,8 +417,14 @@ def parse_antlines(vmf: VMF) -> Tuple[
             # It's not an antline.
             continue
 
+        over_name = over['targetname']
+        name_id = name_ids.setdefault(over_name, len(name_ids))
+
+        seg_ind = len(segments)
         seg = Segment(seg_type, normal, start, end)
-        segment_to_name[seg] = over_name = over['targetname']
+        segments.append(seg)
+        seg_names.append(over_name)
+        overlay_joins.append(set())
 
         for side_id in over['sides'].split():
             side_to_seg.setdefault(int(side_id), []).append(seg)
@@ -416,43 +433,74 @@ def parse_antlines(vmf: VMF) -> Tuple[
             # Lookup the point to see if we've already checked it.
             # If not, write us into that spot.
             neighbour = join_points.setdefault(
-                (over_name, point.x, point.y, point.z),
-                seg,
+                _point_key(name_id, point),
+                seg_ind,
             )
-            if neighbour is seg:
+            if neighbour == seg_ind:
                 # None found
                 continue
-            overlay_joins[neighbour].add(seg)
-            overlay_joins[seg].add(neighbour)
+            overlay_joins[neighbour].add(seg_ind)
+            overlay_joins[seg_ind].add(neighbour)
 
         # Remove original from the map.
         over.remove()
 
     # Now fix the square straight segments.
-    for seg, over_name in segment_to_name.items():
+    for seg_ind, seg in enumerate(segments):
         if seg.type is SegType.STRAIGHT and seg.start == seg.end:
-            fix_single_straight(seg, over_name, join_points, overlay_joins)
-
-    # Now, finally compute each continuous section.
-    for segment, over_name in segment_to_name.items():
-        try:
-            neighbours = overlay_joins[segment]
-        except KeyError:
-            continue  # Done already.
+            fix_single_straight(
+                seg, seg_ind,
+                name_ids[seg_names[seg_ind]],
+                join_points,
+                overlay_joins,
+            )
 
+    # Group connected segments together, with a union-find.
+    parents = list(range(len(segments)))
+
+    def find_root(ind: int) -> int:
+        """Find the representative segment for this group."""
+        root = ind
+        while parents[root] != root:
+            root = parents[root]
+        # Compress the path, so later lookups are quick.
+        while parents[ind] != root:
+            parents[ind], ind = root, parents[ind]
+        return root
+
+    for seg_ind, neighbours in enumerate(overlay_joins):
+        for neighbour in neighbours:
+            root_a = find_root(seg_ind)
+            root_b = find_root(neighbour)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    # Now, finally compute each continuous section. Each starts from the first
+    # segment with only one neighbour - the end of the line. Groups without an
+    # end (loops, or loose segments) are skipped.
+    done_groups = set()  # type: Set[int]
+    for seg_ind, neighbours in enumerate(overlay_joins):
         if len(neighbours) != 1:
             continue
-        # Found a start point!
-        segments = [segment]
-
-        for segment in segments:
-            neighbours = overlay_joins.pop(segment)
-            # Except KeyError: this segment's already done??
-            for neighbour in neighbours:
-                if neighbour not in segments:
-                    segments.append(neighbour)
-
-        antlines.setdefault(over_name, []).append(Antline(over_name, segments))
+        root = find_root(seg_ind)
+        if root in done_groups:
+            continue
+        done_groups.add(root)
+
+        # Found a start point, walk along the path to put them in order.
+        path = [seg_ind]
+        visited = {seg_ind}
+        for path_ind in path:
+            for neighbour in sorted(overlay_joins[path_ind]):
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    path.append(neighbour)
+
+        over_name = seg_names[seg_ind]
+        antlines.setdefault(over_name, []).append(Antline(
+            over_name,
+            [segments[ind] for ind in path],
+        ))
 
     LOGGER.info('Done! ({} antlines)'.format(sum(map(len, antlines.values()))))
     return antlines, side_to_seg
@@ -460,9 +508,10 @@ def parse_antlines(vmf: VMF) -> Tuple[
 
 def fix_single_straight(
     seg: Segment,
-    over_name: str,
-    join_points: Dict[Tuple[str, float, float, float], Segment],
-    overlay_joins: Dict[Segment, Set[Segment]],
+    seg_ind: int,
+    name_id: int,
+    join_points: Dict[Tuple[int, int, int, int], int],
+    overlay_joins: List[Set[int]],
 ) -> None:
     """Figure out the correct rotation for 1-long straight antlines."""
     # Check the U and V axis, to see if there's another antline on both
@@ -479,12 +528,12 @@ def fix_single_straight(
     ]:
         pos = center + off
         try:
-            neigh = join_points[over_name, pos.x, pos.y, pos.z]
+            neigh = join_points[_point_key(name_id, pos)]
         except KeyError:
             continue
 
-        overlay_joins[seg].add(neigh)
-        overlay_joins[neigh].add(seg)
+        overlay_joins[seg_ind].add(neigh)
+        overlay_joins[neigh].add(seg_ind)
 
         off_min = center - abs(off)
         off_max = center + abs(off)
@@ -500,7 +549,7 @@ def fix_single_straight(
             # The other side is also present. Only override if we are on both
             # sides.
             opposite = center - off
-            if (over_name, opposite.x, opposite.y, opposite.z) in join_points:
+            if _point_key(name_id, opposite) in join_points:
                 seg.start = off_min
                 seg.end = off_max
         # Else: Both equal, we're fine.
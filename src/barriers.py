@@ -327,7 +327,10 @@ def make_barriers(vmf: VMF):
 
         u_axis, v_axis = Vec.INV_AXIS[norm_axis]
 
-        for min_u, min_v, max_u, max_v in grid_optimise(dict.fromkeys(pos_slice, True)):
+        for min_u, min_v, max_u, max_v in grid_optimise(
+            dict.fromkeys(pos_slice, True),
+            vbsp_options.get(bool, 'exact_brush_merge'),
+        ):
             # These are two points in the origin plane, at the borders.
             pos_min = Vec.with_axes(
                 norm_axis, plane_pos,
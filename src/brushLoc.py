@@ -1,7 +1,7 @@
 """Holds data about the contents of each grid position in the map.
 
 """
-from collections import deque
+import re
 
 from srctools import Vec, Vec_tuple, VMF
 from enum import Enum
@@ -10,15 +10,11 @@ import srctools.logger
 import bottomlessPit
 
 from typing import (
-    Union, Any, Tuple,
+    Union, Any, Tuple, Optional,
     Iterable, Iterator,
     Dict, ItemsView, MutableMapping,
-    List,
+    List, FrozenSet,
 )
-try:
-    from typing import Deque
-except ImportError:
-    from typing_extensions import Deque
 
 
 LOGGER = srctools.logger.get_logger(__name__)
@@ -132,6 +128,31 @@ BLOCK_LOOKUP['pit'] = {
 
 _grid_keys = Union[Vec, Tuple[float, float, float], slice]
 
+# Positions in this range are stored in a dense array, others in a dict.
+# This includes a 1-block border around the area fill_air() may fill, so
+# neighbours of filled blocks never wrap around to the other side.
+_DENSE_MIN = -16
+_DENSE_MAX = 41
+_DENSE_SIZE = _DENSE_MAX - _DENSE_MIN + 1
+_DENSE_LEN = _DENSE_SIZE ** 3
+# Offsets in the array for each axis.
+_STRIDE_X = _DENSE_SIZE ** 2
+_STRIDE_Y = _DENSE_SIZE
+_STRIDE_Z = 1
+# Array value for positions which aren't set.
+_UNSET = 255
+_RE_SET_POS = re.compile(b'[^\xff]')
+_RE_MASK_POS = re.compile(b'\x01')
+_RE_RAY_STOP = re.compile(b'[cv]')
+
+_BLOCK_FOR_VALUE: List[Optional['Block']] = [None] * 256
+for _block in Block:
+    _BLOCK_FOR_VALUE[_block.value] = _block
+del _block
+
+# Translation tables for raycast(), for each set of colliding blocks.
+_RAY_TABLES: Dict[FrozenSet[Block], bytes] = {}
+
 
 def _conv_key(pos: _grid_keys) -> Tuple[float, float, float]:
     """Convert the key given in [] to a grid-position, as a x,y,z tuple."""
@@ -147,9 +168,113 @@ def _conv_key(pos: _grid_keys) -> Tuple[float, float, float]:
     return x, y, z
 
 
+def _dense_index(pos: Tuple[float, float, float]) -> int:
+    """Return the index in the dense array for a position, or -1 if outside."""
+    x, y, z = pos
+    if (
+        _DENSE_MIN <= x <= _DENSE_MAX and
+        _DENSE_MIN <= y <= _DENSE_MAX and
+        _DENSE_MIN <= z <= _DENSE_MAX and
+        x % 1 == y % 1 == z % 1 == 0
+    ):
+        return (
+            (int(x) - _DENSE_MIN) * _STRIDE_X +
+            (int(y) - _DENSE_MIN) * _STRIDE_Y +
+            (int(z) - _DENSE_MIN)
+        )
+    return -1
+
+
+def _dense_pos(index: int) -> Vec:
+    """Return the position for an index in the dense array."""
+    x, rem = divmod(index, _STRIDE_X)
+    y, z = divmod(rem, _STRIDE_Y)
+    return Vec(x + _DENSE_MIN, y + _DENSE_MIN, z + _DENSE_MIN)
+
+
+def _mask_table(values: Iterable[int]) -> bytes:
+    """Build a translation table mapping the values to 1, and others to 0."""
+    table = bytearray(256)
+    for val in values:
+        table[val] = 1
+    return bytes(table)
+
+
+def _ray_table(collide: FrozenSet[Block]) -> bytes:
+    """Build the raycast() translation table for these colliding blocks.
+
+    VOID and unset positions become "v", colliding blocks "c" and
+    everything else ".".
+    """
+    try:
+        return _RAY_TABLES[collide]
+    except KeyError:
+        pass
+    table = bytearray(b'.' * 256)
+    for block in collide:
+        table[block.value] = ord('c')
+    table[Block.VOID.value] = table[_UNSET] = ord('v')
+    table = _RAY_TABLES[collide] = bytes(table)
+    return table
+
+
+# The blocks within the region fill_air() is allowed to fill, as a mask.
+# Masks are ints with a byte for each position in the dense array,
+# set to 1 or 0. That allows bitwise operations to process every position
+# at once.
+_INTERIOR_MASK = int.from_bytes(bytes(
+    (_DENSE_MIN < x < _DENSE_MAX and _DENSE_MIN < y < _DENSE_MAX and _DENSE_MIN < z < _DENSE_MAX)
+    for x in range(_DENSE_MIN, _DENSE_MAX + 1)
+    for y in range(_DENSE_MIN, _DENSE_MAX + 1)
+    for z in range(_DENSE_MIN, _DENSE_MAX + 1)
+), 'little')
+_ALL_MASK = int.from_bytes(b'\x01' * _DENSE_LEN, 'little')
+_SOLID_TABLE = _mask_table([Block.SOLID.value, Block.EMBED.value])
+_PIT_TABLE = _mask_table([block.value for block in BLOCK_LOOKUP['pit']])
+_UNSET_TABLE = _mask_table([_UNSET])
+# Air pockets need to be filled, and bottomless pits.
+# Otherwise we could have those appearing next to real goo pits,
+# with complicated room heights.
+_GOO_FILLABLE = frozenset({
+    Block.AIR,
+    Block.OCCUPIED,
+    Block.PIT_BOTTOM,
+    Block.PIT_MID,
+    Block.PIT_TOP,
+    Block.PIT_SINGLE,
+})
+_GOO_FILLABLE_TABLE = _mask_table([_UNSET] + [block.value for block in _GOO_FILLABLE])
+
+
+def _to_mask(data: bytes, table: bytes) -> int:
+    """Convert the array into a mask, using a table from _mask_table()."""
+    return int.from_bytes(data.translate(table), 'little')
+
+
+def _mask_indexes(mask: int) -> Iterator[int]:
+    """Yield the array indexes set in a mask."""
+    for match in _RE_MASK_POS.finditer(mask.to_bytes(_DENSE_LEN, 'little')):
+        yield match.start()
+
+
+def _dilate(mask: int, up: bool=True) -> int:
+    """Expand the mask into each neighbouring position.
+
+    If up is False, don't expand in the +z direction.
+    """
+    result = (
+        mask << (8 * _STRIDE_X) | mask >> (8 * _STRIDE_X) |
+        mask << (8 * _STRIDE_Y) | mask >> (8 * _STRIDE_Y) |
+        mask >> (8 * _STRIDE_Z)
+    )
+    if up:
+        result |= mask << (8 * _STRIDE_Z)
+    return result & _ALL_MASK
+
+
 class _GridItemsView(ItemsView[Vec, Block]):
     """Implements the Grid.items() view, providing a view over the pos, block pairs."""
-    def __init__(self, grid: Dict[Vec_tuple, Block]):
+    def __init__(self, grid: 'Grid'):
         self._grid = grid
 
     def __len__(self) -> int:
@@ -157,14 +282,10 @@ class _GridItemsView(ItemsView[Vec, Block]):
 
     def __contains__(self, item: Any) -> bool:
         pos, block = item
-        try:
-            return block is self._grid[_conv_key(pos)]
-        except KeyError:
-            return False
+        return pos in self._grid and block is self._grid[pos]
 
     def __iter__(self) -> Iterator[Tuple[Vec, Block]]:
-        for pos, block in self._grid.items():
-            yield (Vec(pos), block)
+        yield from self._grid._iter_items()
 
 
 class Grid(MutableMapping[_grid_keys, Block]):
@@ -172,9 +293,15 @@ class Grid(MutableMapping[_grid_keys, Block]):
 
     When doing lookups, the key can be prefixed with 'world': to treat
     as a world position.
+
+    Positions inside the main area of the map are stored in a dense array
+    of block values, so operations like fill_air() and raycast() can process
+    many positions at once. Positions outside are kept in a dict.
     """
     def __init__(self) -> None:
-        self._grid: Dict[Vec_tuple, Block] = {}
+        self._dense = bytearray([_UNSET]) * _DENSE_LEN
+        self._dense_count = 0
+        self._sparse: Dict[Vec_tuple, Block] = {}
 
     def raycast(
         self,
@@ -202,9 +329,44 @@ class Grid(MutableMapping[_grid_keys, Block]):
         collide_set = frozenset(collide)
         # 50x50x50 diagonal = 86, so that's the largest distance
         # you could possibly move.
-        for i in range(90):
+        moves = 90
+
+        # For axis-aligned rays, scan along the dense array directly.
+        index = _dense_index(pos)
+        if index != -1 and sorted(map(abs, direction)) == [0, 0, 1]:
+            if direction.x:
+                step, axis_pos = _STRIDE_X * int(direction.x), pos.x
+            elif direction.y:
+                step, axis_pos = _STRIDE_Y * int(direction.y), pos.y
+            else:
+                step, axis_pos = _STRIDE_Z * int(direction.z), pos.z
+            if step > 0:
+                dist = int(_DENSE_MAX - axis_pos)
+            else:
+                dist = int(axis_pos - _DENSE_MIN)
+        else:
+            dist = 0
+        if dist > 0:
+            stop = index + step * (dist + 1)
+            run = self._dense[index + step: stop if stop >= 0 else None: step]
+            match = _RE_RAY_STOP.search(run.translate(_ray_table(collide_set)))
+            if match is not None:
+                if match.group() == b'v':
+                    raise ValueError(
+                        'Reached VOID at ({}) when '
+                        'raycasting from {} with direction {}!'.format(
+                            pos + direction * (match.start() + 1),
+                            start_pos, direction,
+                        )
+                    )
+                return pos + direction * match.start()
+            # Off the edge, continue normally.
+            pos = pos + direction * dist
+            moves -= dist
+
+        for i in range(moves):
             next_pos = pos + direction
-            block = super().get(next_pos.as_tuple(), Block.VOID)
+            block = self[next_pos.as_tuple()]
             if block is Block.VOID:
                 raise ValueError(
                     'Reached VOID at ({}) when '
@@ -231,7 +393,11 @@ class Grid(MutableMapping[_grid_keys, Block]):
         return g2w(self.raycast(w2g(pos), direction, collide))
 
     def __getitem__(self, pos: _grid_keys) -> Block:
-        return self._grid.get(_conv_key(pos), Block.VOID)
+        key = _conv_key(pos)
+        index = _dense_index(key)
+        if index != -1:
+            return _BLOCK_FOR_VALUE[self._dense[index]] or Block.VOID
+        return self._sparse.get(key, Block.VOID)
 
     def __setitem__(self, pos: _grid_keys, value: Block) -> None:
         if type(value) is not Block:
@@ -239,22 +405,51 @@ class Grid(MutableMapping[_grid_keys, Block]):
                 type(value).__name__,
             ))
 
-        self._grid[_conv_key(pos)] = value
+        key = _conv_key(pos)
+        index = _dense_index(key)
+        if index != -1:
+            if self._dense[index] == _UNSET:
+                self._dense_count += 1
+            self._dense[index] = value.value
+        else:
+            self._sparse[key] = value
 
     def __delitem__(self, pos: _grid_keys) -> None:
-        del self._grid[_conv_key(pos)]
+        key = _conv_key(pos)
+        index = _dense_index(key)
+        if index != -1:
+            if self._dense[index] == _UNSET:
+                raise KeyError(key)
+            self._dense[index] = _UNSET
+            self._dense_count -= 1
+        else:
+            del self._sparse[key]
 
     def __contains__(self, pos: object) -> bool:
-        return _conv_key(pos) in self._grid
+        key = _conv_key(pos)
+        index = _dense_index(key)
+        if index != -1:
+            return self._dense[index] != _UNSET
+        return key in self._sparse
 
     def __iter__(self) -> Iterator[Vec]:
-        yield from map(Vec, self._grid)
+        for pos, block in self._iter_items():
+            yield pos
 
     def __len__(self) -> int:
-        return len(self._grid)
+        return self._dense_count + len(self._sparse)
 
     def items(self) -> '_GridItemsView':
-        return _GridItemsView(self._grid)
+        return _GridItemsView(self)
+
+    def _iter_items(self) -> Iterator[Tuple[Vec, Block]]:
+        """Iterate over all set positions, and their blocks."""
+        dense = self._dense
+        for match in _RE_SET_POS.finditer(dense):
+            index = match.start()
+            yield _dense_pos(index), _BLOCK_FOR_VALUE[dense[index]]
+        for pos, block in self._sparse.items():
+            yield Vec(pos), block
 
     def read_from_map(self, vmf: VMF, has_attr: Dict[str, bool]) -> None:
         """Given the map file, set blocks."""
@@ -370,69 +565,87 @@ class Grid(MutableMapping[_grid_keys, Block]):
         cover all playable space.
 
         This will also fill the submerged tunnels with goo.
-        """
-        queue: Deque[Tuple[Vec, bool]] = deque(search_locs)
-
-        def iterdel() -> Iterator[Tuple[Vec, bool]]:
-            """Iterate as FIFO queue, deleting as we go."""
-            try:
-                while True:
-                    yield queue.popleft()
-            except IndexError:  # We're empty!
-                return
-
-        # Air pockets need to be filled, and bottomless pits.
-        # Otherwise we could have those appearing next to real goo pits,
-        # with complicated room heights.
-        goo_fillable = [
-            Block.AIR,
-            Block.OCCUPIED,
-            Block.PIT_BOTTOM,
-            Block.PIT_MID,
-            Block.PIT_TOP,
-            Block.PIT_SINGLE,
-        ]
-
-        # This will iterate every item we add to the queue..
-        for pos, is_goo in iterdel():
-            # Already set. But allow the goo to fill certain types.
-            if pos in self and not (is_goo and self[pos] in goo_fillable):
-                continue
 
-            # We got outside the map somehow?
-            # There's a buffer region since large embedded areas may
-            # be interpreted as small air pockets, that's fine.
-            if not ((-15, -15, -15) <= pos <= (40, 40, 40)):
-                LOGGER.warning('Attempted leak at {}', pos)
-                continue
-
-            # For go we need to determine which kind to use.
-            # We only fill from underneath the surface, so
-            # use "mid" even for toplevel pits.
-            if is_goo:
-                if self[pos].is_pit:
-                    self[pos] = Block.from_pitgoo_attr(
-                        False,
-                        self[pos].is_top,
-                        self[pos].is_bottom,
-                    )
-                elif self[pos.x, pos.y - 1, pos.z].is_solid:
-                    self[pos] = Block.GOO_BOTTOM
+        Each step expands every position reached so far at once, using masks
+        of the dense array. Goo expands before air on each step, and can
+        overwrite air. Air can't pass through goo which was already placed.
+        This matches a breadth-first fill with the goo locations queued first.
+        """
+        dense = bytes(self._dense)
+        goo_seeds = air_seeds = 0
+        leak_pos: List[Vec] = []
+
+        for pos, is_goo in search_locs:
+            index = _dense_index(pos)
+            if index != -1:
+                if is_goo:
+                    goo_seeds |= 1 << (8 * index)
                 else:
-                    self[pos] = Block.GOO_MID
-            else:
-                self[pos] = Block.AIR
+                    air_seeds |= 1 << (8 * index)
+            elif pos not in self or (is_goo and self[pos] in _GOO_FILLABLE):
+                leak_pos.append(pos)
+
+        unset = _to_mask(dense, _UNSET_TABLE)
+        goo_fillable = _to_mask(dense, _GOO_FILLABLE_TABLE)
+        # Positions outside the fill area that we'd try to enter.
+        air_border = unset & ~_INTERIOR_MASK
+        goo_border = goo_fillable & ~_INTERIOR_MASK
+        leaks = goo_seeds & goo_border | air_seeds & air_border
+        air_fillable = unset & _INTERIOR_MASK
+        goo_fillable &= _INTERIOR_MASK
+
+        goo_found = air_found = 0
+        goo_front = goo_seeds & goo_fillable
+        air_front = air_seeds & air_fillable
+        while goo_front or air_front:
+            goo_found |= goo_front
+            air_front &= ~goo_found
+            air_found |= air_front
 
-            x, y, z = pos
             # Continue filling in each other direction.
             # But not up for goo.
-            if not is_goo:
-                queue.append((Vec(x, y, z + 1), is_goo))
-            queue.append((Vec(x, y + 1, z), is_goo))
-            queue.append((Vec(x, y - 1, z), is_goo))
-            queue.append((Vec(x + 1, y, z), is_goo))
-            queue.append((Vec(x - 1, y, z), is_goo))
-            queue.append((Vec(x, y, z - 1), is_goo))
+            goo_next = _dilate(goo_front, up=False)
+            air_next = _dilate(air_front)
+            leaks |= goo_next & goo_border | air_next & air_border
+            goo_front = goo_next & goo_fillable & ~goo_found
+            air_front = air_next & air_fillable & ~air_found & ~goo_found
+
+        leak_pos.extend(map(_dense_pos, _mask_indexes(leaks)))
+        for pos in leak_pos:
+            # We got outside the map somehow?
+            # There's a buffer region since large embedded areas may
+            # be interpreted as small air pockets, that's fine.
+            LOGGER.warning('Attempted leak at {}', pos)
+
+        # For goo we need to determine which kind to use.
+        # We only fill from underneath the surface, so
+        # use "mid" even for toplevel pits.
+        pits = goo_found & _to_mask(dense, _PIT_TABLE)
+        goo_bottom = (
+            goo_found & ~pits &
+            _to_mask(dense, _SOLID_TABLE) << (8 * _STRIDE_Y)
+        )
+        goo_mid = goo_found & ~pits & ~goo_bottom
+        air = air_found & ~goo_found
+        filled = goo_found | air
+
+        # Each byte in the masks is 0 or 1, so multiplying sets the value
+        # for all of those positions.
+        new_values = (
+            air * Block.AIR.value |
+            goo_mid * Block.GOO_MID.value |
+            goo_bottom * Block.GOO_BOTTOM.value
+        )
+        result = int.from_bytes(dense, 'little') & ~(filled * 0xFF) | new_values
+        self._dense[:] = result.to_bytes(_DENSE_LEN, 'little')
+        for index in _mask_indexes(pits):
+            block = _BLOCK_FOR_VALUE[dense[index]]
+            self._dense[index] = Block.from_pitgoo_attr(
+                False,
+                block.is_top,
+                block.is_bottom,
+            ).value
+        self._dense_count = _DENSE_LEN - self._dense.count(_UNSET)
 
     def dump_to_map(self, vmf: VMF) -> None:
         """Debug purposes: Dump the info as entities in the map.
@@ -27,6 +27,7 @@ import io
 import itertools
 import math
 import random
+from time import perf_counter
 from collections import defaultdict
 from decimal import Decimal
 from enum import Enum
@@ -35,7 +36,7 @@ from typing import (
     Callable, Any, Iterable, Optional,
     Dict, List, Tuple, NamedTuple, TypeVar,
     Union,
-    Set,
+    Set, FrozenSet,
     TextIO,
 )
 
@@ -45,6 +46,7 @@ import template_brush
 import utils
 import comp_consts as const
 import instanceLocs
+import vbsp_profile
 from texturing import Portalable
 from srctools import (
     Property,
@@ -66,6 +68,9 @@ conditions = []
 FLAG_LOOKUP = {}  # type: Dict[str, Callable[[srctools.VMF, Entity, Property], bool]]
 RESULT_LOOKUP = {}  # type: Dict[str, Callable[[srctools.VMF, Entity, Property], object]]
 RESULT_SETUP = {}  # type: Dict[str, Callable[[srctools.VMF, Property], object]]
+# Flags which can pre-parse their value, producing a function to check an
+# instance.
+FLAG_SETUP = {}  # type: Dict[str, Callable[[Property], Callable[[Entity], bool]]]
 
 # Used to dump a list of the flags, results, meta-conditions
 ALL_FLAGS = []  # type: List[Tuple[str, Iterable[str], Callable[[srctools.VMF, Entity, Property], bool]]]
@@ -187,7 +192,10 @@ RES_EXHAUSTED = object()
 
 
 class Condition:
-    __slots__ = ['flags', 'results', 'else_results', 'priority', 'source']
+    __slots__ = [
+        'flags', 'results', 'else_results', 'priority', 'source',
+        '_flag_tests', '_result_funcs', '_else_funcs',
+    ]
 
     def __init__(
         self,
@@ -269,6 +277,22 @@ class Condition:
         for res in self.else_results[:]:
             self.setup_result(self.else_results, res, self.source)
 
+    def compile(self) -> None:
+        """Look up the functions for our flags and results ahead of time.
+
+        init() does this for all conditions. It must be redone if the flags
+        or results are changed.
+        """
+        self._flag_tests = [compile_flag(flag) for flag in self.flags]
+        self._result_funcs = [
+            (res, compile_result(res))
+            for res in self.results
+        ]
+        self._else_funcs = [
+            (res, compile_result(res))
+            for res in self.else_results
+        ]
+
     @staticmethod
     def setup_result(res_list: List[Property], result: Property, source: Optional[str]='') -> None:
         """Helper method to perform result setup."""
@@ -311,20 +335,198 @@ class Condition:
                 # Delete this so it doesn't re-fire..
                 return RES_EXHAUSTED
         else:
+            if vbsp_profile.ENABLED:
+                return vbsp_profile.call_timed(
+                    'results', res.name,
+                    func, VMF, inst, res,
+                )
             return func(VMF, inst, res)
 
-    def test(self, inst: Entity) -> None:
-        """Try to satisfy this condition on the given instance."""
-        success = True
+    def test(self, inst: Entity) -> bool:
+        """Try to satisfy this condition on the given instance.
+
+        This returns True if any results were executed.
+        """
+        for flag_test in self._flag_tests:
+            if not flag_test(inst):
+                return self._run(inst, self.else_results, self._else_funcs)
+        return self._run(inst, self.results, self._result_funcs)
+
+    def test_else(self, inst: Entity) -> bool:
+        """Run the else results, for an instance known to fail the flags."""
+        return self._run(inst, self.else_results, self._else_funcs)
+
+    @staticmethod
+    def _run(
+        inst: Entity,
+        results: List[Property],
+        funcs: List[Tuple[Property, Callable[[Entity], object]]],
+    ) -> bool:
+        """Run the results or else results on an instance."""
+        if not funcs:
+            return False
+        for pair in funcs[:]:
+            if pair[1](inst) is RES_EXHAUSTED:
+                funcs.remove(pair)
+                results.remove(pair[0])
+        return True
+
+    def index_candidates(self, index: 'InstanceIndex') -> Optional[Set[int]]:
+        """Use the leading flags to find the instances this could match.
+
+        This returns the positions of those instances in the index, or None
+        if every instance needs to be checked. Only instance, instFlag and
+        hasTrait flags at the start of the list are used, since those can't
+        have side effects. Any other instance must fail one of these flags,
+        so only needs the else results run.
+        """
+        best = None  # type: Optional[Set[int]]
         for flag in self.flags:
-            if not check_flag(flag, inst):
-                success = False
+            if flag.has_children():
+                break
+            if flag.name == 'instance':
+                try:
+                    files = instanceLocs.resolve_set(flag.value)
+                except Exception:
+                    # Let it fail normally when the flag is tested.
+                    break
+                cand = index.for_files(files)
+            elif flag.name in ('instflag', 'instpart'):
+                cand = index.for_files([
+                    file for file in index.by_file
+                    if flag.value in file
+                ])
+            elif flag.name == 'hastrait':
+                cand = index.by_trait.get(flag.value.casefold(), set())
+            else:
                 break
-        results = self.results if success else self.else_results
-        for res in results[:]:
-            should_del = self.test_result(inst, res)
-            if should_del is RES_EXHAUSTED:
-                results.remove(res)
+            # All of these need to pass.
+            best = set(cand) if best is None else best & cand
+        return best
+
+
+class InstanceIndex:
+    """An index of the instances in the map, by filename and trait.
+
+    Instances are given a position in the order they were found, and that
+    order is used to visit them. Iteration over the func_instance set has no
+    meaningful order either, so this doesn't change anything.
+
+    While conditions are being checked, results which add instances or
+    change their file or traits must call index_inst() so the index sees
+    the change. Removed instances are skipped when visited. In dev mode the
+    index is compared to the map after each condition, to catch any
+    missing calls.
+    """
+    def __init__(self, vmf: srctools.VMF) -> None:
+        self.vmf = vmf
+        self.order: List[Entity] = []
+        # The file and traits each position was indexed with.
+        self.files: List[Optional[str]] = []
+        self.traits: List[FrozenSet[str]] = []
+        self.positions: Dict[Entity, int] = {}
+        self.by_file: Dict[str, Set[int]] = defaultdict(set)
+        self.by_trait: Dict[str, Set[int]] = defaultdict(set)
+        # Positions which may have changed since the last refresh().
+        self.dirty: Set[int] = set()
+
+    def add(self, inst: Entity) -> None:
+        """Add a new instance to the index, or mark one as changed."""
+        try:
+            pos = self.positions[inst]
+        except KeyError:
+            pos = self.positions[inst] = len(self.order)
+            self.order.append(inst)
+            self.files.append(None)
+            self.traits.append(frozenset())
+        self.dirty.add(pos)
+
+    def refresh(self) -> bool:
+        """Update the positions which have changed.
+
+        This returns True if any were actually different.
+        """
+        if not self.dirty:
+            return False
+        import instance_traits
+        changed = False
+        for pos in self.dirty:
+            inst = self.order[pos]
+            old_file = self.files[pos]
+            old_traits = self.traits[pos]
+            file = inst['file'].casefold()
+            traits = frozenset(instance_traits.get(inst))
+            if file != old_file:
+                changed = True
+                if old_file is not None:
+                    self.by_file[old_file].discard(pos)
+                self.by_file[file].add(pos)
+                self.files[pos] = file
+            if traits != old_traits:
+                changed = True
+                for trait in old_traits - traits:
+                    self.by_trait[trait].discard(pos)
+                for trait in traits - old_traits:
+                    self.by_trait[trait].add(pos)
+                self.traits[pos] = traits
+        self.dirty.clear()
+        return changed
+
+    def is_present(self, pos: int) -> bool:
+        """Check if the instance at this position is still in the map."""
+        return self.order[pos] in self.vmf.by_class['func_instance']
+
+    def for_files(self, files: Iterable[str]) -> Set[int]:
+        """Return the positions of instances using any of these files."""
+        found = set()  # type: Set[int]
+        for file in files:
+            found.update(self.by_file.get(file, ()))
+        return found
+
+    def check(self, source: str) -> None:
+        """Compare the index to a full scan of the map.
+
+        This raises ValueError if an instance was added or changed without
+        calling index_inst(). source is the condition which just ran.
+        """
+        import instance_traits
+        self.refresh()
+        for inst in self.vmf.by_class['func_instance']:
+            try:
+                pos = self.positions[inst]
+            except KeyError:
+                problem = 'was added'
+            else:
+                if self.files[pos] != inst['file'].casefold():
+                    problem = 'changed file'
+                elif self.traits[pos] != instance_traits.get(inst):
+                    problem = 'changed traits'
+                else:
+                    continue
+            raise ValueError(
+                'Instance "{}" ({}) {} without updating the index, '
+                'in {}!'.format(
+                    inst['targetname'],
+                    inst['file'],
+                    problem,
+                    source,
+                )
+            )
+
+
+# The index used while check_all() is running.
+_INDEX = None  # type: Optional[InstanceIndex]
+
+
+def index_inst(inst: Entity) -> None:
+    """Update the instance index after adding or changing an instance.
+
+    Results must call this after adding a func_instance, or changing the
+    file or traits of one, so later conditions can find it. Removed
+    instances don't need this. Outside of check_all() this does nothing.
+    """
+    if _INDEX is not None:
+        _INDEX.add(inst)
 
 
 AnnCallT = TypeVar('AnnCallT')
@@ -427,16 +629,15 @@ def add_meta(func, priority: Union[Decimal, int], only_once=True):
 
     RESULT_LOOKUP[name] = annotation_caller(func, srctools.VMF, Entity, Property)
 
+    results = [Property(name, '')]
+    if only_once:
+        results.append(Property('endCondition', ''))
+
     cond = Condition(
-        results=[Property(name, '')],
+        results=results,
         priority=Decimal(dec_priority),
         source='MetaCondition {}'.format(name)
     )
-
-    if only_once:
-        cond.results.append(
-            Property('endCondition', '')
-        )
     conditions.append(cond)
     ALL_META.append((name, dec_priority, func))
 
@@ -496,6 +697,20 @@ def make_result(orig_name: str, *aliases: str):
     return x
 
 
+def make_flag_setup(*names: str):
+    """Decorator to pre-parse the value for a flag.
+
+    The function is passed the flag, and should return a function which
+    checks an instance. This is done when conditions are parsed, so the map
+    isn't available.
+    """
+    def x(func: Callable[[Property], Callable[[Entity], bool]]):
+        for name in names:
+            FLAG_SETUP[name.casefold()] = func
+        return func
+    return x
+
+
 def make_result_setup(*names: str):
     """Decorator to do setup for this result."""
     def x(func: Callable[..., Any]):
@@ -525,35 +740,45 @@ def init(seed: str, inst_list: Set[str], vmf_file: srctools.vmf.VMF) -> None:
     zero = Decimal(0)
     conditions.sort(key=lambda cond: getattr(cond, 'priority', zero))
 
+    # Meta conditions are created when their modules are imported, before
+    # profiling is enabled. Compile everything now, so they're timed too.
+    for cond in conditions:
+        cond.compile()
+
     build_solid_dict()
 
 
 def check_all() -> None:
     """Check all conditions."""
     LOGGER.info('Checking Conditions...')
-    for condition in conditions:
-        for inst in VMF.by_class['func_instance']:
+    global _INDEX
+    # This is kept up to date as results modify the map, so conditions only
+    # need to visit the instances their flags could match.
+    index = _INDEX = InstanceIndex(VMF)
+    for inst in VMF.by_class['func_instance']:
+        index.add(inst)
+    profiling = vbsp_profile.ENABLED
+    try:
+        for condition in conditions:
+            if profiling:
+                start = perf_counter()
             try:
-                condition.test(inst)
-            except NextInstance:
-                # This is raised to immediately stop running
-                # this condition, and skip to the next instance.
-                pass
+                _check_cond(condition, index)
             except EndCondition:
                 # This is raised to immediately stop running
                 # this condition, and skip to the next condtion.
-                break
-            except:
-                # Print the source of the condition if if fails...
-                LOGGER.exception(
-                    'Error in {}:',
-                    condition.source or 'condition',
-                )
-                # Exit directly, so we don't print it again in the exception
-                # handler
-                utils.quit_app(1)
-            if not condition.results and not condition.else_results:
-                break  # Condition has run out of results, quit early
+                pass
+            finally:
+                if profiling:
+                    vbsp_profile.add_time(
+                        'conditions',
+                        condition.source or 'condition',
+                        perf_counter() - start,
+                    )
+            if utils.DEV_MODE:
+                index.check(condition.source or 'condition')
+    finally:
+        _INDEX = None
 
     import vbsp
     LOGGER.info('Map has attributes: {}', [
@@ -565,10 +790,80 @@ def check_all() -> None:
     # Dynamically added by lru_cache()
     # noinspection PyUnresolvedReferences
     LOGGER.info('instanceLocs cache: {}', instanceLocs.resolve.cache_info())
+    # noinspection PyUnresolvedReferences
+    LOGGER.info(
+        'instanceLocs set cache: {}',
+        instanceLocs.resolve_set.cache_info(),
+    )
     LOGGER.info('Style Vars: {}', dict(vbsp.settings['style_vars']))
     LOGGER.info('Global instances: {}', GLOBAL_INSTANCES)
 
 
+def _check_cond(condition: Condition, index: InstanceIndex) -> None:
+    """Run a condition on each instance in the map."""
+    index.refresh()
+    # Instances added while running aren't checked, like iterating over
+    # a copy of the func_instance set.
+    limit = len(index.order)
+    candidates = condition.index_candidates(index)
+    visit_all = candidates is None or bool(condition.else_results)
+    pos = -1
+    while True:
+        if visit_all:
+            remaining = range(pos + 1, limit)  # type: Iterable[int]
+        else:
+            remaining = sorted([
+                cand for cand in candidates
+                if pos < cand < limit
+            ])
+        for pos in remaining:
+            if not index.is_present(pos):
+                continue
+            if candidates is None or pos in candidates:
+                ran = _test_inst(condition, index.order[pos])
+            else:
+                ran = _test_inst(condition, index.order[pos], else_only=True)
+            if not condition.results and not condition.else_results:
+                return  # Condition has run out of results, quit early
+            if ran and index.refresh() and candidates is not None:
+                # The map changed, so other instances may match now.
+                candidates = condition.index_candidates(index)
+                break
+        else:
+            return
+
+
+def _test_inst(
+    condition: Condition,
+    inst: Entity,
+    else_only: bool=False,
+) -> bool:
+    """Test the condition on a single instance.
+
+    If else_only is set, the instance is known to fail the flags.
+    This returns True if any results were executed.
+    """
+    try:
+        if else_only:
+            return condition.test_else(inst)
+        return condition.test(inst)
+    except NextInstance:
+        # This is raised to immediately stop running
+        # this condition, and skip to the next instance.
+        return True
+    except EndCondition:
+        raise
+    except:
+        # Print the source of the condition if if fails...
+        LOGGER.exception(
+            'Error in {}:',
+            condition.source or 'condition',
+        )
+        # Exit directly, so we don't print it again in the exception
+        # handler
+        utils.quit_app(1)
+
+
 def check_flag(flag: Property, inst: Entity):
     """Determine the result for a condition flag."""
     name = flag.name
@@ -590,10 +885,76 @@ def check_flag(flag: Property, inst: Entity):
             # Skip these conditions..
             return False
 
-    res = func(VMF, inst, flag)
+    if vbsp_profile.ENABLED:
+        res = vbsp_profile.call_timed('flags', name, func, VMF, inst, flag)
+    else:
+        res = func(VMF, inst, flag)
     return res == desired_result
 
 
+def compile_flag(flag: Property) -> Callable[[Entity], bool]:
+    """Produce a function which checks this flag against an instance.
+
+    This is equivalent to check_flag(), but the lookups are done once.
+    """
+    name = flag.name
+    # If starting with '!', invert the result.
+    if name[:1] == '!':
+        desired_result = False
+        name = name[1:]
+    else:
+        desired_result = True
+
+    try:
+        func = FLAG_LOOKUP[name]
+    except KeyError:
+        # Let check_flag() report the error if it's actually used.
+        return lambda inst: check_flag(flag, inst)
+
+    test = None  # type: Optional[Callable[[Entity], bool]]
+    try:
+        setup = FLAG_SETUP[name]
+    except KeyError:
+        pass
+    else:
+        try:
+            test = setup(flag)
+        except Exception:
+            # Let it fail normally when the flag is tested.
+            LOGGER.debug('Could not pre-parse "{}" flag:', name, exc_info=True)
+
+    if vbsp_profile.ENABLED:
+        if test is not None:
+            return lambda inst: vbsp_profile.call_timed(
+                'flags', name, test, inst,
+            ) == desired_result
+        return lambda inst: vbsp_profile.call_timed(
+            'flags', name, func, VMF, inst, flag,
+        ) == desired_result
+
+    if test is not None:
+        if desired_result:
+            return test
+        return lambda inst: not test(inst)
+    # VMF is looked up when called, it isn't set until init().
+    return lambda inst: func(VMF, inst, flag) == desired_result
+
+
+def compile_result(res: Property) -> Callable[[Entity], object]:
+    """Produce a function which executes this result on an instance."""
+    try:
+        func = RESULT_LOOKUP[res.name]
+    except KeyError:
+        # Let test_result() report the error.
+        return lambda inst: Condition.test_result(inst, res)
+    if vbsp_profile.ENABLED:
+        return lambda inst: vbsp_profile.call_timed(
+            'results', res.name,
+            func, VMF, inst, res,
+        )
+    return lambda inst: func(VMF, inst, res)
+
+
 def import_conditions() -> None:
     """Import all the components of the conditions package.
 
@@ -869,6 +1230,7 @@ def add_suffix(inst: Entity, suff: str) -> None:
     file = inst['file']
     old_name, dot, ext = file.partition('.')
     inst['file'] = ''.join((old_name, suff, dot, ext))
+    index_inst(inst)
 
 
 def local_name(inst: Entity, name: Union[str, Entity]) -> str:
@@ -1438,6 +1800,7 @@ def make_static_pist(vmf: srctools.VMF, ent: Entity, res: Property):
         val = res.value['bottom_' + str(bottom_pos)]
         if val:  # Only if defined
             ent['file'] = val
+            index_inst(ent)
 
         logic_file = res.value['logic_' + str(bottom_pos)]
         if logic_file:
@@ -1447,6 +1810,7 @@ def make_static_pist(vmf: srctools.VMF, ent: Entity, res: Property):
             logic_ent = ent.copy()
             logic_ent['file'] = logic_file
             vmf.add_ent(logic_ent)
+            index_inst(logic_ent)
             # If no connections are present, set the 'enable' value in
             # the logic to True so the piston can function
             logic_ent.fixup[consts.FixupVars.BEE_PIST_MANAGER_A] = (
@@ -1463,6 +1827,7 @@ def make_static_pist(vmf: srctools.VMF, ent: Entity, res: Property):
         val = res.value['static_' + str(pos)]
         if val:
             ent['file'] = val
+            index_inst(ent)
 
     # Add in the grating for the bottom as an overlay.
     # It's low to fit the piston at minimum, or higher if needed.
@@ -1475,6 +1840,7 @@ def make_static_pist(vmf: srctools.VMF, ent: Entity, res: Property):
         grate_ent = ent.copy()
         grate_ent['file'] = grate
         vmf.add_ent(grate_ent)
+        index_inst(grate_ent)
 
 
 @make_result('GooDebris')
@@ -1557,11 +1923,11 @@ def res_goo_debris(res: Property):
             loc.x += random.randint(-offset, offset)
             loc.y += random.randint(-offset, offset)
         loc.z -= 32  # Position the instances in the center of the 128 grid.
-        VMF.create_ent(
+        index_inst(VMF.create_ent(
             classname='func_instance',
             file=file + suff + '.vmf',
             origin=loc.join(' '),
             angles='0 {} 0'.format(random.randrange(0, 3600)/10)
-        )
+        ))
 
     return RES_EXHAUSTED
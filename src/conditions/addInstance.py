@@ -51,6 +51,7 @@ def res_add_global_inst(res: Property):
             angles=res['angles', '0 0 0'],
             fixup_style=res['fixup_style', '0'],
         )
+        conditions.index_inst(new_inst)
         try:
             new_inst['origin'] = res['position']
         except IndexError:
@@ -114,6 +115,7 @@ def res_add_overlay_inst(inst: Entity, res: Property):
         origin=inst['origin'],
         fixup_style=res['fixup_style', '0'],
     )
+    conditions.index_inst(overlay_inst)
     # Don't run if the fixup block exists..
     if srctools.conv_bool(res['copy_fixup', '1']):
         if 'fixup' not in res and 'localfixup' not in res:
@@ -84,7 +84,7 @@ def res_antlaser(vmf: VMF, res: Property):
 
     This is executed once to modify all instances.
     """
-    conf_inst = instanceLocs.resolve(res['instance'])
+    conf_inst = instanceLocs.resolve_set(res['instance'])
     conf_glow_height = Vec(z=res.float('GlowHeight', 48) - 64)
     conf_las_start = Vec(z=res.float('LasStart') - 64)
     conf_rope_off = res.vec('RopePos')
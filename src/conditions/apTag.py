@@ -12,7 +12,7 @@ from conditions import (
     meta_cond, make_result,
     PETI_INST_ANGLE, RES_EXHAUSTED,
     local_name,
-    make_result_setup,
+    make_result_setup, index_inst,
 )
 from connections import ITEMS, ItemType
 from fizzler import FIZZLERS, FIZZ_TYPES
@@ -52,14 +52,14 @@ def res_make_tag_coop_spawn(vmf: VMF, inst: Entity, res: Property):
     angles = normal.to_angle()
 
     if is_tag:
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             targetname='paint_gun',
             origin=origin - (0, 0, 16),
             angles=angles,
             # Generated by the BEE2 app.
             file='instances/bee2/tag_coop_gun.vmf',
-        )
+        ))
         # Blocks ATLAS from having a gun
         vmf.create_ent(
             classname='info_target',
@@ -116,6 +116,7 @@ def ap_tag_modifications(vmf: VMF):
         if inst['file'].casefold() not in transition_ents:
             continue
         inst['file'] = 'instances/bee2/transition_ents_tag.vmf'
+        index_inst(inst)
 
     # Because of a bug in P2, these folders aren't created automatically.
     # We need a folder with the user's ID in portal2/maps/puzzlemaker.
@@ -253,6 +254,7 @@ def res_make_tag_fizzler(vmf: VMF, inst: Entity, res: Property):
 
     if disable_other or (blue_enabled and oran_enabled):
         inst['file'] = inst_frame_double
+        index_inst(inst)
         # On a wall, and pointing vertically
         if inst_normal.z == 0 and Vec(y=1).rotate(*inst_angle).z:
             # They're vertical, make sure blue's on top!
@@ -269,6 +271,7 @@ def res_make_tag_fizzler(vmf: VMF, inst: Entity, res: Property):
             oran_loc = loc - offset
     else:
         inst['file'] = inst_frame_single
+        index_inst(inst)
         # They're always centered
         blue_loc = loc
         oran_loc = loc
@@ -344,22 +347,22 @@ def res_make_tag_fizzler(vmf: VMF, inst: Entity, res: Property):
     oran_sign = oran_sign_on if oran_enabled else oran_sign_off if disable_other else None
 
     if blue_sign:
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             file=blue_sign,
             targetname=inst['targetname'],
             angles=sign_angle,
             origin=blue_loc.join(' '),
-        )
+        ))
 
     if oran_sign:
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             file=oran_sign,
             targetname=inst['targetname'],
             angles=sign_angle,
             origin=oran_loc.join(' '),
-        )
+        ))
 
     # Now modify the fizzler...
 
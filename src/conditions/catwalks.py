@@ -2,7 +2,7 @@
 import brushLoc
 from conditions import (
     make_result, RES_EXHAUSTED,
-    INST_ANGLE,
+    INST_ANGLE, index_inst,
 )
 import instanceLocs
 from srctools import Vec, Property, VMF, Entity
@@ -66,12 +66,12 @@ def place_catwalk_connections(vmf: VMF, instances, point_a: Vec, point_b: Vec):
             loc = point_a + (2 * stair_pos + 128) * direction
             # Do the vertical offset
             loc.z += stair_pos
-            vmf.create_ent(
+            index_inst(vmf.create_ent(
                 classname='func_instance',
                 origin=loc.join(' '),
                 angles=angle,
                 file=instances['stair'],
-            )
+            ))
         # This is the location we start flat sections at
         point_a = loc + 128 * direction
         point_a.z += 128
@@ -87,12 +87,12 @@ def place_catwalk_connections(vmf: VMF, instances, point_a: Vec, point_b: Vec):
             # Do the vertical offset plus additional 128 units
             # to account for the moved instance
             loc.z -= (stair_pos + 128)
-            vmf.create_ent(
+            index_inst(vmf.create_ent(
                 classname='func_instance',
                 origin=loc.join(' '),
                 angles=angle,
                 file=instances['stair'],
-            )
+            ))
         # Adjust point A to be at the end of the catwalks
         point_a = loc
     # Remove the space the stairs take up from the horiz distance
@@ -108,12 +108,12 @@ def place_catwalk_connections(vmf: VMF, instances, point_a: Vec, point_b: Vec):
             distance,
             [512, 256, 128]
             ):
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             origin=loc.join(' '),
             angles=angle,
             file=instances['straight_' + str(segment_len)],
-        )
+        ))
         loc += (segment_len * direction)
 
 
@@ -139,7 +139,7 @@ def res_make_catwalk(vmf: VMF, res: Property):
         * `single_wall`: A section connecting to an East wall.
     """
     LOGGER.info("Starting catwalk generator...")
-    marker = instanceLocs.resolve(res['markerInst'])
+    marker = instanceLocs.resolve_set(res['markerInst'])
 
     instances = {
         name: instanceLocs.resolve_one(res[name, ''], error=True)
@@ -241,6 +241,7 @@ def res_make_catwalk(vmf: VMF, res: Property):
 
         new_type, inst['angles'] = utils.CONN_LOOKUP[dir_mask.as_tuple()]
         inst['file'] = instances[CATWALK_TYPES[new_type]]
+        index_inst(inst)
 
         if new_type is utils.CONN_TYPES.side:
             # If the end piece is pointing at a wall, switch the instance.
@@ -274,12 +275,12 @@ def res_make_catwalk(vmf: VMF, res: Property):
             supp = instances['support_wall']
 
         if supp:
-            vmf.create_ent(
+            index_inst(vmf.create_ent(
                 classname='func_instance',
                 origin=inst['origin'],
                 angles=INST_ANGLE[normal.as_tuple()],
                 file=supp,
-            )
+            ))
 
     LOGGER.info('Finished catwalk generation!')
     return RES_EXHAUSTED
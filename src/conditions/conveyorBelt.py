@@ -116,6 +116,7 @@ def res_conveyor_belt(vmf: VMF, inst: Entity, res: Property) -> None:
                 origin=pos,
                 angles=angles,
             )
+            conditions.index_inst(seg_inst)
             seg_inst.fixup.update(inst.fixup)
 
         if rail_template:
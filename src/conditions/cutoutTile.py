@@ -79,7 +79,7 @@ def res_cutout_tile(vmf: srctools.VMF, res: Property):
             (This allows customising the surfaceprop.)
 
     """
-    marker_filenames = instanceLocs.resolve(res['markeritem'])
+    marker_filenames = instanceLocs.resolve_set(res['markeritem'])
 
     x: float
     y: float
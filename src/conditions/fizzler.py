@@ -1,5 +1,5 @@
 """Results for custom fizzlers."""
-from conditions import make_result, make_flag
+from conditions import make_result, make_flag, index_inst
 from srctools import Property, Entity, Vec, VMF
 from instanceLocs import resolve as resolve_inst
 import connections
@@ -84,6 +84,7 @@ def res_reshape_fizzler(vmf: VMF, shape_inst: Entity, res: Property):
             file=resolve_inst('<ITEM_BARRIER_HAZARD:fizz_base>'),
         )
         base_inst.fixup.update(shape_inst.fixup)
+        index_inst(base_inst)
         fizz = fizzler.FIZZLERS[shape_name] = fizzler.Fizzler(
             fizzler.FIZZ_TYPES['VALVE_MATERIAL_EMANCIPATION_GRID'],
             up_axis,
@@ -1,5 +1,7 @@
 """Adds breakable glass."""
-from conditions import make_result_setup, make_result, RES_EXHAUSTED, local_name
+from conditions import (
+    make_result_setup, make_result, RES_EXHAUSTED, local_name, index_inst,
+)
 from instanceLocs import resolve as resolve_inst
 from srctools import Property, Vec, VMF, Solid, Side, Entity, Output
 
@@ -114,14 +116,14 @@ def make_frames(
     """Generate frames for a rectangular glass item."""
     def make_frame(frame_type: str, loc: Vec, angles: Vec) -> None:
         """Make a frame instance."""
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             targetname=targ,
             file=conf['frame_' + frame_type],
             # Position at the center of the block, instead of at the glass.
             origin=loc - norm * 64,
             angles=angles,
-        )
+        ))
 
     if bbox_min == bbox_max:
         # 1x1 glass..
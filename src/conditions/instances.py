@@ -8,7 +8,7 @@ from typing import Dict, Optional, Union
 import conditions
 import srctools.logger
 from conditions import (
-    make_flag, make_result, make_result_setup,
+    make_flag, make_flag_setup, make_result, make_result_setup,
     ALL_INST,
 )
 import instanceLocs
@@ -23,7 +23,27 @@ COND_MOD_NAME = 'Instances'
 @make_flag('instance')
 def flag_file_equal(inst: Entity, flag: Property):
     """Evaluates True if the instance matches the given file."""
-    return inst['file'].casefold() in instanceLocs.resolve(flag.value)
+    return inst['file'].casefold() in instanceLocs.resolve_set(flag.value)
+
+
+@make_flag_setup('instance')
+def flag_file_equal_setup(flag: Property):
+    """Resolve the instance list once, instead of for every instance.
+
+    Most instances share a few filenames, so the result for each is cached.
+    """
+    files = instanceLocs.resolve_set(flag.value)
+    matches = {}  # type: Dict[str, bool]
+
+    def test(inst: Entity) -> bool:
+        """Check this instance."""
+        file = inst['file']
+        try:
+            return matches[file]
+        except KeyError:
+            result = matches[file] = file.casefold() in files
+            return result
+    return test
 
 
 @make_flag('instFlag', 'InstPart')
@@ -32,10 +52,17 @@ def flag_file_cont(inst: Entity, flag: Property):
     return flag.value in inst['file'].casefold()
 
 
+@make_flag_setup('instFlag', 'InstPart')
+def flag_file_cont_setup(flag: Property):
+    """Read the flag value once."""
+    part = flag.value
+    return lambda inst: part in inst['file'].casefold()
+
+
 @make_flag('hasInst')
 def flag_has_inst(flag: Property):
     """Checks if the given instance is present anywhere in the map."""
-    flags = instanceLocs.resolve(flag.value)
+    flags = instanceLocs.resolve_set(flag.value)
     return any(
         inst.casefold() in flags
         for inst in
@@ -184,6 +211,7 @@ def flag_offset_distance(inst: Entity, flag: Property) -> bool:
 def res_change_instance(inst: Entity, res: Property):
     """Set the file to a value."""
     inst['file'] = instanceLocs.resolve_one(res.value, error=True)
+    conditions.index_inst(inst)
 
 
 @make_result('suffix', 'instSuffix')
@@ -3,7 +3,7 @@ import math
 import connections
 from conditions import (
     make_result, make_result_setup, meta_cond,
-    local_name
+    local_name, index_inst,
 )
 import instanceLocs
 import faithplate
@@ -211,26 +211,26 @@ def res_camera(inst: Entity, res: Property):
 
     pitch, yaw, _ = (target_loc - yaw_pos).to_angle()
 
-    inst.map.create_ent(
+    index_inst(inst.map.create_ent(
         classname='func_instance',
         targetname=inst['targetname'],
         file=conf['yaw_inst'],
         angles='0 {:g} 0'.format(yaw),
         origin=yaw_pos,
-    )
+    ))
 
     pitch_pos = Vec(conf['pitch_off'])
     pitch_pos.rotate(yaw=yaw)
     pitch_pos.rotate_by_str(inst['angles'])
     pitch_pos += yaw_pos
 
-    inst.map.create_ent(
+    index_inst(inst.map.create_ent(
         classname='func_instance',
         targetname=inst['targetname'],
         file=conf['pitch_inst'],
         angles='{:g} {:g} 0'.format(pitch, yaw),
         origin=pitch_pos,
-    )
+    ))
 
     cam_pos = Vec(conf['cam_off'])
     cam_pos.rotate(pitch=pitch, yaw=yaw)
@@ -393,12 +393,12 @@ def make_voice_studio(vmf: VMF) -> bool:
     loc = voiceLine.get_studio_loc()
 
     if HAS_MONITOR and studio_file:
-        vmf.create_ent(
+        index_inst(vmf.create_ent(
             classname='func_instance',
             file=studio_file,
             origin=loc,
             angles='0 0 0',
-        )
+        ))
         return True
     else:
         # If there aren't monitors, the studio instance isn't used.
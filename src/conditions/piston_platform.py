@@ -132,6 +132,7 @@ def res_piston_plat(vmf: VMF, inst: Entity, res: Property) -> None:
             static_inst = inst.copy()
             vmf.add_ent(static_inst)
             static_inst['file'] = inst_filenames['fullstatic_' + str(position)]
+            conditions.index_inst(static_inst)
             return
 
     init_script = 'SPAWN_UP <- {}'.format('true' if start_up else 'false')
@@ -184,11 +185,13 @@ def res_piston_plat(vmf: VMF, inst: Entity, res: Property) -> None:
         if pist_ind <= min_pos:
             # It's below the lowest position, so it can be static.
             pist_ent['file'] = inst_filenames['static_' + str(pist_ind)]
+            conditions.index_inst(pist_ent)
             pist_ent['origin'] = brush_pos = origin + pist_ind * off
             temp_targ = static_ent
         else:
             # It's a moving component.
             pist_ent['file'] = inst_filenames['dynamic_' + str(pist_ind)]
+            conditions.index_inst(pist_ent)
             if pist_ind > max_pos:
                 # It's 'after' the highest position, so it never extends.
                 # So simplify by merging those all.
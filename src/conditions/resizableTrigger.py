@@ -49,7 +49,7 @@ def res_resizeable_trigger(vmf: VMF, res: Property):
     * `localkeys`: The same as above, except values will be changed to use
         instance-local names.
     """
-    marker = instanceLocs.resolve(res['markerInst'])
+    marker = instanceLocs.resolve_set(res['markerInst'])
 
     marker_names = set()
 
@@ -249,6 +249,7 @@ def res_resizeable_trigger(vmf: VMF, res: Property):
                 # closest to antlines if present.
                 origin=inst2['origin'],
             )
+            conditions.index_inst(pre_inst)
 
             if pre_act is not None:
                 out = pre_act.copy()
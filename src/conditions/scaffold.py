@@ -9,6 +9,7 @@ import item_chain
 import srctools.logger
 from conditions import (
     make_result, make_result_setup, RES_EXHAUSTED,
+    index_inst,
 )
 from srctools import Vec, Property, VMF
 
@@ -188,6 +189,7 @@ def res_unst_scaffold(vmf: VMF, res: Property):
             new_file = conf.get('inst_' + orient, '')
             if new_file:
                 node.inst['file'] = new_file
+                index_inst(node.inst)
 
             if node.prev is None:
                 link_type = LinkType.START
@@ -195,13 +197,13 @@ def res_unst_scaffold(vmf: VMF, res: Property):
                     # No connections in either direction, just skip.
                     # Generate the piston tip if we would have.
                     if conf['inst_offset'] is not None:
-                        vmf.create_ent(
+                        index_inst(vmf.create_ent(
                             classname='func_instance',
                             targetname=node.inst['targetname'],
                             file=conf['inst_offset'],
                             origin=offset,
                             angles=node.inst['angles'],
-                        )
+                        ))
                     continue
             elif node.next is None:
                 link_type = LinkType.END
@@ -238,26 +240,26 @@ def res_unst_scaffold(vmf: VMF, res: Property):
                         # Round to nearest 90 degrees
                         # Add 45 so the switchover point is at the diagonals
                         link_ang = (link_ang + 45) // 90 * 90
-                    vmf.create_ent(
+                    index_inst(vmf.create_ent(
                         classname='func_instance',
                         targetname=node.inst['targetname'],
                         file=conf['inst_end'],
                         origin=offset,
                         angles='0 {:.0f} 0'.format(link_ang),
-                    )
+                    ))
                     # Don't place the offset instance, this replaces that!
                     placed_endcap = True
 
             if not placed_endcap and conf['inst_offset'] is not None:
                 # Add an additional rotated entity at the offset.
                 # This is useful for the piston item.
-                vmf.create_ent(
+                index_inst(vmf.create_ent(
                     classname='func_instance',
                     targetname=node.inst['targetname'],
                     file=conf['inst_offset'],
                     origin=offset,
                     angles=node.inst['angles'],
-                )
+                ))
 
             logic_inst = vmf.create_ent(
                 classname='func_instance',
@@ -277,6 +279,7 @@ def res_unst_scaffold(vmf: VMF, res: Property):
                     else node.inst['angles']
                 ),
             )
+            index_inst(logic_inst)
 
             # Add the link-values
             for linkVar, link in LINKS.items():
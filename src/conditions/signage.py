@@ -149,9 +149,11 @@ def res_signage(vmf: VMF, inst: Entity, res: Property):
 
     if sign_prim and sign_sec:
         inst['file'] = res['large_clip', '']
+        conditions.index_inst(inst)
         inst['origin'] = (prim_pos + sec_pos) / 2
     else:
         inst['file'] = res['small_clip', '']
+        conditions.index_inst(inst)
         inst['origin'] = prim_pos if sign_prim else sec_pos
 
     brush_faces: List[Side] = []
@@ -101,6 +101,7 @@ def res_track_plat(vmf: VMF, res: Property):
             # Track is one block long, use a single-only instance and
             # remove track!
             plat_inst['file'] = single_plat_inst
+            conditions.index_inst(plat_inst)
             first_track.remove()
             continue  # Next platform
 
@@ -11,7 +11,7 @@ import vbsp
 from brushLoc import POS as BLOCK_POS
 from conditions import (
     make_result, make_result_setup, RES_EXHAUSTED,
-    meta_cond
+    meta_cond, index_inst,
 )
 import instanceLocs
 from srctools import Vec, Vec_tuple, Property, Entity, VMF
@@ -250,6 +250,7 @@ def vactube_gen(vmf: VMF) -> None:
             'floor' if (start_normal.z < 0) else
             'wall'
         )]
+        index_inst(start_logic)
 
         end = start
 
@@ -274,6 +275,7 @@ def vactube_gen(vmf: VMF) -> None:
             end_logic = end.ent.copy()
             vbsp.VMF.add_ent(end_logic)
             end_logic['file'] = end.conf['exit']
+            index_inst(end_logic)
 
 
 def push_trigger(loc, normal, solids):
@@ -357,12 +359,12 @@ def make_straight(
 
     for off in range(0, int(dist), 128):
         position = origin + off * normal
-        vbsp.VMF.create_ent(
+        index_inst(vbsp.VMF.create_ent(
             classname='func_instance',
             origin=position,
             angles=angles,
             file=straight_file,
-        )
+        ))
 
         for supp_ang, supp_off in support_positions:
             try:
@@ -374,21 +376,21 @@ def make_straight(
                 continue
             # Check all 4 center tiles are present.
             if all(tile[u, v].is_tile for u in (1,2) for v in (1, 2)):
-                vbsp.VMF.create_ent(
+                index_inst(vbsp.VMF.create_ent(
                     classname='func_instance',
                     origin=position,
                     angles=supp_ang,
                     file=support_file,
-                )
+                ))
 
 
 def make_corner(origin, angle, size, config):
-    vbsp.VMF.create_ent(
+    index_inst(vbsp.VMF.create_ent(
         classname='func_instance',
         origin=origin,
         angles=angle,
         file=config['corner', size],
-    )
+    ))
 
     temp = config['corner_temp', size]
     if temp:
@@ -1192,6 +1192,7 @@ def gen_item_outputs(vmf: VMF) -> None:
 
         for pan in item.ind_panels:
             pan['file'] = desired_panel_inst
+            conditions.index_inst(pan)
             pan.fixup[const.FixupVars.TIM_ENABLED] = item.timer is not None
 
     logic_auto = vmf.create_ent(
@@ -1246,6 +1247,8 @@ def add_locking(item: Item) -> None:
 
     instance_traits.get(item.inst).add('locking_targ')
     instance_traits.get(lock_button.inst).add('locking_btn')
+    conditions.index_inst(item.inst)
+    conditions.index_inst(lock_button.inst)
 
     # Force the item to not have a timer.
     for pan in item.ind_panels:
@@ -10,7 +10,9 @@ from typing import Dict, Optional, List, Union, Tuple, Set, FrozenSet, Iterable
 import brushLoc
 import packing
 import vbsp_options
-from conditions import meta_cond, make_result, make_flag, RES_EXHAUSTED
+from conditions import (
+    meta_cond, make_result, make_flag, RES_EXHAUSTED, index_inst,
+)
 from instanceLocs import resolve as resolve_inst
 from srctools import (
     Property, NoKeyError, VMF, Entity, Vec, Output,
@@ -1482,13 +1484,13 @@ def make_cube(
                 assert pair.dropper is not None
 
                 # Add the bounce painter. This is only on the dropper.
-                vmf.create_ent(
+                index_inst(vmf.create_ent(
                     classname='func_instance',
                     targetname=pair.dropper['targetname'],
                     origin=pair.dropper['origin'],
                     angles=pair.dropper['angles'],
                     file=drop_type.bounce_paint_file,
-                )
+                ))
                 # Manually add the dropper outputs here, so they only add to the
                 # actual dropper.
                 drop_name, drop_cmd = drop_type.out_finish_drop
@@ -1530,6 +1532,7 @@ def make_cube(
                 ),
                 file=addon.inst,
             )
+            index_inst(inst)
             # Copy the cube stuff to the addon, since it's specific to the cube.
             inst.fixup.update(pair.cube_fixup)
         packing.pack_list(vmf, addon.pack)
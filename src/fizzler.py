@@ -1163,6 +1163,7 @@ def generate_fizzlers(vmf: VMF):
         if fizz_type.inst[FizzInst.BASE, is_static]:
             random.seed('{}_fizz_base_{}'.format(MAP_RAND_SEED, fizz_name))
             fizz.base_inst['file'] = random.choice(fizz_type.inst[FizzInst.BASE, is_static])
+            conditions.index_inst(fizz.base_inst)
 
         if not fizz.emitters:
             LOGGER.warning('No emitters for fizzler "{}"!', fizz_name)
@@ -1316,8 +1317,10 @@ def generate_fizzlers(vmf: VMF):
                 )
                 max_inst.fixup.update(fizz.base_inst.fixup)
                 instance_traits.get(max_inst).update(fizz_traits)
+                conditions.index_inst(max_inst)
             min_inst.fixup.update(fizz.base_inst.fixup)
             instance_traits.get(min_inst).update(fizz_traits)
+            conditions.index_inst(min_inst)
 
             if has_fizz_border:
                 fizz._gen_fizz_border(vmf, seg_min, seg_max)
@@ -1343,6 +1346,7 @@ def generate_fizzlers(vmf: VMF):
                     )
                     mid_inst.fixup.update(fizz.base_inst.fixup)
                     instance_traits.get(mid_inst).update(fizz_traits)
+                    conditions.index_inst(mid_inst)
 
             if template_brush_ent is not None:
                 if length == 128 and fizz_type.temp_single:
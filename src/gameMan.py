@@ -18,6 +18,9 @@ import shutil
 import math
 import re
 import io
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 
 from BEE2_config import ConfigFile, GEN_OPTS
 from srctools import (
@@ -34,7 +37,10 @@ import utils
 import srctools
 import webbrowser
 
-from typing import List, Tuple, Set, Iterable, Iterator, Dict, Union
+from typing import (
+    List, Tuple, Set, Iterable, Iterator, Dict, Union, Optional,
+    NamedTuple,
+)
 
 
 try:
@@ -109,6 +115,23 @@ MaterialModify
 
 # The location of all the instances in the game directory
 INST_PATH = 'sdk_content/maps/instances/bee2'
+# Records the resources we copied into the game, so they can be updated
+# incrementally. This maps the game-relative path to a ManifestEntry.
+RES_MANIFEST_PATH = 'bin/bee2/resource_manifest.json'
+
+
+class ManifestEntry(NamedTuple):
+    """A resource copied into the game.
+
+    If the package fingerprint, and the size and modification time of the
+    copy, still match this, the file doesn't need to be read again.
+    """
+    pak_id: str
+    fingerprint: str
+    file_hash: str  # SHA-1 of the contents.
+    size: int
+    mtime: int  # st_mtime_ns of the copy.
+
 
 # The line we inject to add our BEE2 folder into the game search path.
 # We always add ours such that it's the highest priority, other
@@ -273,6 +296,45 @@ def should_backup_app(file: str) -> bool:
         return b'MEI\014\013\012\013\016' not in f.read(SIZE)
 
 
+def write_lines(path: str, lines: Iterable[str], atomic: bool=False) -> None:
+    """Write the given lines to a file.
+
+    If atomic is set, an AtomicWriter is used so the file is replaced in one step.
+    """
+    if atomic:
+        file = srctools.AtomicWriter(path)
+    else:
+        file = open(path, 'w', encoding='utf8')
+    with file as f:
+        for line in lines:
+            f.write(line)
+
+
+def copy_compiler_file(src: str, dest: str) -> bool:
+    """Copy a compiler file into the game.
+
+    If the destination already has the same size and modification time, it's
+    skipped and False is returned.
+    """
+    src_stat = os.stat(src)
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+    else:
+        if (
+            dest_stat.st_size == src_stat.st_size and
+            dest_stat.st_mtime_ns == src_stat.st_mtime_ns
+        ):
+            return False
+        # First try and give ourselves write-permission,
+        # if it's set read-only.
+        utils.unset_readonly(dest)
+    # Copy the modification time too, so we can skip it next time.
+    shutil.copy2(src, dest)
+    return True
+
+
 class Game:
     def __init__(
         self,
@@ -514,58 +576,149 @@ class Game:
         ):
             return True
 
+    def load_res_manifest(self) -> Optional[Dict[str, ManifestEntry]]:
+        """Read the manifest of resources copied by the last refresh.
+
+        If it's missing or invalid, None is returned.
+        """
+        try:
+            with open(self.abs_path(RES_MANIFEST_PATH)) as f:
+                manifest = json.load(f)
+            return {
+                path: ManifestEntry(
+                    pak_id, fingerprint, file_hash, int(size), int(mtime),
+                )
+                for path, (pak_id, fingerprint, file_hash, size, mtime)
+                in manifest.items()
+            }
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError, AttributeError):
+            LOGGER.warning('Invalid resource manifest!', exc_info=True)
+            return None
+
     def refresh_cache(self, already_copied: Set[str]) -> None:
         """Copy over the resource files into this game.
 
         already_copied is passed from copy_mod_music(), to
         indicate which files should remain. It is the full path to the files.
+        Files are only read if their package or the copy in the game changed
+        since the last refresh, and only written if their contents differ.
+        Only files recorded in the manifest are removed.
         """
         screen_func = export_screen.step
 
-        with res_system:
-            for file in res_system.walk_folder_repeat():
-                try:
-                    start_folder, path = file.path.split('/', 1)
-                except ValueError:
-                    LOGGER.warning('File in resources root: "{}"!', file.path)
-                    continue
+        old_manifest = self.load_res_manifest()
+        new_manifest = {}  # type: Dict[str, ManifestEntry]
+        copy_count = 0
 
-                start_folder = start_folder.casefold()
+        # This matches the order of res_system, so the first package
+        # with a file takes priority.
+        for pak_id, filesys in packageLoader.PACKAGE_SYS.items():
+            fingerprint = packageLoader.packages[pak_id].fingerprint
+            with filesys:
+                for file in filesys.walk_folder('resources/'):
+                    try:
+                        start_folder, path = file.path.split('/', 2)[1:]
+                    except ValueError:
+                        LOGGER.warning('File in resources root: "{}"!', file.path)
+                        continue
 
-                if start_folder == 'instances':
-                    dest = self.abs_path(INST_PATH + '/' + path)
-                elif start_folder in ('bee2', 'music_samp'):
-                    screen_func('RES')
-                    continue  # Skip app icons
-                else:
-                    dest = self.abs_path(os.path.join('bee2', start_folder, path))
+                    start_folder = start_folder.casefold()
 
-                # Already copied from another package.
-                if dest in already_copied:
+                    if start_folder == 'instances':
+                        rel_dest = INST_PATH + '/' + path
+                    elif start_folder in ('bee2', 'music_samp'):
+                        screen_func('RES')
+                        continue  # Skip app icons
+                    else:
+                        rel_dest = 'bee2/' + start_folder + '/' + path
+                    dest = self.abs_path(rel_dest)
+
+                    # Already copied from another package.
+                    if dest.casefold() in already_copied:
+                        screen_func('RES')
+                        continue
+                    already_copied.add(dest.casefold())
+
+                    try:
+                        dest_stat = os.stat(dest)
+                    except FileNotFoundError:
+                        dest_stat = None
+                    old_entry = None
+                    if old_manifest is not None:
+                        old_entry = old_manifest.get(rel_dest)
+
+                    # If the package hasn't changed and the copy is the one
+                    # we wrote, skip reading the file entirely.
+                    if (
+                        old_entry is not None and dest_stat is not None and
+                        old_entry.pak_id == pak_id and
+                        old_entry.fingerprint == fingerprint and
+                        old_entry.size == dest_stat.st_size and
+                        old_entry.mtime == dest_stat.st_mtime_ns
+                    ):
+                        new_manifest[rel_dest] = old_entry
+                        screen_func('RES')
+                        continue
+
+                    with file.open_bin() as fsrc:
+                        data = fsrc.read()
+                    file_hash = hashlib.sha1(data).hexdigest()
+
+                    if not (
+                        old_entry is not None and dest_stat is not None and
+                        old_entry.file_hash == file_hash and
+                        old_entry.size == dest_stat.st_size == len(data)
+                    ):
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        with open(dest, 'wb') as fdest:
+                            fdest.write(data)
+                        dest_stat = os.stat(dest)
+                        copy_count += 1
+                    new_manifest[rel_dest] = ManifestEntry(
+                        pak_id,
+                        fingerprint,
+                        file_hash,
+                        dest_stat.st_size,
+                        dest_stat.st_mtime_ns,
+                    )
                     screen_func('RES')
+
+        LOGGER.info(
+            'Cache copied ({} of {} files changed).',
+            copy_count, len(new_manifest),
+        )
+
+        if old_manifest is None:
+            # We don't know what was copied before, so check everything.
+            for path in [INST_PATH, 'bee2']:
+                abs_path = self.abs_path(path)
+                for dirpath, dirnames, filenames in os.walk(abs_path):
+                    for file in filenames:
+                        # Keep VMX backups, disabled editor models, and the coop
+                        # gun instance.
+                        if file.endswith(('.vmx', '.mdl_dis', 'tag_coop_gun.vmf')):
+                            continue
+                        path = os.path.join(dirpath, file).casefold()
+
+                        if path not in already_copied:
+                            LOGGER.info('Deleting: {}', path)
+                            os.remove(path)
+        else:
+            for rel_path in old_manifest.keys() - new_manifest.keys():
+                path = self.abs_path(rel_path)
+                if path.casefold() in already_copied:
                     continue
-                already_copied.add(dest.casefold())
-
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                with file.open_bin() as fsrc, open(dest, 'wb') as fdest:
-                    shutil.copyfileobj(fsrc, fdest)
-                screen_func('RES')
-
-        LOGGER.info('Cache copied.')
-
-        for path in [INST_PATH, 'bee2']:
-            abs_path = self.abs_path(path)
-            for dirpath, dirnames, filenames in os.walk(abs_path):
-                for file in filenames:
-                    # Keep VMX backups, disabled editor models, and the coop
-                    # gun instance.
-                    if file.endswith(('.vmx', '.mdl_dis', 'tag_coop_gun.vmf')):
-                        continue
-                    path = os.path.join(dirpath, file).casefold()
+                LOGGER.info('Deleting: {}', path)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
 
-                    if path not in already_copied:
-                        LOGGER.info('Deleting: {}', path)
-                        os.remove(path)
+        os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
+        with open(self.abs_path(RES_MANIFEST_PATH), 'w') as f:
+            json.dump(new_manifest, f, sort_keys=True)
 
         # Save the new cache modification date.
         self.mod_times.clear()
@@ -614,10 +767,13 @@ class Game:
         # VBSP, VRAD, editoritems
         export_screen.set_length('BACK', len(FILES_TO_BACKUP))
         # files in compiler/
-        try:
-            num_compiler_files = sum(1 for file in utils.install_path('compiler').rglob('*'))
-        except FileNotFoundError:
-            num_compiler_files = 0
+        compiler_src = str(utils.install_path('compiler'))
+        compiler_files = [
+            os.path.join(dirpath, filename)
+            for dirpath, dirnames, filenames in os.walk(compiler_src)
+            for filename in filenames
+        ]
+        num_compiler_files = len(compiler_files)
 
         if self.steamID == utils.STEAM_IDS['APERTURE TAG']:
             # Coop paint gun instance
@@ -800,53 +956,60 @@ class Game:
                 self.edit_fgd(True)
             export_screen.step('EXP')
 
-            LOGGER.info('Writing instance list...')
-            with open(self.abs_path('bin/bee2/instances.cfg'), 'w', encoding='utf8') as inst_file:
-                for line in self.build_instance_data(editoritems):
-                    inst_file.write(line)
-            export_screen.step('EXP')
-
-            # AtomicWriter writes to a temporary file, then renames in one step.
-            # This ensures editoritems won't be half-written.
-            LOGGER.info('Writing Editoritems...')
-            with srctools.AtomicWriter(self.abs_path(
-                    'portal2_dlc2/scripts/editoritems.txt')) as editor_file:
-                for line in editoritems.export():
-                    editor_file.write(line)
-            export_screen.step('EXP')
-
-            LOGGER.info('Writing VBSP Config!')
-            os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
-            with open(self.abs_path('bin/bee2/vbsp_config.cfg'), 'w', encoding='utf8') as vbsp_file:
-                for line in vbsp_config.export():
-                    vbsp_file.write(line)
-            export_screen.step('EXP')
-
-            if num_compiler_files > 0:
-                LOGGER.info('Copying Custom Compiler!')
-                compiler_src = utils.install_path('compiler')
-                for comp_file in compiler_src.rglob('*'):
-                    # Ignore folders.
-                    if comp_file.is_dir():
-                        continue
-
-                    dest = self.abs_path('bin' / comp_file.relative_to(compiler_src))
-
-                    LOGGER.info('\t* {} -> {}', comp_file, dest)
-
-                    folder = Path(dest).parent
-                    if not folder.exists():
-                        folder.mkdir(parents=True, exist_ok=True)
-
+            # The config files, compiler and resources don't depend on each
+            # other, so write them all at once. Only this thread touches the
+            # UI, so we step the screen as each finishes.
+            # This strips the custom instances out of editoritems, so it must
+            # be completely done before that is written.
+            instance_data = list(self.build_instance_data(editoritems))
+
+            with ThreadPoolExecutor(thread_name_prefix='export') as pool:
+                LOGGER.info('Writing instance list, Editoritems and VBSP Config...')
+                os.makedirs(self.abs_path('bin/bee2/'), exist_ok=True)
+                config_futures = [
+                    pool.submit(
+                        write_lines,
+                        self.abs_path('bin/bee2/instances.cfg'),
+                        instance_data,
+                    ),
+                    # Use an AtomicWriter, so editoritems won't be half-written.
+                    pool.submit(
+                        write_lines,
+                        self.abs_path('portal2_dlc2/scripts/editoritems.txt'),
+                        editoritems.export(),
+                        atomic=True,
+                    ),
+                    pool.submit(
+                        write_lines,
+                        self.abs_path('bin/bee2/vbsp_config.cfg'),
+                        vbsp_config.export(),
+                    ),
+                ]
+
+                comp_futures: Dict[Future, str] = {}
+                if num_compiler_files > 0:
+                    LOGGER.info('Copying Custom Compiler!')
+                    for comp_file in compiler_files:
+                        dest = self.abs_path(os.path.join(
+                            'bin',
+                            os.path.relpath(comp_file, compiler_src),
+                        ))
+                        comp_futures[pool.submit(copy_compiler_file, comp_file, dest)] = comp_file
+
+                for fut in config_futures:
+                    fut.result()
+                    export_screen.step('EXP')
+
+                for fut in as_completed(comp_futures):
+                    comp_file = comp_futures[fut]
                     try:
-                        if os.path.isfile(dest):
-                            # First try and give ourselves write-permission,
-                            # if it's set read-only.
-                            utils.unset_readonly(dest)
-                        shutil.copy(comp_file, dest)
+                        if fut.result():
+                            LOGGER.info('\t* {} -> bin/', comp_file)
                     except PermissionError:
                         # We might not have permissions, if the compiler is currently
                         # running.
+                        for other in comp_futures:
+                            other.cancel()
                         export_screen.reset()
                         messagebox.showerror(
                             title=_('BEE2 - Export Failed!'),
@@ -860,10 +1023,11 @@ class Game:
                         return False, vpk_success
                     export_screen.step('COMP')
 
-            if should_refresh:
-                LOGGER.info('Copying Resources!')
-                music_files = self.copy_mod_music()
-                self.refresh_cache(music_files)
+                # After the compiler, so a running compiler is reported first.
+                if should_refresh:
+                    LOGGER.info('Copying Resources!')
+                    music_files = self.copy_mod_music()
+                    self.refresh_cache(music_files)
 
             LOGGER.info('Optimizing editor models...')
             self.clean_editor_models(editoritems)
@@ -3,7 +3,8 @@
 Given a grid of on/off positions, produce a set of rectangular boxes that
 efficiently cover the True positions without the False ones.
 """
-from typing import Tuple, Dict
+from collections import deque
+from typing import Tuple, Dict, List, Set, Iterator, Optional
 
 from enum import Enum
 
@@ -26,12 +27,18 @@ class Pos(Enum):
         return '-x#'[self.value]
 
 
-def optimise(grid: Dict[Tuple[int, int], bool]):
+def optimise(grid: Dict[Tuple[int, int], bool], exact: bool=False):
     """Given a grid, return min, max pairs which fill the space.
 
     The grid should be a (x, y): bool dict.
     This yields (min_x, min_y, max_x, max_y) tuples.
+    If exact is True, a slower algorithm is used which produces the
+    minimum number of rectangles.
     """
+    if exact:
+        yield from _Bitmap(grid).partition()
+        return
+
     x_len = y_len = 0
     for x, y in grid:
         x_len = max(x, x_len)
@@ -102,3 +109,267 @@ def _do_cell(
             grid[x, y] = Pos.SET
 
     return min_x, min_y, max_x - 1, max_y - 1
+
+
+class _Bitmap:
+    """A grid stored as a flat array of cells, used for exact partitions.
+
+    This finds the minimum rectangle partition of a rectilinear polygon.
+    Cells are at integer (x, y) positions, and the corners of cells are the
+    points (x, y) to (x+1, y+1). Each reflex (270 degree) corner needs to be
+    split by a cut. A cut joining two reflex corners (a chord) fixes both, so
+    we pick the largest set of non-intersecting chords. Horizontal chords
+    only intersect vertical ones, so that's the maximum independent set of a
+    bipartite graph, found via a maximum matching. Any remaining reflex
+    corners are then cut to the nearest edge.
+    """
+    def __init__(self, grid: Dict[Tuple[int, int], bool]) -> None:
+        x_len = y_len = 0
+        for x, y in grid:
+            x_len = max(x, x_len)
+            y_len = max(y, y_len)
+        # Force to int if they're floats.
+        self.x_len = x_len = int(x_len) + 1
+        self.y_len = y_len = int(y_len) + 1
+        self.cells = bytearray(x_len * y_len)
+        for (x, y), value in grid.items():
+            if value and x >= 0 and y >= 0:
+                self.cells[int(x) * y_len + int(y)] = 1
+
+        # Cuts between cells, stored as the lower point of each
+        # unit length segment.
+        self.cut_horiz: Set[Tuple[int, int]] = set()
+        self.cut_vert: Set[Tuple[int, int]] = set()
+
+    def filled(self, x: int, y: int) -> bool:
+        """Check if this cell should be filled."""
+        return (
+            0 <= x < self.x_len and 0 <= y < self.y_len and
+            self.cells[x * self.y_len + y] == 1
+        )
+
+    def reflex_dir(self, x: int, y: int) -> Tuple[int, int]:
+        """If the point is a reflex corner, return the directions to cut in.
+
+        Otherwise, (0, 0) is returned.
+        """
+        missing = [
+            (off_x, off_y)
+            for off_x, off_y in [(-1, -1), (1, -1), (-1, 1), (1, 1)]
+            if not self.filled(
+                x + (off_x - 1) // 2,
+                y + (off_y - 1) // 2,
+            )
+        ]
+        if len(missing) == 1:
+            # Cut away from the missing cell.
+            [(off_x, off_y)] = missing
+            return -off_x, -off_y
+        return 0, 0
+
+    def is_interior(self, x: int, y: int, dx: int, dy: int) -> bool:
+        """Check if the unit segment from this point is inside the shape."""
+        if dx:
+            seg_x = min(x, x + dx)
+            return self.filled(seg_x, y - 1) and self.filled(seg_x, y)
+        else:
+            seg_y = min(y, y + dy)
+            return self.filled(x - 1, seg_y) and self.filled(x, seg_y)
+
+    def touches_cut(self, x: int, y: int) -> bool:
+        """Check if any existing cut touches this point."""
+        return (
+            (x, y) in self.cut_horiz or (x - 1, y) in self.cut_horiz or
+            (x, y) in self.cut_vert or (x, y - 1) in self.cut_vert
+        )
+
+    def walk(
+        self,
+        x: int, y: int,
+        dx: int, dy: int,
+        stop_at_cuts: bool,
+    ) -> Tuple[int, int, bool]:
+        """Extend a cut from a point, until hitting an edge or reflex corner.
+
+        This returns the end point, and whether it's a reflex corner.
+        """
+        while self.is_interior(x, y, dx, dy):
+            x += dx
+            y += dy
+            if self.reflex_dir(x, y) != (0, 0):
+                return x, y, True
+            if stop_at_cuts and self.touches_cut(x, y):
+                break
+        return x, y, False
+
+    def add_cut(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Add a horizontal or vertical cut between two points."""
+        if y1 == y2:
+            for x in range(min(x1, x2), max(x1, x2)):
+                self.cut_horiz.add((x, y1))
+        else:
+            for y in range(min(y1, y2), max(y1, y2)):
+                self.cut_vert.add((x1, y))
+
+    def find_chords(self) -> Tuple[
+        List[Tuple[int, int, int, int]],
+        List[Tuple[int, int, int, int]],
+        List[Tuple[int, int]],
+    ]:
+        """Find all the reflex corners, and chords between them.
+
+        Chords are (x1, y1, x2, y2) tuples, with the lower point first.
+        """
+        horiz = []
+        vert = []
+        reflex = []
+        for x in range(self.x_len + 1):
+            for y in range(self.y_len + 1):
+                dx, dy = self.reflex_dir(x, y)
+                if not dx:
+                    continue
+                reflex.append((x, y))
+                # Only add each chord once, from the upper end.
+                if dx < 0:
+                    end_x, end_y, is_chord = self.walk(x, y, dx, 0, False)
+                    if is_chord:
+                        horiz.append((end_x, y, x, y))
+                if dy < 0:
+                    end_x, end_y, is_chord = self.walk(x, y, 0, dy, False)
+                    if is_chord:
+                        vert.append((x, end_y, x, y))
+        return horiz, vert, reflex
+
+    def partition(self) -> Iterator[Tuple[int, int, int, int]]:
+        """Split the shape into the minimum number of rectangles."""
+        horiz, vert, reflex = self.find_chords()
+
+        # Horizontal chord index -> intersecting vertical chords.
+        graph = [
+            [
+                v_ind
+                for v_ind, (v_x, v_y1, _, v_y2) in enumerate(vert)
+                if h_x1 <= v_x <= h_x2 and v_y1 <= h_y <= v_y2
+            ]
+            for (h_x1, h_y, h_x2, _) in horiz
+        ]
+        match_horiz, match_vert = _max_matching(graph, len(vert))
+
+        # Konig's theorem - the vertices reachable from unmatched horizontal
+        # chords via alternating paths give the minimum vertex cover, and so
+        # the maximum independent set.
+        seen_horiz: Set[int] = set()
+        seen_vert: Set[int] = set()
+        todo = deque(
+            h_ind for h_ind, v_ind in enumerate(match_horiz)
+            if v_ind is None
+        )
+        seen_horiz.update(todo)
+        while todo:
+            h_ind = todo.popleft()
+            for v_ind in graph[h_ind]:
+                if v_ind in seen_vert:
+                    continue
+                seen_vert.add(v_ind)
+                next_h = match_vert[v_ind]
+                if next_h is not None and next_h not in seen_horiz:
+                    seen_horiz.add(next_h)
+                    todo.append(next_h)
+
+        fixed: Set[Tuple[int, int]] = set()
+        for chords, chosen in [
+            (horiz, seen_horiz),
+            (vert, set(range(len(vert))) - seen_vert),
+        ]:
+            for ind in chosen:
+                x1, y1, x2, y2 = chords[ind]
+                self.add_cut(x1, y1, x2, y2)
+                fixed.add((x1, y1))
+                fixed.add((x2, y2))
+
+        # Cut the remaining corners, in whichever direction is shorter.
+        for x, y in reflex:
+            if (x, y) in fixed:
+                continue
+            dx, dy = self.reflex_dir(x, y)
+            end_x, _, horiz_reflex = self.walk(x, y, dx, 0, True)
+            _, end_y, vert_reflex = self.walk(x, y, 0, dy, True)
+            if abs(end_x - x) <= abs(end_y - y):
+                end_y = y
+                if horiz_reflex:
+                    fixed.add((end_x, y))
+            else:
+                end_x = x
+                if vert_reflex:
+                    fixed.add((x, end_y))
+            self.add_cut(x, y, end_x, end_y)
+
+        # Every region is now a rectangle, so just find the extents.
+        done = bytearray(len(self.cells))
+        y_len = self.y_len
+        for min_x in range(self.x_len):
+            for min_y in range(y_len):
+                if not self.cells[min_x * y_len + min_y] or done[min_x * y_len + min_y]:
+                    continue
+                max_x = min_x
+                while (
+                    self.filled(max_x + 1, min_y) and
+                    (max_x + 1, min_y) not in self.cut_vert
+                ):
+                    max_x += 1
+                max_y = min_y
+                while (
+                    self.filled(min_x, max_y + 1) and
+                    (min_x, max_y + 1) not in self.cut_horiz
+                ):
+                    max_y += 1
+                for x in range(min_x, max_x + 1):
+                    for y in range(min_y, max_y + 1):
+                        if done[x * y_len + y]:
+                            # The cuts didn't produce rectangles.
+                            raise ValueError(
+                                'Rectangle ({}, {}) - ({}, {}) overlaps '
+                                'another at ({}, {})!'.format(
+                                    min_x, min_y, max_x, max_y, x, y,
+                                )
+                            )
+                        done[x * y_len + y] = 1
+                yield min_x, min_y, max_x, max_y
+
+
+def _max_matching(
+    graph: List[List[int]],
+    right_count: int,
+) -> Tuple[List[Optional[int]], List[Optional[int]]]:
+    """Find a maximum matching in a bipartite graph.
+
+    graph[left] is a list of the right nodes each left node connects to.
+    This returns the right node matched to each left node, and vice versa.
+    """
+    match_left = [None] * len(graph)  # type: List[Optional[int]]
+    match_right = [None] * right_count  # type: List[Optional[int]]
+    for start in range(len(graph)):
+        # Breadth-first search for an augmenting path.
+        # right node -> the left node we reached it from.
+        parent = {}  # type: Dict[int, int]
+        todo = deque([start])
+        free_right = None
+        while todo and free_right is None:
+            left = todo.popleft()
+            for right in graph[left]:
+                if right in parent:
+                    continue
+                parent[right] = left
+                if match_right[right] is None:
+                    free_right = right
+                    break
+                todo.append(match_right[right])
+        # Flip the matches along the path.
+        right = free_right
+        while right is not None:
+            left = parent[right]
+            next_right = match_left[left]
+            match_left[left] = right
+            match_right[right] = left
+            right = next_right
+    return match_left, match_right
@@ -5,20 +5,30 @@ it could get deleted, which will make the rendered image vanish.
 """
 
 from PIL import ImageTk, Image, ImageDraw
+from collections import OrderedDict
+import io
 import os
+import pickle
+import queue
+import threading
+import zlib
 
 from srctools import Vec
-from srctools.filesys import FileSystem, RawFileSystem, FileSystemChain
+from srctools.filesys import File, FileSystem, RawFileSystem, FileSystemChain
 import srctools.logger
 import logging
 import utils
 from tk_tools import TK_ROOT  # Make sure this is initialised!
 
-from typing import Iterable, Union, Dict, Tuple
+from typing import Iterable, Union, Dict, Tuple, Optional, Set, BinaryIO
 
 LOGGER = srctools.logger.get_logger('img')
 
 cached_img = {}  # type: Dict[Tuple[str, int, int], ImageTk.PhotoImage]
+# Images which are only shown briefly, like the large selector icons.
+# Only the most recent are kept, the rest are freed.
+TRANSIENT_COUNT = 16
+transient_img = OrderedDict()  # type: OrderedDict[Tuple[str, int, int], ImageTk.PhotoImage]
 # r, g, b, size -> image
 cached_squares = {}  # type: Dict[Union[Tuple[float, float, float, int], Tuple[str, int]], ImageTk.PhotoImage]
 
@@ -26,6 +36,46 @@ filesystem = FileSystemChain(
     # Highest priority is the in-built UI images.
     RawFileSystem(str(utils.install_path('images'))),
 )
+# The filesystems aren't thread-safe, so the loader thread and the UI
+# need to take turns reading from them.
+_fsys_lock = threading.Lock()
+
+# Increment to discard the saved icon cache.
+ICON_CACHE_VERSION = 2
+# (package, path, width, height, algo, mtime)
+# Decoded and resized images are saved between launches, so Pillow doesn't
+# need to decode them again. The file is a blob index, so only the icons
+# actually used are read from it.
+IconKey = Tuple[str, str, int, int, int, float]
+# The name of the blob holding the version of the cache.
+_ICON_VERSION_NAME = ''
+# The loader thread stores icons too, so this guards all the values below.
+_icon_lock = threading.Lock()
+# Icons decoded this launch -> (mode, size, compressed pixels).
+_icon_cache: Dict[IconKey, Tuple[str, Tuple[int, int], bytes]] = {}
+# The saved icons, read when first needed. This maps the name of each
+# to its offset and size in _icon_file.
+_icon_index: Optional[Dict[str, Tuple[int, int]]] = None
+_icon_file: Optional[BinaryIO] = None
+# Keys used this launch, so unused icons can be dropped when saving.
+_icon_used: Set[IconKey] = set()
+_icon_cache_dirty = False
+try:
+    ICON_CACHE_LOC = str(utils.conf_location('cache/icons.idx'))
+except FileNotFoundError:
+    # No config folder, so we can't save anything.
+    ICON_CACHE_LOC = None  # type: Optional[str]
+
+# Images waiting to be decoded, and then to be given to Tk.
+# The loader thread reads from _load_queue, then puts results in
+# _done_queue so the UI thread can copy them into the PhotoImage.
+_load_queue = queue.Queue()  # type: queue.Queue[Tuple[File, IconKey, Tuple[int, int], int, ImageTk.PhotoImage]]
+_done_queue = queue.Queue()  # type: queue.Queue[Tuple[ImageTk.PhotoImage, Optional[Image.Image]]]
+_loader_thread = None  # type: Optional[threading.Thread]
+# The number of images which haven't been copied into Tk yet.
+_pending_count = 0
+# The number of images copied into Tk each time the UI checks.
+DONE_BATCH = 32
 
 # Silence DEBUG messages from Pillow, they don't help.
 logging.getLogger('PIL').setLevel(logging.INFO)
@@ -37,6 +87,220 @@ def load_filesystems(systems: Iterable[FileSystem]):
         filesystem.add_sys(sys, 'resources/BEE2/')
 
 
+def _icon_version() -> bytes:
+    """The version stored in the icon cache, to detect outdated ones."""
+    return '{}:{}'.format(ICON_CACHE_VERSION, utils.BEE_VERSION).encode('utf8')
+
+
+def _icon_name(key: IconKey) -> str:
+    """The name used for an icon in the cache file."""
+    return repr(key)
+
+
+def _open_icon_cache() -> None:
+    """Read the index of the icons saved by the previous launch.
+
+    _icon_lock must be held.
+    """
+    global _icon_index, _icon_file
+    _icon_index = {}
+    if ICON_CACHE_LOC is None:
+        return
+    try:
+        index = utils.read_blob_index(ICON_CACHE_LOC)
+        icon_file = open(ICON_CACHE_LOC, 'rb')
+    except FileNotFoundError:
+        return
+    except Exception:
+        LOGGER.warning('Could not read icon cache:', exc_info=True)
+        return
+    try:
+        offset, size = index.pop(_ICON_VERSION_NAME)
+        icon_file.seek(offset)
+        version = icon_file.read(size)
+    except (KeyError, OSError):
+        version = b''
+    if version != _icon_version():
+        LOGGER.debug('Icon cache is outdated.')
+        icon_file.close()
+        return
+    _icon_index = index
+    _icon_file = icon_file
+
+
+def _read_saved_icon(name: str) -> Optional[bytes]:
+    """Read an icon from the cache file, if present.
+
+    _icon_lock must be held, and the index loaded.
+    """
+    try:
+        offset, size = _icon_index[name]
+    except KeyError:
+        return None
+    try:
+        _icon_file.seek(offset)
+        return _icon_file.read(size)
+    except OSError:
+        LOGGER.warning('Could not read icon cache:', exc_info=True)
+        return None
+
+
+def save_icon_cache() -> None:
+    """Write the decoded icons back, dropping ones not used this launch."""
+    global _icon_cache_dirty, _icon_file
+    if ICON_CACHE_LOC is None:
+        return
+    with _icon_lock:
+        if _icon_index is None:
+            return  # No icons were looked up, leave it alone.
+        if not _icon_cache_dirty and len(_icon_used) == len(_icon_index):
+            return
+        blobs = {_ICON_VERSION_NAME: _icon_version()}
+        for key in _icon_used:
+            name = _icon_name(key)
+            try:
+                icon = _icon_cache[key]
+            except KeyError:
+                blob = _read_saved_icon(name)
+                if blob is None:
+                    continue
+            else:
+                blob = pickle.dumps(icon, pickle.HIGHEST_PROTOCOL)
+            blobs[name] = blob
+
+        # We can't replace the file while it's open on Windows.
+        if _icon_file is not None:
+            _icon_file.close()
+            _icon_file = None
+        try:
+            utils.write_blob_index(ICON_CACHE_LOC, blobs)
+        except Exception:
+            LOGGER.warning('Could not write icon cache:', exc_info=True)
+        else:
+            _icon_cache_dirty = False
+            _icon_cache.clear()
+        # Reopen, in case more icons are used.
+        _open_icon_cache()
+
+
+def _icon_key(img_file: File, size: Tuple[int, int], algo: int) -> Optional[IconKey]:
+    """Compute the key for an image in the icon cache.
+
+    This includes the modification time, so changed images are decoded again.
+    If the time can't be determined, None is returned.
+    """
+    sys = FileSystemChain.get_system(img_file)
+    try:
+        if isinstance(sys, RawFileSystem):
+            mtime = os.stat(os.path.join(sys.path, img_file.path)).st_mtime
+        else:
+            # Zips etc - any change to the package will change this.
+            mtime = os.stat(sys.path).st_mtime
+    except OSError:
+        return None
+    width, height = size
+    return sys.path, img_file.path, width, height, algo, mtime
+
+
+def _decode(img_file: File, size: Tuple[int, int], algo: int) -> Image.Image:
+    """Read and resize an image."""
+    with _fsys_lock, filesystem, img_file.open_bin() as file:
+        data = file.read()
+    image = Image.open(io.BytesIO(data))  # type: Image.Image
+    image.load()
+    if size != (0, 0) and size != image.size:
+        image = image.resize(size, algo)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    return image
+
+
+def _store_icon(key: Optional[IconKey], image: Image.Image) -> None:
+    """Save a decoded image into the icon cache."""
+    global _icon_cache_dirty
+    if key is not None:
+        icon = image.mode, image.size, zlib.compress(image.tobytes(), 1)
+        with _icon_lock:
+            _icon_cache[key] = icon
+            _icon_used.add(key)
+            _icon_cache_dirty = True
+
+
+def _cached_icon(key: Optional[IconKey]) -> Optional[Image.Image]:
+    """Fetch an image from the icon cache, if present."""
+    if key is None:
+        return None
+    with _icon_lock:
+        if _icon_index is None:
+            _open_icon_cache()
+        try:
+            mode, size, data = _icon_cache[key]
+        except KeyError:
+            blob = _read_saved_icon(_icon_name(key))
+            if blob is None:
+                return None
+            mode, size, data = pickle.loads(blob)
+        _icon_used.add(key)
+    return Image.frombytes(mode, size, zlib.decompress(data))
+
+
+def _loader_main() -> None:
+    """Run in the loader thread, decoding images."""
+    while True:
+        img_file, key, size, algo, tk_img = _load_queue.get()
+        try:
+            image = _decode(img_file, size, algo)
+        except Exception:
+            LOGGER.warning('Could not load image "{}":', img_file.path, exc_info=True)
+            # Leave it blank.
+            _done_queue.put((tk_img, None))
+        else:
+            _store_icon(key, image)
+            _done_queue.put((tk_img, image))
+
+
+def _apply_loaded() -> None:
+    """Copy decoded images into Tk. This must run on the UI thread."""
+    global _pending_count
+    for _ in range(DONE_BATCH):
+        try:
+            tk_img, image = _done_queue.get_nowait()
+        except queue.Empty:
+            break
+        _pending_count -= 1
+        if image is not None:
+            tk_img.paste(image)
+    # Once everything is done, png() will restart us.
+    if _pending_count:
+        TK_ROOT.after(10, _apply_loaded)
+
+
+def _load_background(
+    img_file: File,
+    key: Optional[IconKey],
+    size: Tuple[int, int],
+    algo: int,
+) -> ImageTk.PhotoImage:
+    """Decode an image in the loader thread.
+
+    A blank image is returned, which is filled in once that's done.
+    """
+    global _loader_thread, _pending_count
+    tk_img = ImageTk.PhotoImage('RGBA', size)
+    _load_queue.put((img_file, key, size, algo, tk_img))
+    if _loader_thread is None:
+        _loader_thread = threading.Thread(
+            target=_loader_main,
+            name='img_loader',
+            daemon=True,
+        )
+        _loader_thread.start()
+    if not _pending_count:
+        TK_ROOT.after(10, _apply_loaded)
+    _pending_count += 1
+    return tk_img
+
+
 def tuple_size(size: Union[Tuple[int, int], int]) -> Tuple[int, int]:
     """Return an xy tuple given a size or tuple."""
     if isinstance(size, tuple):
@@ -50,7 +314,7 @@ def color_hex(color: Vec) -> str:
     return '#{:2X}{:2X}{:2X}'.format(int(r), int(g), int(b))
 
 
-def png(path: str, resize_to=0, error=None, algo=Image.NEAREST):
+def png(path: str, resize_to=0, error=None, algo=Image.NEAREST, transient=False):
     """Loads in an image for use in TKinter.
 
     - The .png suffix will automatically be added.
@@ -60,6 +324,11 @@ def png(path: str, resize_to=0, error=None, algo=Image.NEAREST):
     algorithm.
     - This caches images, so it won't be deleted (Tk doesn't keep a reference
       to the Python object), and subsequent calls don't touch the hard disk.
+    - Decoded images are saved between launches. If resized, new images are
+      decoded in a background thread, and filled in once they're ready.
+    - If transient is set, the image is only kept until a number of other
+      transient images are loaded. Whatever displays it should keep a
+      reference.
     """
     path = path.casefold().replace('\\', '/')
     if path[-4:-3] != '.':
@@ -69,28 +338,44 @@ def png(path: str, resize_to=0, error=None, algo=Image.NEAREST):
 
     resize_width, resize_height = resize_to = tuple_size(resize_to)
 
+    key = path, resize_width, resize_height
+    try:
+        return cached_img[key]
+    except KeyError:
+        pass
     try:
-        return cached_img[path, resize_width, resize_height]
+        tk_img = transient_img[key]
     except KeyError:
         pass
+    else:
+        transient_img.move_to_end(key)
+        return tk_img
 
-    with filesystem:
+    with _fsys_lock, filesystem:
         try:
             img_file = filesystem[path]
         except (KeyError, FileNotFoundError):
             LOGGER.warning('ERROR: "images/{}" does not exist!', orig_path)
             return error or img_error
-        with img_file.open_bin() as file:
-            image = Image.open(file)  # type: Image.Image
-            image.load()
 
-    if resize_to != (0, 0) and resize_to != image.size:
-        image = image.resize(resize_to, algo)
-        # image.save(img_file._data.sys._resolve_path(img_file._data.path))
-
-    tk_img = ImageTk.PhotoImage(image=image)
-
-    cached_img[orig_path, resize_width, resize_height] = tk_img
+    icon_key = _icon_key(img_file, resize_to, algo)
+    image = _cached_icon(icon_key)
+    if image is not None:
+        tk_img = ImageTk.PhotoImage(image=image)
+    elif resize_to != (0, 0):
+        # We know the size, so the decoding can be done later.
+        tk_img = _load_background(img_file, icon_key, resize_to, algo)
+    else:
+        image = _decode(img_file, resize_to, algo)
+        _store_icon(icon_key, image)
+        tk_img = ImageTk.PhotoImage(image=image)
+
+    if transient:
+        transient_img[key] = tk_img
+        while len(transient_img) > TRANSIENT_COUNT:
+            transient_img.popitem(last=False)
+    else:
+        cached_img[key] = tk_img
     return tk_img
 
 
@@ -228,6 +513,7 @@ def invis_square(size):
 
         return tk_img
 
+
 # Colour of the palette item background
 PETI_ITEM_BG = Vec(229, 232, 233)
 PETI_ITEM_BG_HEX = color_hex(PETI_ITEM_BG)
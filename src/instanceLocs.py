@@ -12,8 +12,8 @@ from srctools import Property
 import srctools.logger
 
 from typing import (
-    Optional, Union,
-    List, Dict, Tuple, TypeVar
+    Optional, Union, Callable,
+    List, Dict, Tuple, TypeVar, FrozenSet,
 )
 
 LOGGER = srctools.logger.get_logger(__name__)
@@ -218,6 +218,8 @@ SPECIAL_INST_FOLDED = {
 
 def load_conf(prop_block: Property):
     """Read the config and build our dictionaries."""
+    # Any cached lookups are now invalid.
+    resolve.cache_clear()
     # Extra definitions: key -> filename.
     # Make sure to do this first, so numbered instances are set in
     # ITEM_FOR_FILE.
@@ -267,18 +269,38 @@ def resolve(path: str, silent: bool=False) -> List[str]:
     If silent is True, no error messages will be output (for use with hardcoded
     names).
     """
+    return _call_silenced(_resolve, path, silent)
+
+
+def resolve_set(path: str, silent: bool=False) -> FrozenSet[str]:
+    """Resolve an instance path into a set of the values it refers to.
+
+    This is the same as resolve(), but is faster for checking if an instance
+    matches.
+    """
+    return _call_silenced(_resolve_set, path, silent)
+
+
+Default_T = TypeVar('Default_T')
+Result_T = TypeVar('Result_T')
+
+
+def _call_silenced(
+    func: Callable[[str], Result_T],
+    path: str,
+    silent: bool,
+) -> Result_T:
+    """Call one of the resolve functions, optionally hiding warnings."""
     if silent:
         # Ignore messages < ERROR (warning and info)
         log_level = LOGGER.level
         LOGGER.setLevel(logging.ERROR)
         try:
-            return _resolve(path)
+            return func(path)
         finally:
             LOGGER.setLevel(log_level)
     else:
-        return _resolve(path)
-
-Default_T = TypeVar('Default_T')
+        return func(path)
 
 
 def resolve_one(path, default: Default_T='', error=False) -> Union[str, Default_T]:
@@ -347,6 +369,12 @@ def _resolve(path: str) -> List[str]:
         return [path.casefold()]
 
 
+@lru_cache(maxsize=256)
+def _resolve_set(path: str) -> FrozenSet[str]:
+    """Cached set version of _resolve()."""
+    return frozenset(_resolve(path))
+
+
 def get_subitems(comma_list, item_inst, item_id) -> List[str]:
     """Pick out the subitems from a list."""
     output = []
@@ -407,9 +435,15 @@ def get_subitems(comma_list, item_inst, item_id) -> List[str]:
     return inst_out
 
 
+def _cache_clear() -> None:
+    """Clear both resolve() caches."""
+    _resolve.cache_clear()
+    _resolve_set.cache_clear()
+
 # Copy over the lru_cache() functions to make them easily acessable.
 resolve.cache_info = _resolve.cache_info
-resolve.cache_clear = _resolve.cache_clear
+resolve.cache_clear = _cache_clear
+resolve_set.cache_info = _resolve_set.cache_info
 
 
 def get_cust_inst(item_id: str, inst: str) -> Optional[str]:
@@ -17,7 +17,7 @@ from BEE2_config import GEN_OPTS
 import utils
 import srctools.logger
 
-from typing import Set, Tuple, cast, Any, Type
+from typing import Set, Tuple, Dict, List, cast, Any, Type
 
 
 # Keep a reference to all loading screens, so we can close them globally.
@@ -32,6 +32,17 @@ _SCREEN_CANCEL_FLAG: Set[int] = set()
 _PIPE_MAIN_REC, _PIPE_DAEMON_SEND = multiprocessing.Pipe(duplex=False)
 _PIPE_DAEMON_REC, _PIPE_MAIN_SEND = multiprocessing.Pipe(duplex=False)
 
+# The progress for each stage is kept in shared memory, so stepping doesn't
+# need to send a message. The daemon reads these on a timer, which combines
+# bursts of steps into one redraw. Each screen is assigned a slot per stage.
+MAX_SLOTS = 256
+_STEP_COUNTS = multiprocessing.RawArray('L', MAX_SLOTS)
+_FREE_SLOTS: List[int] = list(range(MAX_SLOTS - 1, -1, -1))
+# The daemon increments this whenever it sends us a message, so step() only
+# needs to check the pipe when it changes.
+_REPLY_COUNT = multiprocessing.RawValue('L', 0)
+_replies_seen = 0
+
 
 class Cancelled(SystemExit):
     """Raised when the user cancels the loadscreen."""
@@ -101,8 +112,16 @@ class LoadScreen:
 
         _ALL_SCREENS.add(self)
 
+        # Stage -> slot in _STEP_COUNTS. If we run out, steps are sent
+        # as messages instead.
+        self._slots: Dict[str, int] = {}
+        for st_id, title in stages:
+            if _FREE_SLOTS:
+                slot = self._slots[st_id] = _FREE_SLOTS.pop()
+                _STEP_COUNTS[slot] = 0
+
         # Order the daemon to make this screen.
-        self._send_msg('init', is_splash, title_text, stages)
+        self._send_msg('init', is_splash, title_text, stages, self._slots)
 
     def __enter__(self) -> 'LoadScreen':
         """LoadScreen can be used as a context manager.
@@ -126,7 +145,12 @@ class LoadScreen:
     def _send_msg(self, command: str, *args: Any) -> None:
         """Send a message to the daemon."""
         _PIPE_MAIN_SEND.send((command, id(self), args))
-        # Check the messages coming back as well.
+        self._check_replies()
+
+    def _check_replies(self) -> None:
+        """Handle messages sent back by the daemon."""
+        global _replies_seen
+        _replies_seen = _REPLY_COUNT.value
         while _PIPE_MAIN_REC.poll():
             arg: Any
             command, arg = _PIPE_MAIN_REC.recv()
@@ -153,10 +177,22 @@ class LoadScreen:
 
     def step(self, stage: str) -> None:
         """Increment the specified stage."""
-        self._send_msg('step', stage)
+        try:
+            slot = self._slots[stage]
+        except KeyError:
+            self._send_msg('step', stage)
+            return
+        _STEP_COUNTS[slot] += 1
+        # Only check the pipe if the daemon has sent something.
+        if _REPLY_COUNT.value != _replies_seen or id(self) in _SCREEN_CANCEL_FLAG:
+            self._check_replies()
 
     def skip_stage(self, stage: str) -> None:
         """Skip over this stage of the loading process."""
+        try:
+            _STEP_COUNTS[self._slots[stage]] = 0
+        except KeyError:
+            pass
         self._send_msg('skip_stage', stage)
 
     def show(self) -> None:
@@ -167,6 +203,8 @@ class LoadScreen:
     def reset(self) -> None:
         """Hide the loading screen and reset all the progress bars."""
         self.active = False
+        for slot in self._slots.values():
+            _STEP_COUNTS[slot] = 0
         self._send_msg('reset')
 
     def destroy(self):
@@ -174,6 +212,8 @@ class LoadScreen:
         self.active = False
         self._send_msg('destroy')
         _ALL_SCREENS.remove(self)
+        _FREE_SLOTS.extend(self._slots.values())
+        self._slots.clear()
 
     @abstractmethod
     def suppress(self) -> None:
@@ -194,6 +234,8 @@ _daemon = multiprocessing.Process(
     args=(
         _PIPE_DAEMON_SEND,
         _PIPE_DAEMON_REC,
+        _STEP_COUNTS,
+        _REPLY_COUNT,
         # Pass translation strings.
         {
             'skip': _('Skipped!'),
@@ -4,12 +4,13 @@ During package loading, we are busy performing tasks in the main thread.
 We do this in another process to sidestep the GIL, and ensure the screen
 remains responsive. This is a separate module to reduce the required dependencies.
 """
-from typing import Optional, Dict, Tuple, List
+from typing import Optional, Dict, Tuple, List, Sequence
 
 from tkinter import ttk
 from tkinter.font import Font
 import tkinter as tk
 import multiprocessing.connection
+import ctypes
 
 import utils
 
@@ -18,6 +19,13 @@ SCREENS: Dict[int, 'BaseLoadScreen'] = {}
 
 PIPE_REC: multiprocessing.connection.Connection
 PIPE_SEND: multiprocessing.connection.Connection
+# Shared with the main process. STEP_COUNTS holds the progress for each
+# stage, and REPLY_COUNT is incremented whenever we send a message.
+STEP_COUNTS: Sequence[int]
+REPLY_COUNT: ctypes.c_ulong
+
+# How often (in ms) to check progress while a screen is visible.
+UPDATE_RATE = 50
 
 # Stores translated strings, which are done in the main process.
 TRANSLATION = {
@@ -33,6 +41,12 @@ SPLASH_FONTS = [
 ]
 
 
+def send_reply(*msg) -> None:
+    """Send a message to the main process."""
+    PIPE_SEND.send(msg)
+    REPLY_COUNT.value += 1
+
+
 class BaseLoadScreen:
     """Code common to both loading screen types."""
     def __init__(
@@ -42,6 +56,7 @@ class BaseLoadScreen:
         title_text: str,
         force_ontop: bool,
         stages: List[Tuple[str, str]],
+        slots: Dict[str, int],
     ) -> None:
         self.scr_id = scr_id
         self.title_text = title_text
@@ -59,6 +74,8 @@ class BaseLoadScreen:
         self.names = {}
         self.stages = stages
         self.is_shown = False
+        # Stage -> index in STEP_COUNTS.
+        self.slots = slots
 
         for st_id, stage_name in stages:
             self.values[st_id] = 0
@@ -76,7 +93,7 @@ class BaseLoadScreen:
     def cancel(self, event: tk.Event=None):
         """User pressed the cancel button."""
         self.op_reset()
-        PIPE_SEND.send(('cancel', self.scr_id))
+        send_reply('cancel', self.scr_id)
 
     def move_start(self, event: tk.Event):
         """Record offset of mouse on click."""
@@ -122,10 +139,21 @@ class BaseLoadScreen:
         self.reset_stages()
 
     def op_step(self, stage: str) -> None:
-        """Increment the specified value."""
+        """Increment the specified value.
+
+        This is only used if the stage has no shared counter.
+        """
         self.values[stage] += 1
         self.update_stage(stage)
 
+    def read_counts(self) -> None:
+        """Update stages from the shared step counts."""
+        for stage, slot in self.slots.items():
+            count = STEP_COUNTS[slot]
+            if count != self.values[stage]:
+                self.values[stage] = count
+                self.update_stage(stage)
+
     def op_set_length(self, stage: str, num: int) -> None:
         """Set the number of items in a stage."""
         self.maxes[stage] = num
@@ -542,7 +570,7 @@ class SplashScreen(BaseLoadScreen):
         else:
             self.sml_canvas.grid_remove()
             self.lrg_canvas.grid(row=0, column=0)
-        PIPE_SEND.send(('main_set_compact', is_compact))
+        send_reply('main_set_compact', is_compact)
 
     def toggle_compact(self, event: tk.Event) -> None:
         """Toggle when the splash screen is double-clicked."""
@@ -573,14 +601,18 @@ class SplashScreen(BaseLoadScreen):
 def run_screen(
     pipe_send: multiprocessing.connection.Connection,
     pipe_rec: multiprocessing.connection.Connection,
+    step_counts: Sequence[int],
+    reply_count: ctypes.c_ulong,
     # Pass in various bits of translated text
     # so we don't need to do it here.
     translations,
 ):
     """Runs in the other process, with an end of a pipe for input."""
-    global PIPE_REC, PIPE_SEND
+    global PIPE_REC, PIPE_SEND, STEP_COUNTS, REPLY_COUNT
     PIPE_SEND = pipe_send
     PIPE_REC = pipe_rec
+    STEP_COUNTS = step_counts
+    REPLY_COUNT = reply_count
     TRANSLATION.update(translations)
 
     root = tk.Tk()
@@ -596,8 +628,8 @@ def run_screen(
             operation, scr_id, args = PIPE_REC.recv()
             if operation == 'init':
                 # Create a new loadscreen.
-                is_main, title, stages = args
-                screen = (SplashScreen if is_main else LoadScreen)(root, scr_id, title, force_ontop, stages)
+                is_main, title, stages, slots = args
+                screen = (SplashScreen if is_main else LoadScreen)(root, scr_id, title, force_ontop, stages, slots)
                 SCREENS[scr_id] = screen
             elif operation == 'set_force_ontop':
                 [force_ontop] = args
@@ -613,10 +645,22 @@ def run_screen(
                 except Exception:
                     raise Exception(operation)
 
+        # Steps aren't sent, so read the shared counts for visible screens.
+        any_shown = False
+        for screen in SCREENS.values():
+            if screen.is_shown:
+                any_shown = True
+                screen.read_counts()
+
         # Continually re-run this function in the TK loop.
         # If we didn't find anything in the pipe, wait longer.
         # Otherwise we hog the CPU.
-        root.after(1 if had_values else 200, check_queue)
+        if had_values:
+            root.after(1, check_queue)
+        elif any_shown:
+            root.after(UPDATE_RATE, check_queue)
+        else:
+            root.after(200, check_queue)
     
     root.after(10, check_queue)
     root.mainloop()  # Infinite loop, until the entire process tree quits.
@@ -1,12 +1,18 @@
 """
 Handles scanning through the zip packages to find all items, styles, etc.
 """
+import hashlib
+import io
 import operator
 import os
+import pickle
 import shutil
 import math
 import re
+import threading
 from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from enum import Enum
 
 import srctools
@@ -27,7 +33,7 @@ from typing import (
     Callable, TypeVar, Type, cast,
     Dict, List, Tuple, Set, Match,
     NamedTuple, Collection,
-    Iterable, Iterator,
+    Iterable, Iterator, Generator,
 )
 
 
@@ -48,6 +54,17 @@ OBJ_TYPES: Dict[str, 'ObjType'] = {}
 # Maps a package ID to the matching filesystem for reading files easily.
 PACKAGE_SYS: Dict[str, FileSystem] = {}
 
+# Objects are parsed in a thread pool, but the reference counts of
+# filesystems aren't thread-safe. This maps a filesystem path to the lock
+# used to open and close references, see hold_fsys().
+_FSYS_LOCKS: Dict[str, threading.Lock] = {}
+_FSYS_LOCKS_LOCK = threading.Lock()
+
+# Maps a filesystem path to the cache of parsed files for it.
+PACKAGE_CACHE: Dict[str, 'PackageCache'] = {}
+# Increment to discard all existing package caches.
+PACKAGE_CACHE_VERSION = 1
+
 # Don't change face IDs when copying to here.
 # This allows users to refer to the stuff in templates specifically.
 # The combined VMF isn't to be compiled or edited outside of us, so it's fine
@@ -83,6 +100,7 @@ class ObjType(NamedTuple):
     cls: Type['PakObject']
     allow_mult: bool
     has_img: bool
+    parallel: bool
 
 
 class ExportData(NamedTuple):
@@ -180,6 +198,7 @@ class _PakObjectMeta(type):
         namespace: Dict[str, Any],
         allow_mult: bool = False,
         has_img: bool = True,
+        parallel: bool = True,
     ) -> 'Type[PakObject]':
         """Adds a PakObject to the list of objects.
 
@@ -191,7 +210,7 @@ class _PakObjectMeta(type):
         # Only register subclasses of PakObject - those with a parent class.
         # PakObject isn't created yet so we can't directly check that.
         if bases:
-            OBJ_TYPES[name] = ObjType(cls, allow_mult, has_img)
+            OBJ_TYPES[name] = ObjType(cls, allow_mult, has_img, parallel)
 
         # Maps object IDs to the object.
         cls._id_to_obj = {}
@@ -205,18 +224,21 @@ class _PakObjectMeta(type):
         namespace: Dict[str, Any],
         allow_mult: bool = False,
         has_img: bool = True,
+        parallel: bool = True,
     ) -> None:
         """We have to strip kwargs from the type() calls to prevent errors."""
         type.__init__(cls, name, bases, namespace)
 
 
 class PakObject(metaclass=_PakObjectMeta):
-    """PackObject(allow_mult=False, has_img=True): The base class for package objects.
+    """PackObject(allow_mult=False, has_img=True, parallel=True): The base class for package objects.
 
     In the class base list, set 'allow_mult' to True if duplicates are allowed.
     If duplicates occur, they will be treated as overrides.
     Set 'has_img' to control whether the object will count towards the images
     loading bar - this should be stepped in the UI.load_packages() method.
+    Set 'parallel' to False if parse() modifies global state, so it is always
+    called from the main thread in package order.
     """
     # ID of the object
     id = ...  # type: str
@@ -323,7 +345,7 @@ def get_config(
         # Add extension
         path += extension
     try:
-        return fsys.read_prop(path)
+        return read_prop(fsys, path)
     except FileNotFoundError:
         LOGGER.warning('"{id}:{path}" not in zip!', id=pak_id, path=path)
         return Property(None, [])
@@ -343,39 +365,234 @@ def set_cond_source(props: Property, source: str) -> None:
         cond['__src__'] = source
 
 
-def find_packages(pak_dir: str) -> None:
-    """Search a folder for packages, recursing if necessary."""
+def package_fingerprint(path: str) -> str:
+    """Compute a string which changes whenever the given package is modified.
+
+    For zips this is the size and modification time. Unzipped packages
+    are checked by hashing the same for every file in the tree.
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return '{}:{}'.format(stat.st_size, stat.st_mtime_ns)
+
+    tree_hash = hashlib.sha256()
+    for folder, dirs, files in os.walk(path):
+        # Ensure the walk order doesn't depend on the OS.
+        dirs.sort()
+        for file in sorted(files):
+            full_path = os.path.join(folder, file)
+            stat = os.stat(full_path)
+            tree_hash.update('{}:{}:{}\n'.format(
+                os.path.relpath(full_path, path).replace('\\', '/'),
+                stat.st_size,
+                stat.st_mtime_ns,
+            ).encode('utf8'))
+    return tree_hash.hexdigest()
+
+
+class PackageCache:
+    """Stores the parsed property files for a package between launches.
+
+    The pickled trees are saved in the config folder, and discarded if the
+    package's fingerprint changes. Each read unpickles a fresh copy,
+    so callers are free to modify the result.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.fingerprint = package_fingerprint(path)
+        self.key = (PACKAGE_CACHE_VERSION, utils.BEE_VERSION, self.fingerprint)
+        self.files: Dict[str, bytes] = {}
+        self.dirty = False
+        try:
+            self.filename = str(utils.conf_location('pak_cache/') / (
+                hashlib.sha1(os.path.normcase(path).encode('utf8')).hexdigest()
+                + '.cache'
+            ))
+        except FileNotFoundError:
+            # No config folder, so we can't save anything.
+            self.filename = None
+
+    def load(self) -> None:
+        """Read the cache file, if it's still valid."""
+        if self.filename is None:
+            return
+        try:
+            with open(self.filename, 'rb') as f:
+                key, files = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            LOGGER.warning('Could not read cache for "{}":', self.path, exc_info=True)
+            return
+        if key == self.key:
+            self.files = files
+        else:
+            LOGGER.debug('Cache for "{}" is outdated.', self.path)
+
+    def save(self) -> None:
+        """Write the cache file back, if anything was added."""
+        if self.filename is None or not self.dirty:
+            return
+        try:
+            with open(self.filename + '.tmp', 'wb') as f:
+                pickle.dump((self.key, self.files), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(self.filename + '.tmp', self.filename)
+        except Exception:
+            LOGGER.warning('Could not write cache for "{}":', self.path, exc_info=True)
+        else:
+            self.dirty = False
+
+    def read_prop(self, fsys: FileSystem, path: str) -> Property:
+        """Read a property file, parsing it only if it isn't in the cache."""
+        try:
+            data = self.files[path]
+        except KeyError:
+            prop = fsys.read_prop(path)
+            self.files[path] = pickle.dumps(prop, pickle.HIGHEST_PROTOCOL)
+            self.dirty = True
+            return prop
+        return pickle.loads(data)
+
+
+@contextmanager
+def hold_fsys(fsys: FileSystem) -> Generator[FileSystem, None, None]:
+    """Hold a reference to a filesystem, like "with fsys:".
+
+    This is safe to use from the loading threads. Only opening and closing
+    the reference is locked, the files can be read in parallel. (Zipfiles
+    lock around each read themselves.)
+    """
+    with _FSYS_LOCKS_LOCK:
+        try:
+            lock = _FSYS_LOCKS[fsys.path]
+        except KeyError:
+            lock = _FSYS_LOCKS[fsys.path] = threading.Lock()
+    with lock:
+        fsys.open_ref()
+    try:
+        yield fsys
+    finally:
+        with lock:
+            fsys.close_ref()
+
+
+def read_prop(fsys: FileSystem, path: str) -> Property:
+    """Read a property file from a package, using the cache if possible."""
+    try:
+        cache = PACKAGE_CACHE[fsys.path]
+    except KeyError:
+        return fsys.read_prop(path)
+    return cache.read_prop(fsys, path)
+
+
+def save_package_caches() -> None:
+    """Write out the package caches, and remove those for missing packages."""
+    filenames = set()
+    for cache in PACKAGE_CACHE.values():
+        cache.save()
+        if cache.filename is not None:
+            filenames.add(os.path.basename(cache.filename))
+    try:
+        cache_dir = utils.conf_location('pak_cache/')
+    except FileNotFoundError:
+        return
+    for filename in os.listdir(cache_dir):
+        if filename not in filenames:
+            LOGGER.debug('Removing unused package cache "{}"', filename)
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+            except OSError:
+                pass
+
+
+def _read_package(name: str) -> Optional[Tuple[FileSystem, Optional[Property]]]:
+    """Open a potential package, and read its info.txt file.
+
+    This is run in the loading thread pool. If the filesystem is valid,
+    a reference to it is held open and must be closed by the caller.
+    None is returned for files which aren't packages, and the info is None
+    if it's missing an info.txt.
+    """
+    try:
+        filesys = get_filesystem(name)
+    except ValueError:
+        LOGGER.info('Extra file: {}', name)
+        return None
+
+    LOGGER.debug('Reading package "' + name + '"')
+
+    if isinstance(filesys, RawFileSystem) and not os.path.isfile(
+        os.path.join(name, 'info.txt')
+    ):
+        # A folder which may contain packages, not one itself.
+        # Skip fingerprinting the whole tree.
+        return filesys, None
+
+    cache = PackageCache(name)
+    cache.load()
+    PACKAGE_CACHE[filesys.path] = cache
+
+    # Gain a persistent hold on the filesystem's handle.
+    # That means we don't need to reopen the zip files constantly.
+    filesys.open_ref()
+
+    # Valid packages must have an info.txt file!
+    try:
+        info = cache.read_prop(filesys, 'info.txt')
+    except FileNotFoundError:
+        # Close the ref we've gotten, since it's not in the dict
+        # it won't be done by load_packages().
+        filesys.close_ref()
+        del PACKAGE_CACHE[filesys.path]
+        return filesys, None
+    except BaseException:
+        filesys.close_ref()
+        del PACKAGE_CACHE[filesys.path]
+        raise
+    return filesys, info
+
+
+def find_packages(pak_dir: str, pool: Optional[Executor]=None) -> None:
+    """Search a folder for packages, recursing if necessary.
+
+    If a pool is provided, the packages are opened and read in parallel.
+    They're still added in directory order, so the result is the same either way.
+    """
     found_pak = False
+    names = []
     for name in os.listdir(pak_dir):  # Both files and dirs
         name = os.path.join(pak_dir, name)
         if name.endswith('.vpk') and not name.endswith('_dir.vpk'):
             # _000.vpk files, useless without the directory
             continue
+        names.append(name)
 
+    results: Iterator[Optional[Tuple[FileSystem, Optional[Property]]]]
+    if pool is None:
+        results = map(_read_package, names)
+    else:
+        futures = [pool.submit(_read_package, name) for name in names]
         try:
-            filesys = get_filesystem(name)
-        except ValueError:
-            LOGGER.info('Extra file: {}', name)
-            continue
-
-        LOGGER.debug('Reading package "' + name + '"')
-
-        # Gain a persistent hold on the filesystem's handle.
-        # That means we don't need to reopen the zip files constantly.
-        filesys.open_ref()
+            results = iter([fut.result() for fut in futures])
+        except BaseException:
+            # Release anything the other workers managed to open.
+            for fut in futures:
+                if not fut.cancel() and fut.exception() is None:
+                    result = fut.result()
+                    if result is not None and result[1] is not None:
+                        result[0].close_ref()
+            raise
 
-        # Valid packages must have an info.txt file!
-        try:
-            info = filesys.read_prop('info.txt')
-        except FileNotFoundError:
-            # Close the ref we've gotten, since it's not in the dict
-            # it won't be done by load_packages().
-            filesys.close_ref()
+    for name, result in zip(names, results):
+        if result is None:
+            continue
+        filesys, info = result
 
+        if info is None:
             if os.path.isdir(name):
                 # This isn't a package, so check the subfolders too...
                 LOGGER.debug('Checking subdir "{}" for packages...', name)
-                find_packages(name)
+                find_packages(name, pool)
             else:
                 LOGGER.warning('ERROR: Bad package "{}"!', name)
             # Don't continue to parse this "package"
@@ -386,6 +603,11 @@ def find_packages(pak_dir: str) -> None:
             # Close the ref we've gotten, since it's not in the dict
             # it won't be done by load_packages().
             filesys.close_ref()
+            if pool is not None:
+                # Also the ones already read in by the pool.
+                for other in results:
+                    if other is not None and other[1] is not None:
+                        other[0].close_ref()
             raise
 
         PACKAGE_SYS[pak_id] = filesys
@@ -395,6 +617,7 @@ def find_packages(pak_dir: str) -> None:
             filesys,
             info,
             name,
+            PACKAGE_CACHE[filesys.path].fingerprint,
         )
         found_pak = True
 
@@ -427,8 +650,12 @@ def load_packages(
         log_incorrect_packfile=False,
         has_mel_music=False,
         has_tag_music=False,
+        parallel=True,
         ) -> Tuple[dict, Collection[FileSystem]]:
-    """Scan and read in all packages."""
+    """Scan and read in all packages.
+
+    If parallel is set, packages and objects are read using a thread pool.
+    """
     global LOG_ENT_COUNT, CHECK_PACKFILE_CORRECTNESS
     pak_dir = os.path.abspath(pak_dir)
 
@@ -440,8 +667,9 @@ def load_packages(
 
     # If we fail we want to clean up our filesystems.
     should_close_filesystems = True
+    pool = ThreadPoolExecutor(thread_name_prefix='load_pak') if parallel else None
     try:
-        find_packages(pak_dir)
+        find_packages(pak_dir, pool)
 
         pack_count = len(packages)
         loader.set_length("PAK", pack_count)
@@ -494,46 +722,48 @@ def load_packages(
             )
         )
 
+        # Parse objects in the pool, then merge them back in the original
+        # order. Types which aren't thread-safe are parsed here as we
+        # reach them, so they're still done in the same order.
+        jobs: List[Tuple[str, ObjData, Union[Future, tuple]]] = []
         for obj_type, objs in all_obj.items():
+            in_pool = pool is not None and OBJ_TYPES[obj_type].parallel
             for obj_id, obj_data in objs.items():
-                obj_class = OBJ_TYPES[obj_type].cls
-                # parse through the object and return the resultant class
-                try:
-                    object_ = obj_class.parse(
-                        ParseData(
-                            obj_data.fsys,
-                            obj_id,
-                            obj_data.info_block,
-                            obj_data.pak_id,
-                            False,
-                        )
-                    )
-                except (NoKeyError, IndexError) as e:
-                    reraise_keyerror(e, obj_id)
-                    raise
+                args = (
+                    obj_type, obj_id, obj_data,
+                    obj_override[obj_type].get(obj_id, []),
+                )
+                if in_pool:
+                    jobs.append((obj_type, obj_data, pool.submit(_parse_object, *args)))
+                else:
+                    jobs.append((obj_type, obj_data, args))
 
-                if not hasattr(object_, 'id'):
-                    raise ValueError(
-                        '"{}" object {} has no ID!'.format(obj_type, object_)
-                    )
+        for obj_type, obj_data, job in jobs:
+            if isinstance(job, Future):
+                object_, overrides = job.result()
+            else:
+                object_, overrides = _parse_object(*job)
 
-                # Store in this database so we can find all objects for each type.
-                obj_class._id_to_obj[object_.id.casefold()] = object_
+            # Store in this database so we can find all objects for each type.
+            OBJ_TYPES[obj_type].cls._id_to_obj[object_.id.casefold()] = object_
 
-                object_.pak_id = obj_data.pak_id
-                object_.pak_name = obj_data.disp_name
-                for override_data in obj_override[obj_type].get(obj_id, []):
-                    override = OBJ_TYPES[obj_type].cls.parse(override_data)
-                    object_.add_over(override)
-                data[obj_type].append(object_)
-                loader.step("OBJ")
+            object_.pak_id = obj_data.pak_id
+            object_.pak_name = obj_data.disp_name
+            for override in overrides:
+                object_.add_over(override)
+            data[obj_type].append(object_)
+            loader.step("OBJ")
 
         should_close_filesystems = False
     finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
         if should_close_filesystems:
             for sys in PACKAGE_SYS.values():
                 sys.close_ref()
 
+    save_package_caches()
+
     LOGGER.info('Object counts:\n{}\n', '\n'.join(
         '{:<15}: {}'.format(name, len(objs))
         for name, objs in
@@ -554,6 +784,44 @@ def load_packages(
     return data, PACKAGE_SYS.values()
 
 
+def _parse_object(
+    obj_type: str,
+    obj_id: str,
+    obj_data: ObjData,
+    overrides: List[ParseData],
+) -> Tuple[PakObject, List[PakObject]]:
+    """Parse an object, and any overrides for it.
+
+    This may be run in the loading thread pool, so the results are merged
+    by load_packages().
+    """
+    obj_class = OBJ_TYPES[obj_type].cls
+    # parse through the object and return the resultant class
+    try:
+        object_ = obj_class.parse(
+            ParseData(
+                obj_data.fsys,
+                obj_id,
+                obj_data.info_block,
+                obj_data.pak_id,
+                False,
+            )
+        )
+    except (NoKeyError, IndexError) as e:
+        reraise_keyerror(e, obj_id)
+        raise
+
+    if not hasattr(object_, 'id'):
+        raise ValueError(
+            '"{}" object {} has no ID!'.format(obj_type, object_)
+        )
+
+    return object_, [
+        obj_class.parse(override_data)
+        for override_data in overrides
+    ]
+
+
 def parse_package(
     pack: 'Package',
     obj_override: Dict[str, Dict[str, List[ParseData]]],
@@ -805,9 +1073,9 @@ def parse_item_folder(
         editor_path = 'items/' + fold + '/editoritems.txt'
         config_path = 'items/' + fold + '/vbsp_config.cfg'
         try:
-            with filesystem:
-                props = filesystem.read_prop(prop_path).find_key('Properties')
-                editor = filesystem.read_prop(editor_path)
+            with hold_fsys(filesystem):
+                props = read_prop(filesystem, prop_path).find_key('Properties')
+                editor = read_prop(filesystem, editor_path)
         except FileNotFoundError as err:
             raise IOError(
                 '"' + pak_id + ':items/' + fold + '" not valid!'
@@ -879,8 +1147,9 @@ def parse_item_folder(
                 path=prop_path,
             )
         try:
-            with filesystem:
-                folders[fold].vbsp_config = conf = filesystem.read_prop(
+            with hold_fsys(filesystem):
+                folders[fold].vbsp_config = conf = read_prop(
+                    filesystem,
                     config_path,
                 )
         except FileNotFoundError:
@@ -1206,6 +1475,7 @@ class Package:
             filesystem: FileSystem,
             info: Property,
             name: str,
+            fingerprint: str,
             ):
         disp_name = info['Name', None]
         if disp_name is None:
@@ -1216,6 +1486,8 @@ class Package:
         self.fsys = filesystem
         self.info = info
         self.name = name
+        # Changes whenever the package is modified, computed when loaded.
+        self.fingerprint = fingerprint
         self.disp_name = disp_name
         self.desc = info['desc', '']
 
@@ -1239,25 +1511,20 @@ class Package:
 
     def is_stale(self, mod_time: int):
         """Check to see if this package has been modified since the last run."""
-        if isinstance(self.fsys, RawFileSystem):
-            # unzipped packages are for development, so always extract.
-            LOGGER.info('Need to extract resources - {} is unzipped!', self.id)
-            return True
-
-        zip_modtime = int(os.stat(self.name).st_mtime)
-
         # If zero, it's never extracted...
-        if zip_modtime != mod_time or mod_time == 0:
+        if self.get_modtime() != mod_time or mod_time == 0:
             LOGGER.info('Need to extract resources - {} is stale!', self.id)
             return True
         return False
 
-    def get_modtime(self):
+    def get_modtime(self) -> int:
         """After the cache has been extracted, set the modification dates
          in the config."""
         if isinstance(self.fsys, RawFileSystem):
-            # No modification time
-            return 0
+            # Unzipped packages have no single modification time,
+            # so use part of the fingerprint for the whole tree.
+            # Keep it positive and non-zero, so it fits in the config.
+            return int(self.fingerprint[:7], 16) | 1
         else:
             return int(os.stat(self.name).st_mtime)
 
@@ -1377,10 +1644,10 @@ class Style(PakObject):
             else:
                 raise ValueError('Style missing configuration!')
         else:
-            with filesystem:
-                items = filesystem.read_prop(folder + '/items.txt')
+            with hold_fsys(filesystem):
+                items = read_prop(filesystem, folder + '/items.txt')
                 try:
-                    vbsp = filesystem.read_prop(folder + '/vbsp_config.cfg')
+                    vbsp = read_prop(filesystem, folder + '/vbsp_config.cfg')
                 except FileNotFoundError:
                     vbsp = None
 
@@ -1916,14 +2183,15 @@ class ItemConfig(PakObject, allow_mult=True, has_img=False):
             data.pak_id, data.id,
         ))
 
-        with filesystem:
+        with hold_fsys(filesystem):
             for ver in data.info.find_all('Version'):  # type: Property
                 ver_id = ver['ID', 'VER_DEFAULT']
                 vers[ver_id] = styles = {}
                 for sty_block in ver.find_all('Styles'):
                     for style in sty_block:
-                        styles[style.real_name] = conf = filesystem.read_prop(
-                            'items/' + style.value + '.cfg'
+                        styles[style.real_name] = conf = read_prop(
+                            filesystem,
+                            'items/' + style.value + '.cfg',
                         )
 
                         set_cond_source(conf, "<ItemConfig {}:{} in '{}'>".format(
@@ -3103,7 +3371,7 @@ class PackList(PakObject, allow_mult=True, has_img=False):
             ]
         elif conf.value:
             path = 'pack/' + conf.value + '.cfg'
-            with filesystem, filesystem.open_str(path) as f:
+            with hold_fsys(filesystem), filesystem.open_str(path) as f:
                 # Each line is a file to pack.
                 # Skip blank lines, strip whitespace, and
                 # allow // comments.
@@ -3212,7 +3480,7 @@ class EditorSound(PakObject, has_img=False):
         )
 
 
-class BrushTemplate(PakObject, has_img=False, allow_mult=True):
+class BrushTemplate(PakObject, has_img=False, allow_mult=True, parallel=False):
     """A template brush which will be copied into the map, then retextured.
 
     This allows the sides of the brush to swap between wall/floor textures
@@ -3493,6 +3761,24 @@ class BrushTemplate(PakObject, has_img=False, allow_mult=True):
         with open(path, 'w') as temp_file:
             TEMPLATE_FILE.export(temp_file, inc_version=False)
 
+        # Also write each template separately with an index, so VBSP
+        # only needs to parse the ones which are actually used.
+        temp_ents: Dict[str, List[Entity]] = defaultdict(list)
+        for ent in TEMPLATE_FILE.entities:
+            temp_id = ent['template_id'].casefold()
+            if temp_id:
+                temp_ents[temp_id].append(ent)
+        blobs = {}
+        for temp_id, ents in temp_ents.items():
+            buf = io.StringIO()
+            for ent in ents:
+                ent.export(buf)
+            blobs[temp_id] = buf.getvalue().encode('utf8')
+        utils.write_blob_index(
+            exp_data.game.abs_path('bin/bee2/templates.idx'),
+            blobs,
+        )
+
     @staticmethod
     def yield_world_detail(vmf: VMF) -> Iterator[Tuple[List[Solid], bool, set]]:
         """Yield all world/detail solids in the map.
@@ -13,6 +13,7 @@ from tk_tools import TK_ROOT
 from collections import namedtuple, defaultdict
 from operator import itemgetter
 from enum import Enum
+import bisect
 import functools
 import math
 
@@ -27,6 +28,8 @@ import sound
 import utils
 import tk_tools
 
+from typing import Dict, List, Tuple
+
 
 LOGGER = srctools.logger.get_logger(__name__)
 
@@ -215,7 +218,7 @@ class GroupHeader(ttk.Frame):
         )
 
 
-def get_icon(icon, size, err_icon):
+def get_icon(icon, size, err_icon, transient=False):
     if icon is None:
         # Unset.
         return None
@@ -227,6 +230,7 @@ def get_icon(icon, size, err_icon):
             error=err_icon,
             resize_to=size,
             algo=img.Image.LANCZOS,
+            transient=transient,
         )
 
 
@@ -241,22 +245,28 @@ class Item:
     - context_lbl: The text shown on the rightclick menu. This is either
       the short or long name, depending on the size of the long name.
     - icon: The image object for the item icon. The icon should be 96x96
-      pixels large.
-    - large_icon: If set, a different file to use for the 192x192 icon.
+      pixels large. This is loaded when first displayed.
+    - icon_file: The file used for the icon, if any.
+    - large_icon: If set, the image to use for the 192x192 icon.
+    - large_icon_file: If set, a different file to use for the 192x192 icon.
+      This is only loaded when the item is selected, see get_large_icon().
     - ico_file: The file path for the image.
     - desc: A list of tuples, following the richTextBox text format.
     - authors: A list of the item's authors.
     - group: Items with the same group name will be shown together.
     - attrs: a dictionary containing the attribute values for this item.
 
-    - button, Set later, the button TK object for this item
+    - button, Set later, the button TK object for this item. This is only
+      set while the item is scrolled into view.
     """
     __slots__ = [
         'name',
         'shortName',
         'longName',
-        'icon',
+        '_icon',
+        'icon_file',
         'large_icon',
+        'large_icon_file',
         'desc',
         'authors',
         'group',
@@ -293,11 +303,13 @@ class Item:
         else:
             self._context_lbl = self.longName
 
-        if icon is not None:
-            self.icon = get_icon(icon, ICON_SIZE, err_icon)
-        else:
-            self.icon = img.color_square(img.PETI_ITEM_BG, ICON_SIZE)
-        self.large_icon = get_icon(large_icon, ICON_SIZE_LRG, err_icon_lrg)
+        # Only the items scrolled into view need icons, so load these
+        # when they're displayed.
+        self._icon = None
+        self.icon_file = icon
+        # Only one is visible at a time, so load these when needed.
+        self.large_icon = None
+        self.large_icon_file = large_icon
 
         if isinstance(desc, str):
             self.desc = tkMarkdown.convert(desc)
@@ -345,23 +357,41 @@ class Item:
             attributes=attrs,
         )
 
-    def set_pos(self, x=None, y=None):
-        """Place the item on the palette."""
-        if x is None or y is None:
-            # Remove from the window.
-            self.button.place_forget()
-        else:
-            self.button.place(x=x, y=y)
-            self.button.lift()  # Force a particular stacking order for widgets
-        
+    @property
+    def icon(self):
+        """The icon for the item, loaded when first needed."""
+        if self._icon is None:
+            if self.icon_file is not None:
+                self._icon = get_icon(self.icon_file, ICON_SIZE, err_icon)
+            else:
+                self._icon = img.color_square(img.PETI_ITEM_BG, ICON_SIZE)
+        return self._icon
+
+    @icon.setter
+    def icon(self, value):
+        self._icon = value
+
+    def get_large_icon(self):
+        """Return the large icon, or None if not present."""
+        if self.large_icon is not None:
+            return self.large_icon
+        return get_icon(
+            self.large_icon_file,
+            ICON_SIZE_LRG,
+            err_icon_lrg,
+            transient=True,
+        )
+
     def copy(self) -> 'Item':
         """Duplicate an item."""
         item = Item.__new__(Item)
         item.name = self.name
         item.shortName = self.shortName
         item.longName = self.longName
-        item.icon = self.icon
+        item._icon = self._icon
+        item.icon_file = self.icon_file
         item.large_icon = self.large_icon
+        item.large_icon_file = self.large_icon_file
         item.desc = self.desc.copy()
         item.authors = self.authors.copy()
         item.group = self.group
@@ -532,6 +562,15 @@ class selWin:
         # The maximum number of items that fits per row (set in flow_items)
         self.item_width = 1
 
+        # Only items scrolled into view have buttons. flow_items() computes
+        # the position of every item, sorted by y value. The buttons are
+        # reused as the window is scrolled.
+        self.item_layout: List[Tuple[int, int, Item]] = []
+        self.item_pos: Dict[Item, Tuple[int, int]] = {}
+        self._layout_ys: List[int] = []
+        self._shown_items: List[Item] = []
+        self._free_buttons: List[ttk.Button] = []
+
         if desc:
             self.desc_label = ttk.Label(
                 self.win,
@@ -573,7 +612,7 @@ class selWin:
             command=self.wid_canvas.yview,
         )
         self.wid_scroll.grid(row=0, column=1, sticky="NS")
-        self.wid_canvas['yscrollcommand'] = self.wid_scroll.set
+        self.wid_canvas['yscrollcommand'] = self._on_scroll
 
         utils.add_mousewheel(self.wid_canvas, self.win)
 
@@ -612,6 +651,8 @@ class selWin:
             image=img.color_square(img.PETI_ITEM_BG, ICON_SIZE_LRG),
         )
         self.prop_icon.grid(row=0, column=0)
+        # The large icon being displayed, if any.
+        self.prop_icon_img = None
 
         name_frame = ttk.Frame(self.prop_frm)
 
@@ -752,18 +793,7 @@ class selWin:
             item._selector = self
 
             if item == self.noneItem:
-                item.button = ttk.Button(
-                    self.pal_frame,
-                    image=item.icon,
-                )
                 item.context_lbl = none_name
-            else:
-                item.button = ttk.Button(
-                    self.pal_frame,
-                    text=item.shortName,
-                    image=item.icon,
-                    compound='top',
-                )
 
             group_key = item.group.casefold()
             self.grouped_items[group_key].append(item)
@@ -791,19 +821,6 @@ class selWin:
             )
             item._context_ind = len(self.grouped_items[group_key]) - 1
 
-            @utils.bind_leftclick(item.button)
-            def click_item(event=None, *, _item=item):
-                """Handle clicking on the item.
-
-                If it's already selected, save and close the window.
-                """
-                # We need to capture the item in a default, since it's
-                # the same variable in different iterations
-                if _item is self.selected:
-                    self.save()
-                else:
-                    self.sel_item(_item)
-
         # Convert to a normal dictionary, after adding all items.
         self.grouped_items = dict(self.grouped_items)
 
@@ -1087,21 +1104,26 @@ class selWin:
             ).format(
                 ', '.join(item.authors)
             )
-        if item.large_icon is not None:
+        large_icon = item.get_large_icon()
+        if large_icon is not None:
             # We have a large icon, use it.
-            self.prop_icon['image'] = item.large_icon
+            self.prop_icon['image'] = large_icon
             width, height = img.tuple_size(ICON_SIZE_LRG)
         else:
             # Small icon, shrink the preview.
             self.prop_icon['image'] = item.icon
             width, height = img.tuple_size(ICON_SIZE)
+        # Transient icons can be freed, so keep it alive while visible.
+        self.prop_icon_img = large_icon
         self.prop_icon_frm.configure(width=width, height=height)
 
         self.prop_desc.set_text(item.desc)
 
-        self.selected.button.state(('!alternate',))
+        if self.selected.button is not None:
+            self.selected.button.state(('!alternate',))
         self.selected = item
-        item.button.state(('alternate',))
+        if item.button is not None:
+            item.button.state(('alternate',))
         self.scroll_to(item)
 
         if self.sampler:
@@ -1311,6 +1333,9 @@ class selWin:
         # Hide suggestion indicator if the item's not visible.
         self.sugg_lbl.place_forget()
 
+        self.item_layout.clear()
+        self.item_pos.clear()
+
         for group_key in self.group_order:
             items = self.grouped_items[group_key]
             group_wid = self.group_widgets[group_key]  # type: GroupHeader
@@ -1323,29 +1348,28 @@ class selWin:
             y_off += group_wid.winfo_reqheight()
 
             if not group_wid.visible:
-                # Hide everything!
-                for item in items:  # type: Item
-                    item.set_pos()
+                # Leave the items out, so they're hidden.
                 continue
 
-            # Place each item
+            # Compute the position of each item
             for i, item in enumerate(items):  # type: int, Item
                 if item == self.suggested:
                     self.sugg_lbl.place(
                         x=(i % width) * ITEM_WIDTH + 1,
                         y=(i // width) * ITEM_HEIGHT + y_off,
                     )
-                    self.sugg_lbl['width'] = item.button.winfo_width()
-                item.set_pos(
-                    x=(i % width) * ITEM_WIDTH + 1,
-                    y=(i // width) * ITEM_HEIGHT + y_off + 20,
+                pos = (
+                    (i % width) * ITEM_WIDTH + 1,
+                    (i // width) * ITEM_HEIGHT + y_off + 20,
                 )
-                item.button['text'] = item.shortName
-                item.button['image'] = item.icon
+                self.item_pos[item] = pos
+                self.item_layout.append((pos[1], pos[0], item))
 
             # Increase the offset by the total height of this item section
             y_off += math.ceil(len(items) / width) * ITEM_HEIGHT + 5
 
+        self._layout_ys = [y for y, x, item in self.item_layout]
+
         # Set the size of the canvas and frame to the amount we've used
         self.wid_canvas['scrollregion'] = (
             0, 0,
@@ -1353,11 +1377,100 @@ class selWin:
             y_off,
         )
         self.pal_frame['height'] = y_off
+        self.place_visible(refresh=True)
+
+    def _on_scroll(self, top, bottom):
+        """Called when the canvas is scrolled, to update the scrollbar."""
+        self.wid_scroll.set(top, bottom)
+        self.place_visible()
+
+    def place_visible(self, refresh=False):
+        """Create buttons for the items currently scrolled into view.
+
+        Items scrolled out of view have their buttons reused. If refresh is
+        set, all the buttons are repositioned and their text and icons are
+        updated, otherwise only newly visible items are.
+        """
+        canvas = self.wid_canvas
+        # Include the row partially scrolled off the top.
+        top = canvas.canvasy(0) - ITEM_HEIGHT
+        bottom = canvas.canvasy(canvas.winfo_height())
+        start = bisect.bisect_left(self._layout_ys, top)
+        end = bisect.bisect_right(self._layout_ys, bottom)
+        visible = [item for y, x, item in self.item_layout[start:end]]
+        visible_set = set(visible)
+
+        for item in self._shown_items:
+            if item not in visible_set:
+                button = item.button
+                button.place_forget()
+                button.sel_item = item.button = None
+                self._free_buttons.append(button)
+
+        for item in visible:
+            button = item.button
+            if button is None:
+                if self._free_buttons:
+                    button = self._free_buttons.pop()
+                else:
+                    button = self._make_button()
+                item.button = button
+                button.sel_item = item
+                button.state(
+                    ('alternate',)
+                    if item is self.selected else
+                    ('!alternate',)
+                )
+            elif not refresh:
+                continue
+            if item is self.noneItem:
+                button.configure(text='', image=item.icon, compound='image')
+            else:
+                button.configure(
+                    text=item.shortName,
+                    image=item.icon,
+                    compound='top',
+                )
+            x, y = self.item_pos[item]
+            button.place(x=x, y=y)
+            button.lift()  # Force a particular stacking order for widgets
+            if item == self.suggested:
+                # The button may not be laid out yet, so use the size it asks for.
+                self.sugg_lbl['width'] = button.winfo_reqwidth()
+        self._shown_items = visible
+
+    def _make_button(self) -> ttk.Button:
+        """Create a new button for displaying items."""
+        button = ttk.Button(self.pal_frame)
+        button.sel_item = None
+        utils.bind_leftclick(
+            button,
+            functools.partial(self._click_button, button),
+        )
+        return button
+
+    def _click_button(self, button, event=None):
+        """Handle clicking on an item.
+
+        If it's already selected, save and close the window.
+        """
+        item = button.sel_item
+        if item is None:
+            return
+        if item is self.selected:
+            self.save()
+        else:
+            self.sel_item(item)
 
     def scroll_to(self, item):
         """Scroll to an item so it's visible."""
         canvas = self.wid_canvas
 
+        try:
+            x, y = self.item_pos[item]
+        except KeyError:
+            return  # Not laid out, or in a hidden group.
+
         height = canvas.bbox(ALL)[3]  # Returns (x, y, width, height)
 
         bottom, top = canvas.yview()
@@ -1366,8 +1479,6 @@ class selWin:
         bottom *= height
         top *= height
 
-        y = item.button.winfo_y()
-
         if bottom <= y - 8 and y + ICON_SIZE + 8 <= top:
             return  # Already in view
 
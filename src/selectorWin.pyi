@@ -125,7 +125,8 @@ def get_icon(
     size: Union[float,
     Tuple[float, float]],
     err_icon: PhotoImage,
-) -> PhotoImage: ...
+    transient: bool=False,
+) -> Optional[PhotoImage]: ...
 
 class Item:
     name: str
@@ -133,13 +134,15 @@ class Item:
     group: Optional[str]
     longName: str
     sort_key: Optional[str]
-    icon: PhotoImage
-    large_icon: PhotoImage
+    _icon: Optional[PhotoImage]
+    icon_file: Optional[str]
+    large_icon: Optional[PhotoImage]
+    large_icon_file: Optional[str]
     desc: MarkdownData
     snd_sample: Optional[str]
     authors: List[str]
     attrs: Dict[str, _Attr_Values]
-    button: ttk.Button
+    button: Optional[ttk.Button]
     _win_x: int
     _win_y: int
 
@@ -164,7 +167,13 @@ class Item:
 
     @classmethod
     def from_data(cls: Any, obj_id: Any, data: SelitemData, attrs: Any=...) -> Any: ...
-    def set_pos(self, x: Optional[Any] = ..., y: Optional[Any] = ...): ...
+
+    @property
+    def icon(self) -> PhotoImage: ...
+    @icon.setter
+    def icon(self, value: PhotoImage) -> None: ...
+
+    def get_large_icon(self) -> Optional[PhotoImage]: ...
     def copy(self) -> 'Item': ...
 
     @property
@@ -195,6 +204,11 @@ class selWin:
     grouped_items: Dict[str, List[Item]] = ...
     group_order: List[str] = ...
     item_width: int = ...
+    item_layout: List[Tuple[int, int, Item]] = ...
+    item_pos: Dict[Item, Tuple[int, int]] = ...
+    _layout_ys: List[int] = ...
+    _shown_items: List[Item] = ...
+    _free_buttons: List[ttk.Button] = ...
     desc_label: ttk.Label = ...
     pane_win: PanedWindow = ...
     wid_canvas: Canvas = ...
@@ -270,6 +284,10 @@ class selWin:
     ) -> None: ...
 
     def flow_items(self, e: Event = None): ...
+    def _on_scroll(self, top: str, bottom: str) -> None: ...
+    def place_visible(self, refresh: bool=False) -> None: ...
+    def _make_button(self) -> ttk.Button: ...
+    def _click_button(self, button: ttk.Button, event: Event=...) -> None: ...
     def scroll_to(self, item: Item) -> None: ...
     def __contains__(self, obj: Union[str, Item]): ...
     def is_suggested(self) -> bool: ...
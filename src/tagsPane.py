@@ -3,8 +3,9 @@ from tkinter import font
 from tk_tools import TK_ROOT
 import tkinter as tk
 
-from functools import partial
+from functools import partial, reduce
 from operator import itemgetter
+import operator
 from collections import defaultdict
 from enum import Enum
 import string
@@ -16,15 +17,15 @@ import UI
 import utils
 import tk_tools
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 is_expanded = False
 wid = {}
 
 TAG_MODE = tk.StringVar(value='ALL')  # The combining mode for the vars
 TAG_MODES = {
-    'ALL': all,
-    'ANY': any,
+    'ALL': operator.and_,
+    'ANY': operator.or_,
 }
 
 # A list of all tags, mapped to their current state.
@@ -32,6 +33,13 @@ TAGS = {}  # type: Dict[str, bool]
 # A 'pretty' name for a tag, if it exists
 PRETTY_TAG = {}  # type: Dict[str, str]
 
+# For each tag, a bitset of the indexes of palette items with that tag.
+TAG_INDEX: Dict[Tuple['Section', str], int] = {}
+# Palette items which need the style to be unlocked.
+UNLOCK_MASK = 0
+# The number of palette items the index was built for.
+_index_count = -1
+
 
 TAG_REP_TRANSLATE = str.maketrans(
     # uppercase -> lowercase, remove whitespace
@@ -60,12 +68,36 @@ class Section(Enum):
 Section.index = [Section[key] for key in Section.__members__.keys()].index
 
 
+def build_index():
+    """Build the index of the tags for each palette item.
+
+    This must be called when the palette items or their tags change.
+    """
+    global UNLOCK_MASK, _index_count
+    TAG_INDEX.clear()
+    UNLOCK_MASK = 0
+    for ind, item in enumerate(UI.pal_items):
+        bit = 1 << ind
+        if item.needs_unlock:
+            UNLOCK_MASK |= bit
+        for tag in item.item.filter_tags:
+            TAG_INDEX[tag] = TAG_INDEX.get(tag, 0) | bit
+    _index_count = len(UI.pal_items)
+
+
+def invalidate_index():
+    """Mark the tag index as out of date, so it's rebuilt when next used."""
+    global _index_count
+    _index_count = -1
+
+
 def filter_items():
     """Update items based on selected tags."""
     style_unlocked = StyleVarPane.tk_vars['UnlockDefault'].get() == 1
 
-    # any() or all()
-    func = TAG_MODES[TAG_MODE.get()]
+    if _index_count != len(UI.pal_items):
+        # Items were added or removed, or tags changed.
+        build_index()
 
     sel_tags = [
         tag
@@ -73,23 +105,29 @@ def filter_items():
         in TAGS.items()
         if enabled
     ]
-    no_tags = len(sel_tags) == 0
-
-    for item in UI.pal_items:
-        if item.needs_unlock and not style_unlocked:
-            item.visible = False
-            continue
-
-        if no_tags:
-            item.visible = True
-        else:
-            item_tags = item.item.filter_tags
-            item.visible = func(
-                tag in item_tags
-                for tag in
-                sel_tags
-            )
-    UI.flow_picker()
+    # Combine the item sets for each tag with & or |.
+    if sel_tags:
+        mask = reduce(
+            TAG_MODES[TAG_MODE.get()],
+            [TAG_INDEX.get(tag, 0) for tag in sel_tags],
+        )
+    else:
+        mask = (1 << _index_count) - 1
+
+    if not style_unlocked:
+        mask &= ~UNLOCK_MASK
+
+    # Reversed, so item n is character n.
+    visible = '{:0{}b}'.format(mask, _index_count)[::-1]
+
+    changed = False
+    for item, vis in zip(UI.pal_items, visible):
+        vis = vis == '1'
+        if item.visible != vis:
+            item.visible = vis
+            changed = True
+    if changed:
+        UI.flow_picker()
 
 # When exiting settings, we need to hide/show WIP items.
 optionWindow.refresh_callbacks.append(filter_items)
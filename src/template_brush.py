@@ -1,6 +1,6 @@
 """Templates are sets of brushes which can be copied into the map."""
 import random
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from decimal import Decimal
 from enum import Enum
@@ -8,6 +8,7 @@ from operator import attrgetter
 
 import srctools
 import vbsp_options
+import utils
 
 from srctools import Entity, Solid, Side, Property, UVAxis, Vec, VMF
 from srctools.vmf import EntityFixup
@@ -23,7 +24,7 @@ from typing import (
     NamedTuple, Tuple,
     Dict, List, Set,
     Iterator, Mapping,
-    Optional,
+    Optional, FrozenSet,
 )
 
 LOGGER = srctools.logger.get_logger(__name__, alias='template')
@@ -33,6 +34,21 @@ TEMPLATES = {}  # type: Dict[str, Union[Template, ScalingTemplate]]
 
 # The location of the template data.
 TEMPLATE_LOCATION = 'bee2/templates.vmf'
+# The same data split up per template, so they can be parsed when first used.
+TEMPLATE_INDEX_LOCATION = 'bee2/templates.idx'
+# For templates in the index which haven't been parsed yet,
+# the offset and size of their data.
+_UNLOADED_TEMPLATES = {}  # type: Dict[str, Tuple[int, int]]
+
+# Templates are often imported many times at the same few orientations,
+# so cache the rotated brushes for each. These are stored in a separate VMF,
+# and are translated to the right position after being copied.
+# The key is (template ID, visgroups, angles), and the value is the world and
+# detail brushes, plus the mapping from the rotated to the original face IDs.
+# Only the most recently used are kept.
+ROTATED_COUNT = 256
+_ROTATED_VMF = VMF(preserve_ids=True)
+_ROTATED_BRUSHES: 'OrderedDict[Tuple[str, FrozenSet[str], Tuple[float, float, float]], Tuple[List[Solid], List[Solid], Dict[int, int]]]' = OrderedDict()
 
 
 class InvalidTemplateName(LookupError):
@@ -47,7 +63,7 @@ class InvalidTemplateName(LookupError):
             '\n'.join(
                 (' * "' + temp.upper() + '"')
                 for temp in
-                sorted(TEMPLATES.keys())
+                sorted(TEMPLATES.keys() | _UNLOADED_TEMPLATES.keys())
             ),
         )
 
@@ -411,11 +427,46 @@ def parse_temp_name(name) -> Tuple[str, Set[str]]:
 
 
 def load_templates() -> None:
-    """Load in the template file, used for import_template()."""
-    with open(TEMPLATE_LOCATION) as file:
-        props = Property.parse(file, TEMPLATE_LOCATION)
-    vmf = srctools.VMF.parse(props, preserve_ids=True)
+    """Load in the template file, used for import_template().
 
+    If the app exported an index, templates are instead parsed when first used.
+    """
+    try:
+        index = utils.read_blob_index(TEMPLATE_INDEX_LOCATION)
+    except (FileNotFoundError, ValueError):
+        LOGGER.warning('No valid template index, parsing all templates!')
+        props = utils.parse_cached(TEMPLATE_LOCATION, Property.parse)
+        parse_templates(srctools.VMF.parse(props, preserve_ids=True))
+    else:
+        _UNLOADED_TEMPLATES.update(index)
+
+
+def _load_template(temp_id: str) -> Union['Template', 'ScalingTemplate']:
+    """Find a template, parsing it from the index if needed."""
+    temp_name = temp_id
+    temp_id = temp_id.casefold()
+    try:
+        return TEMPLATES[temp_id]
+    except KeyError:
+        pass
+    try:
+        offset, size = _UNLOADED_TEMPLATES.pop(temp_id)
+    except KeyError:
+        raise InvalidTemplateName(temp_name) from None
+
+    with open(TEMPLATE_INDEX_LOCATION, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size)
+    props = Property.parse(
+        data.decode('utf8').splitlines(keepends=True),
+        TEMPLATE_INDEX_LOCATION + ':' + temp_id,
+    )
+    parse_templates(srctools.VMF.parse(props, preserve_ids=True))
+    return TEMPLATES[temp_id]
+
+
+def parse_templates(vmf: VMF) -> None:
+    """Parse all the templates defined in a VMF, adding them to TEMPLATES."""
     def make_subdict() -> Dict[str, list]:
         return defaultdict(list)
 
@@ -558,10 +609,7 @@ def load_templates() -> None:
 
 def get_template(temp_name) -> Template:
     """Get the data associated with a given template."""
-    try:
-        temp = TEMPLATES[temp_name.casefold()]
-    except KeyError:
-        raise InvalidTemplateName(temp_name) from None
+    temp = _load_template(temp_name)
 
     if isinstance(temp, ScalingTemplate):
         raise ValueError(
@@ -614,27 +662,41 @@ def import_template(
     chosen_groups.add('')
 
     orig_world, orig_detail, orig_over = template.visgrouped(chosen_groups)
+    rot_world, rot_detail, rot_ids = _rotate_brushes(
+        template.id, chosen_groups, angles,
+        orig_world, orig_detail,
+    )
 
     new_world = []  # type: List[Solid]
     new_detail = []  # type: List[Solid]
     new_over = []  # type: List[Entity]
 
-    # A map of the original -> new face IDs.
-    id_mapping = {}  # type: Dict[int, int]
+    # A map of the rotated -> new face IDs.
+    rot_mapping = {}  # type: Dict[int, int]
 
-    for orig_list, new_list in [
-            (orig_world, new_world),
-            (orig_detail, new_detail)
+    for rot_list, new_list in [
+            (rot_world, new_world),
+            (rot_detail, new_detail)
         ]:
-        for old_brush in orig_list:
-            brush = old_brush.copy(
+        for rot_brush in rot_list:
+            brush = rot_brush.copy(
                 vmf_file=vbsp.VMF,
-                side_mapping=id_mapping,
+                side_mapping=rot_mapping,
                 keep_vis=False,
             )
-            brush.localise(origin, angles)
+            brush.translate(origin)
+            # Like localise(), keep the offsets between -1024 and 1024.
+            for face in brush:
+                face.uaxis.offset = (face.uaxis.offset + 1024) % 2048 - 1024
+                face.vaxis.offset = (face.vaxis.offset + 1024) % 2048 - 1024
             new_list.append(brush)
 
+    # A map of the original -> new face IDs.
+    id_mapping = {
+        orig_id: rot_mapping[rot_id]
+        for rot_id, orig_id in rot_ids.items()
+    }  # type: Dict[int, int]
+
     for overlay in orig_over:  # type: Entity
         new_overlay = overlay.copy(
             vmf_file=vbsp.VMF,
@@ -727,6 +789,56 @@ def import_template(
     )
 
 
+def _rotate_brushes(
+    temp_id: str,
+    visgroups: Set[str],
+    angles: Optional[Vec],
+    world: List[Solid],
+    detail: List[Solid],
+) -> Tuple[List[Solid], List[Solid], Dict[int, int]]:
+    """Return copies of the template's brushes, rotated by the given angles.
+
+    These are cached, so they should be copied before modifying them.
+    This also returns a mapping of the rotated to the original face IDs.
+    """
+    key = (
+        temp_id.casefold(),
+        frozenset(visgroups),
+        angles.as_tuple() if angles is not None else (0.0, 0.0, 0.0),
+    )
+    try:
+        result = _ROTATED_BRUSHES[key]
+    except KeyError:
+        pass
+    else:
+        _ROTATED_BRUSHES.move_to_end(key)
+        return result
+
+    # The orig -> rotated face IDs.
+    id_mapping = {}  # type: Dict[int, int]
+    rotated = []  # type: List[List[Solid]]
+    for orig_list in [world, detail]:
+        rot_list = []  # type: List[Solid]
+        for orig_brush in orig_list:
+            brush = orig_brush.copy(
+                vmf_file=_ROTATED_VMF,
+                side_mapping=id_mapping,
+                keep_vis=False,
+            )
+            brush.localise(Vec(), angles)
+            rot_list.append(brush)
+        rotated.append(rot_list)
+
+    result = _ROTATED_BRUSHES[key] = (
+        rotated[0],
+        rotated[1],
+        {rot_id: orig_id for orig_id, rot_id in id_mapping.items()},
+    )
+    while len(_ROTATED_BRUSHES) > ROTATED_COUNT:
+        _ROTATED_BRUSHES.popitem(last=False)
+    return result
+
+
 def get_scaling_template(temp_id: str) -> ScalingTemplate:
     """Get the scaling data from a template.
 
@@ -734,10 +846,7 @@ def get_scaling_template(temp_id: str) -> ScalingTemplate:
     """
     temp_name, over_names = parse_temp_name(temp_id)
 
-    try:
-        temp = TEMPLATES[temp_name.casefold()]
-    except KeyError:
-        raise InvalidTemplateName(temp_name) from None
+    temp = _load_template(temp_name)
 
     if isinstance(temp, ScalingTemplate):
         return temp
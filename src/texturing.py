@@ -735,6 +735,8 @@ class GenClump(Generator):
         # A seed only unique to this generator, in int form.
         self.gen_seed = 0
         self._clump_locs = []  # type: List[Clump]
+        # Each 128-unit block -> the clumps overlapping it, in order.
+        self._clump_grid = {}  # type: Dict[Tuple[int, int, int], List[Clump]]
 
     def setup(self, global_seed: str, tiles: List['TileDef']):
         """Build the list of clump locations."""
@@ -824,6 +826,14 @@ class GenClump(Generator):
                 debug_brush.vis_shown = False
                 vbsp.VMF.add_brush(debug_brush)
 
+        for clump in self._clump_locs:
+            for pos in itertools.product(
+                range(int(clump.x1 // 128), int(clump.x2 // 128) + 1),
+                range(int(clump.y1 // 128), int(clump.y2 // 128) + 1),
+                range(int(clump.z1 // 128), int(clump.z2 // 128) + 1),
+            ):
+                self._clump_grid.setdefault(pos, []).append(clump)
+
         LOGGER.info(
             '{}.{}.{}: {} Clumps for {} tiles',
             self.category.name,
@@ -859,7 +869,13 @@ class GenClump(Generator):
 
     def _find_clump(self, loc: Vec) -> Optional[int]:
         """Return the clump seed matching a location."""
-        for clump in self._clump_locs:
+        try:
+            clumps = self._clump_grid[
+                int(loc.x // 128), int(loc.y // 128), int(loc.z // 128),
+            ]
+        except KeyError:
+            return None
+        for clump in clumps:
             if (
                 clump.x1 <= loc.x <= clump.x2 and
                 clump.y1 <= loc.y <= clump.y2 and
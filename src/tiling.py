@@ -25,7 +25,7 @@ import math
 import instanceLocs
 import utils
 import vbsp_options
-from srctools import Vec, VMF, Entity, Side, Solid, Output
+from srctools import Vec, VMF, Entity, Side, Solid, Output, UVAxis
 import srctools.logger
 from brushLoc import POS as BLOCK_POS, Block, grid_to_world
 from texturing import TileSize, Portalable
@@ -48,6 +48,14 @@ TILE_TEMP: Dict[
     Tuple[float, float, float],
     Dict[Union[str, Tuple[int, int, int, bool]], Side]
 ] = {}
+# The faces for each shape of tile make_tile() produces, positioned relative
+# to the tile origin. Tiles are built directly from these, by offsetting the
+# planes and UVs. The key is (normal, recess_dist, thickness, width, height, bevels).
+# Each face is stored along with the ID of the original template face.
+_TILE_SHAPES: Dict[
+    Tuple[Tuple[float, float, float], int, int, float, float, Tuple[bool, bool, bool, bool]],
+    List[Tuple[Side, int]],
+] = {}
 
 # Maps normals to the index in PrismFace.
 PRISM_NORMALS: Dict[Tuple[float, float, float], int] = {
@@ -217,6 +225,13 @@ _tiletype_inverted = {
 }
 
 # Symbols that represent TileSize values.
+# TileType values, indexed by their value. Subtiles are stored as a bytearray
+# of these.
+_TILETYPE_BY_VALUE: List[Optional[TileType]] = [None] * 256
+for _tile_type in TileType:
+    _TILETYPE_BY_VALUE[_tile_type.value] = _tile_type
+del _tile_type
+
 TILETYPE_TO_CHAR = {
     TileType.WHITE: 'W',
     TileType.WHITE_4x4: 'w',
@@ -746,9 +761,11 @@ class TileDef:
         base_type: TileSize this tile started with.
         override: If set, a specific texture to use and orientation.
           This only applies to .is_tile tiles.
-        _sub_tiles: None or a Dict[(u,v): TileSize]. u/v are either xz,
-        yz or xy.
+        _sub_tiles: None or a bytearray of the 16 TileType values, indexed
+          by u * 4 + v. u/v are either xz, yz or xy.
           If None, it's the same as base_type.
+        _fizz_orient: None, or 'u'/'v' if the center section should be
+          nodrawed for a centered fizzler.
         bullseye_count: The number of bullseye items on this surface. If > 0,
           we have some.
         _portal_helper: The number of portal placement helpers here. If > 0,
@@ -764,6 +781,7 @@ class TileDef:
         'brush_faces',
         'base_type',
         '_sub_tiles',
+        '_fizz_orient',
         'override',
         'bullseye_count',
         '_portal_helper',
@@ -776,7 +794,8 @@ class TileDef:
 
     brush_faces: List[Side]
     panels: List[Panel]
-    _sub_tiles: Optional[Dict[Tuple[int, int], TileType]]
+    _sub_tiles: Optional[bytearray]
+    _fizz_orient: Optional[str]
     override: Optional[Tuple[str, 'template_brush.ScalingTemplate']]
 
     bullseye_count: int
@@ -795,7 +814,13 @@ class TileDef:
         self.brush_faces = []
         self.override = None
         self.base_type = base_type
-        self._sub_tiles = subtiles
+        if subtiles is not None:
+            self._sub_tiles = bytearray(16)
+            for (u, v), tile_type in subtiles.items():
+                self._sub_tiles[u * 4 + v] = tile_type.value
+        else:
+            self._sub_tiles = None
+        self._fizz_orient = None
         self.panels = []
         self.bullseye_count = 0
         self._portal_helper = 1 if has_helper else 0
@@ -846,10 +871,11 @@ class TileDef:
         tile_type: TileType=TileType.VOID,
     ) -> 'TileDef':
         """Return a tiledef at a position, creating it with a type if not present."""
+        key = grid_pos.as_tuple(), norm.as_tuple()
         try:
-            tile = TILES[grid_pos.as_tuple(), norm.as_tuple()]
+            tile = TILES[key]
         except KeyError:
-            tile = TILES[grid_pos.as_tuple(), norm.as_tuple()] = cls(
+            tile = TILES[key] = cls(
                 grid_pos,
                 norm,
                 tile_type,
@@ -857,15 +883,20 @@ class TileDef:
         return tile
 
     def _get_subtiles(self) -> Dict[Tuple[int, int], TileType]:
-        """Returns subtiles, creating it if not present."""
+        """Returns a copy of the subtiles, creating them if not present.
+
+        If set, the fizzler orientation is included under SUBTILE_FIZZ_KEY.
+        """
         if self._sub_tiles is None:
-            self._sub_tiles = tile = {
-                (x, y): self.base_type
-                for x in range(4) for y in range(4)
-            }
-            return tile
-        else:
-            return self._sub_tiles
+            self._sub_tiles = bytearray([self.base_type.value]) * 16
+        tiles = {
+            (u, v): _TILETYPE_BY_VALUE[self._sub_tiles[u * 4 + v]]
+            for u in range(4) for v in range(4)
+        }
+        if self._fizz_orient is not None:
+            # This violates the type definition.
+            tiles[SUBTILE_FIZZ_KEY] = cast(TileType, self._fizz_orient)
+        return tiles
 
     def __getitem__(self, item: Tuple[int, int]) -> TileType:
         """Lookup the tile type at a particular sub-location."""
@@ -876,7 +907,7 @@ class TileDef:
         if self._sub_tiles is None:
             return self.base_type
         else:
-            return self._sub_tiles[u, v]
+            return _TILETYPE_BY_VALUE[self._sub_tiles[u * 4 + v]]
 
     def __setitem__(self, item: Tuple[int, int], value: TileType) -> None:
         """Lookup the tile type at a particular sub-location."""
@@ -885,23 +916,18 @@ class TileDef:
             raise IndexError(u, v)
         
         if self._sub_tiles is None:
-            self._sub_tiles = {
-                (x, y): value if u == x and v == y else self.base_type
-                for x in range(4) for y in range(4)
-            }
+            self._sub_tiles = bytearray([self.base_type.value]) * 16
+            self._sub_tiles[u * 4 + v] = value.value
         else:
-            self._sub_tiles[u, v] = value
+            self._sub_tiles[u * 4 + v] = value.value
 
             # Check if we can merge this down to a single value.
             # We can if we don't have the special fizzler key, and all
             # the subtiles are the same.
-            if SUBTILE_FIZZ_KEY not in self._sub_tiles:
-                base_type = self._sub_tiles[0, 0]
-                for tile in self._sub_tiles.values():
-                    if tile is not base_type:
-                        return
-                self.base_type = base_type
-                self._sub_tiles = None
+            if self._fizz_orient is None:
+                if self._sub_tiles.count(self._sub_tiles[0]) == 16:
+                    self.base_type = _TILETYPE_BY_VALUE[self._sub_tiles[0]]
+                    self._sub_tiles = None
 
     def __iter__(self) -> Iterator[Tuple[int, int, TileType]]:
         """Iterate over the axes and tile type."""
@@ -911,12 +937,13 @@ class TileDef:
                 if self._sub_tiles is None:
                     yield u, v, self.base_type
                 else:
-                    yield u, v, self._sub_tiles[u, v]
+                    yield u, v, _TILETYPE_BY_VALUE[self._sub_tiles[u * 4 + v]]
 
     def set_fizz_orient(self, axis: str) -> None:
         """Set the centered fizzler nodraw strip."""
-        # This violates the _sub_tiles type definition.
-        self._get_subtiles()[SUBTILE_FIZZ_KEY] = cast(TileType, axis)
+        if self._sub_tiles is None:
+            self._sub_tiles = bytearray([self.base_type.value]) * 16
+        self._fizz_orient = axis
 
     def uv_offset(self, u: float, v: float, norm: float) -> Vec:
         """Return a u/v offset from our position.
@@ -1378,24 +1405,29 @@ def find_tile(origin: Vec, normal: Vec, force: bool=False) -> Tuple[TileDef, int
     norm_axis = normal.axis()
     u_axis, v_axis = Vec.INV_AXIS[norm_axis]
 
-    grid_pos = Vec.with_axes(
-        norm_axis, origin - 64 * normal,
-        u_axis, origin[u_axis] // 128 * 128 + 64,
-        v_axis, origin[v_axis] // 128 * 128 + 64,
-    )
-    # grid_pos = round_grid(origin - normal)
+    # Compute the position along each axis directly, instead of building
+    # intermediate Vecs - this is called a lot.
+    norm_pos = origin[norm_axis] - 64 * normal[norm_axis]
+    u_pos = origin[u_axis] // 128 * 128 + 64
+    v_pos = origin[v_axis] // 128 * 128 + 64
 
-    uv_pos = (origin - grid_pos + 64 - 16)
-    u = uv_pos[u_axis] / 32 % 4
-    v = uv_pos[v_axis] / 32 % 4
+    u = (origin[u_axis] - u_pos + 64 - 16) / 32 % 4
+    v = (origin[v_axis] - v_pos + 64 - 16) / 32 % 4
 
     if u != round(u) or v != round(v):
         raise KeyError('Badly offset into a tile!')
 
     if force:
-        tile = TileDef.ensure(grid_pos, normal)
+        tile = TileDef.ensure(
+            Vec.with_axes(norm_axis, norm_pos, u_axis, u_pos, v_axis, v_pos),
+            normal,
+        )
     else:
-        tile = TILES[grid_pos.as_tuple(), normal.as_tuple()]
+        grid_pos = {norm_axis: norm_pos, u_axis: u_pos, v_axis: v_pos}
+        tile = TILES[
+            (grid_pos['x'], grid_pos['y'], grid_pos['z']),
+            normal.as_tuple(),
+        ]
         # except KeyError: raise
 
     return tile, int(u), int(v)
@@ -1488,7 +1520,6 @@ def make_tile(
         v_align: Wrap offsets to this much at maximum.
     """
     assert TILE_TEMP, "make_tile called without data loaded!"
-    template = TILE_TEMP[normal.as_tuple()]
 
     assert width >= 8 and height >= 8, 'Tile is too small!' \
                                        ' ({}x{})'.format(width, height)
@@ -1496,9 +1527,21 @@ def make_tile(
 
     axis_u, axis_v = Vec.INV_AXIS[normal.axis()]
 
-    top_side = template['front'].copy(vmf_file=vmf)
+    shape_key = (normal.as_tuple(), recess_dist, thickness, width, height, bevels)
+    try:
+        shape = _TILE_SHAPES[shape_key]
+    except KeyError:
+        shape = _TILE_SHAPES[shape_key] = _make_tile_shape(
+            normal, recess_dist, thickness, width, height, bevels,
+        )
+
+    top_side, back_side, umin_side, umax_side, vmin_side, vmax_side = [
+        _place_face(vmf, face, origin, face_id)
+        for face, face_id in shape
+    ]
+
     top_side.mat = top_surf
-    top_side.translate(origin - recess_dist * normal)
+    back_side.mat = back_surf
 
     block_min = round_grid(origin) - (64, 64, 64)
 
@@ -1509,31 +1552,6 @@ def make_tile(
         block_min[axis_v] - (origin[axis_v] - height/2)
     ) % v_align
 
-    bevel_umin, bevel_umax, bevel_vmin, bevel_vmax = bevels
-
-    back_side = template['back'].copy(vmf_file=vmf)
-    back_side.mat = back_surf
-    # The offset was set to zero in the original we copy from.
-    back_side.uaxis.scale = BEVEL_BACK_SCALE[bevel_umin, bevel_umax]
-    back_side.vaxis.scale = BEVEL_BACK_SCALE[bevel_vmin, bevel_vmax]
-    # Shift the surface such that it's aligned to the minimum edge.
-    back_side.translate(origin - normal * thickness + Vec.with_axes(
-        axis_u, 4 * bevel_umin - 64,
-        axis_v, 4 * bevel_vmin - 64,
-    ))
-
-    umin_side = template[-1, 0, thickness, bevel_umin].copy(vmf_file=vmf)
-    umin_side.translate(origin + Vec.with_axes(axis_u, -width/2))
-
-    umax_side = template[1, 0, thickness, bevel_umax].copy(vmf_file=vmf)
-    umax_side.translate(origin + Vec.with_axes(axis_u, width/2))
-
-    vmin_side = template[0, -1, thickness, bevel_vmin].copy(vmf_file=vmf)
-    vmin_side.translate(origin + Vec.with_axes(axis_v, -height/2))
-
-    vmax_side = template[0, 1, thickness, bevel_vmax].copy(vmf_file=vmf)
-    vmax_side.translate(origin + Vec.with_axes(axis_v, height/2))
-
     for face in [umin_side, umax_side, vmin_side, vmax_side]:
         face.uaxis.offset %= 512
         face.vaxis.offset = 0
@@ -1557,12 +1575,94 @@ def make_tile(
     ]), top_side
 
 
+def _make_tile_shape(
+    normal: Vec,
+    recess_dist: int,
+    thickness: int,
+    width: float,
+    height: float,
+    bevels: Tuple[bool, bool, bool, bool],
+) -> List[Side]:
+    """Position the template faces for a tile, relative to its origin.
+
+    This returns the front, back, umin, umax, vmin and vmax faces, along with
+    the IDs of the template faces they came from.
+    """
+    template = TILE_TEMP[normal.as_tuple()]
+    axis_u, axis_v = Vec.INV_AXIS[normal.axis()]
+    bevel_umin, bevel_umax, bevel_vmin, bevel_vmax = bevels
+
+    top_side = template['front'].copy()
+    top_side.translate(-recess_dist * normal)
+
+    back_side = template['back'].copy()
+    # The offset was set to zero in the original we copy from.
+    back_side.uaxis.scale = BEVEL_BACK_SCALE[bevel_umin, bevel_umax]
+    back_side.vaxis.scale = BEVEL_BACK_SCALE[bevel_vmin, bevel_vmax]
+    # Shift the surface such that it's aligned to the minimum edge.
+    back_side.translate(-normal * thickness + Vec.with_axes(
+        axis_u, 4 * bevel_umin - 64,
+        axis_v, 4 * bevel_vmin - 64,
+    ))
+
+    umin_side = template[-1, 0, thickness, bevel_umin].copy()
+    umin_side.translate(Vec.with_axes(axis_u, -width/2))
+
+    umax_side = template[1, 0, thickness, bevel_umax].copy()
+    umax_side.translate(Vec.with_axes(axis_u, width/2))
+
+    vmin_side = template[0, -1, thickness, bevel_vmin].copy()
+    vmin_side.translate(Vec.with_axes(axis_v, -height/2))
+
+    vmax_side = template[0, 1, thickness, bevel_vmax].copy()
+    vmax_side.translate(Vec.with_axes(axis_v, height/2))
+
+    return [
+        (top_side, template['front'].id),
+        (back_side, template['back'].id),
+        (umin_side, template[-1, 0, thickness, bevel_umin].id),
+        (umax_side, template[1, 0, thickness, bevel_umax].id),
+        (vmin_side, template[0, -1, thickness, bevel_vmin].id),
+        (vmax_side, template[0, 1, thickness, bevel_vmax].id),
+    ]
+
+
+def _place_face(vmf: VMF, face: Side, origin: Vec, face_id: int) -> Side:
+    """Create a copy of a tile shape face, moved to the given origin.
+
+    This is equivalent to copying then translating the face, but doesn't
+    need to create and then modify the intermediate values.
+    """
+    uaxis = face.uaxis
+    vaxis = face.vaxis
+    return Side(
+        vmf,
+        [point + origin for point in face.planes],
+        face_id,
+        face.lightmap,
+        face.smooth,
+        face.mat,
+        face.ham_rot,
+        UVAxis(
+            uaxis.x, uaxis.y, uaxis.z,
+            uaxis.offset - origin.dot(uaxis.vec()) / uaxis.scale,
+            uaxis.scale,
+        ),
+        UVAxis(
+            vaxis.x, vaxis.y, vaxis.z,
+            vaxis.offset - origin.dot(vaxis.vec()) / vaxis.scale,
+            vaxis.scale,
+        ),
+    )
+
+
 def gen_tile_temp() -> None:
     """Generate the sides used to create tiles.
 
     This populates TILE_TEMP with pre-rotated solids in each direction,
      with each side identified.
     """
+    _TILE_SHAPES.clear()
 
     categories: Dict[Tuple[int, bool], Solid] = {}
     cat_names = {
@@ -1940,7 +2040,10 @@ def bevel_split(
     tile_pos: Dict[Tuple[int, int], TileDef],
 ) -> Iterator[Tuple[int, int, int, int, Tuple[bool, bool, bool, bool]]]:
     """Split the optimised segments to produce the correct bevelling."""
-    for min_u, min_v, max_u, max_v in grid_optim.optimise(rect_points):
+    for min_u, min_v, max_u, max_v in grid_optim.optimise(
+        rect_points,
+        vbsp_options.get(bool, 'exact_brush_merge'),
+    ):
         u_range = range(min_u, max_u + 1)
         v_range = range(min_v, max_v + 1)
 
@@ -2174,12 +2277,13 @@ def generate_goo(vmf: VMF) -> None:
     )
 
     goo_scale = vbsp_options.get(float, 'goo_scale')
+    exact_merge = vbsp_options.get(bool, 'exact_brush_merge')
 
     # Find key with the highest value - that gives the largest z-level.
     [best_goo, _] = max(goo_heights.items(), key=lambda x: x[1])
 
     for ((min_z, max_z), grid) in goo_pos.items():
-        for min_x, min_y, max_x, max_y in grid_optim.optimise(grid):
+        for min_x, min_y, max_x, max_y in grid_optim.optimise(grid, exact_merge):
             bbox_min = Vec(min_x, min_y, min_z) * 128
             bbox_max = Vec(max_x, max_y, max_z) * 128
             prism = vmf.make_prism(
@@ -2203,7 +2307,7 @@ def generate_goo(vmf: VMF) -> None:
     bbox_min = Vec()
 
     for (z, grid) in trig_pos.items():
-        for min_x, min_y, max_x, max_y in grid_optim.optimise(grid):
+        for min_x, min_y, max_x, max_y in grid_optim.optimise(grid, exact_merge):
             bbox_min = Vec(min_x, min_y, z) * 128
             bbox_max = Vec(max_x, max_y, z) * 128
             trig_hurt.solids.append(vmf.make_prism(
@@ -1,18 +1,23 @@
 """Various functions shared among the compiler and application."""
 from collections import deque
 import functools
+import hashlib
+import io
 import logging
 import os
+import pickle
 import stat
 import shutil
+import struct
 import sys
+import time
 from pathlib import Path
 from enum import Enum
 
 from typing import (
-    Tuple, List, Set, Sequence,
+    Tuple, List, Set, Dict, Sequence,
     Iterator, Iterable, SupportsInt, Mapping,
-    TypeVar, Any,
+    TypeVar, Any, Optional,
     Union, Callable, Generator,
     KeysView, ValuesView, ItemsView,
 )
@@ -658,6 +663,177 @@ def group_runs(iterable: Iterable[ValueT]) -> Iterator[Tuple[ValueT, int, int]]:
     yield obj, min_ind, max_ind
 
 
+# Increment to discard caches written by parse_cached() in older versions.
+_PARSE_CACHE_VERSION = 3
+# Files modified less than this many seconds ago always have their hash
+# checked, since another edit might not change the timestamp.
+_PARSE_CACHE_RACY_TIME = 2
+
+
+def parse_cached(
+    path: str,
+    parse: Callable[[io.StringIO, str], RetT],
+    encoding: str=None,
+) -> RetT:
+    """Parse a text file, caching the pickled result.
+
+    This is only a tokeniser cache - it saves the parsing step (producing a
+    Property tree, for example), not anything built from the result afterward.
+    parse() is passed a file-like object and the filename, like
+    Property.parse(). The caches are stored in the settings folder, not next
+    to the file.
+
+    If the size and modification time of the file match those in the cache,
+    it's used directly. Otherwise the file is hashed, so touching it without
+    changes doesn't require a reparse. Timestamps are only trusted if they're
+    precise enough to show an edit, see _parse_cache_key(). If the cache
+    can't be read or written, the file is parsed normally.
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        cache_path = conf_location('cache/{}.pickle'.format(
+            hashlib.sha1(os.path.normcase(abs_path).encode('utf8')).hexdigest()
+        ))
+    except OSError:  # No settings folder.
+        cache_path = None
+
+    file_stat = os.stat(path)
+    data = None
+    version = (_PARSE_CACHE_VERSION, BEE_VERSION, abs_path)
+    file_key = _parse_cache_key(file_stat)
+    digest = None
+
+    if cache_path is not None:
+        try:
+            with open(cache_path, 'rb') as f:
+                cache_version, cache_key, cache_digest = pickle.load(f)
+                if cache_version == version:
+                    if file_key is not None and cache_key == file_key:
+                        return pickle.load(f)
+                    data = _read_bytes(path)
+                    digest = hashlib.sha256(data).digest()
+                    if cache_digest == digest:
+                        result = pickle.load(f)
+                        if cache_key != file_key:
+                            # Only the timestamp changed, update that.
+                            _write_parse_cache(
+                                cache_path, version, file_key, digest, result,
+                            )
+                        return result
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logging.getLogger(__name__).warning(
+                'Could not read cache "{}":'.format(cache_path),
+                exc_info=True,
+            )
+
+    if data is None:
+        data = _read_bytes(path)
+    # Match the newline handling of open() in text mode.
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=encoding).read()
+    result = parse(io.StringIO(text), path)
+
+    if cache_path is not None:
+        if digest is None:
+            digest = hashlib.sha256(data).digest()
+        _write_parse_cache(cache_path, version, file_key, digest, result)
+    return result
+
+
+def _parse_cache_key(file_stat: os.stat_result) -> Optional[Tuple[int, int]]:
+    """Return the size and modification time parse_cached() can trust.
+
+    If None, the file's hash needs to be checked instead. That's the case if
+    the timestamp is a whole number of seconds, which indicates the
+    filesystem doesn't store more (FAT only stores every two seconds).
+    Another edit could then keep the same size and time. Files modified
+    very recently could similarly change again within the same tick.
+    """
+    if file_stat.st_mtime_ns % 1000000000 == 0:
+        return None
+    if time.time() - file_stat.st_mtime < _PARSE_CACHE_RACY_TIME:
+        return None
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def _read_bytes(path: str) -> bytes:
+    """Read the contents of a file."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_parse_cache(
+    cache_path: Path,
+    version: Tuple[int, str, str],
+    file_key: Optional[Tuple[int, int]],
+    digest: bytes,
+    result: object,
+) -> None:
+    """Write out a cache file for parse_cached().
+
+    The key is pickled first, so it can be checked without loading the
+    result.
+    """
+    temp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump((version, file_key, digest), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except Exception:
+        logging.getLogger(__name__).warning(
+            'Could not write cache "{}":'.format(cache_path),
+            exc_info=True,
+        )
+
+
+# Identifies files written by write_blob_index().
+_BLOB_INDEX_MAGIC = b'BEE2IDX1'
+_BLOB_INDEX_ENTRY = struct.Struct('<HII')
+
+
+def write_blob_index(path: str, blobs: Dict[str, bytes]) -> None:
+    """Write a set of named blobs into one file, with an index at the start.
+
+    This allows read_blob_index() to locate a blob without reading the rest.
+    """
+    names = [name.encode('utf8') for name in blobs]
+    header_size = len(_BLOB_INDEX_MAGIC) + 4 + sum(
+        _BLOB_INDEX_ENTRY.size + len(name)
+        for name in names
+    )
+    header = [_BLOB_INDEX_MAGIC, struct.pack('<I', len(blobs))]
+    offset = header_size
+    for name, blob in zip(names, blobs.values()):
+        header.append(_BLOB_INDEX_ENTRY.pack(len(name), offset, len(blob)))
+        header.append(name)
+        offset += len(blob)
+
+    with open(path + '.tmp', 'wb') as f:
+        f.writelines(header)
+        f.writelines(blobs.values())
+    os.replace(path + '.tmp', path)
+
+
+def read_blob_index(path: str) -> Dict[str, Tuple[int, int]]:
+    """Read the index of a file written by write_blob_index().
+
+    This returns a dict mapping each name to the offset and size of its blob.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_BLOB_INDEX_MAGIC)) != _BLOB_INDEX_MAGIC:
+            raise ValueError('"{}" is not a blob index file!'.format(path))
+        [count] = struct.unpack('<I', f.read(4))
+        index = {}
+        for _ in range(count):
+            name_len, offset, size = _BLOB_INDEX_ENTRY.unpack(
+                f.read(_BLOB_INDEX_ENTRY.size)
+            )
+            index[f.read(name_len).decode('utf8')] = (offset, size)
+    return index
+
+
 def restart_app() -> NoReturn:
     """Restart this python application.
 
@@ -36,8 +36,9 @@ import faithplate
 import comp_consts as consts
 import cubes
 import barriers
+import vbsp_profile
 
-from typing import Any, Dict, Tuple, List, Set
+from typing import Any, Dict, Tuple, List, Set, TextIO
 
 COND_MOD_NAME = 'VBSP'
 
@@ -97,9 +98,13 @@ PRESET_CLUMPS = []  # Additional clumps set by conditions, for certain areas.
 
 def load_settings() -> Tuple[antlines.AntType, antlines.AntType]:
     """Load in all our settings from vbsp_config."""
+    # Only the tokenising is cached, everything below is rebuilt each time.
     try:
-        with open("bee2/vbsp_config.cfg", encoding='utf8') as config:
-            conf = Property.parse(config, 'bee2/vbsp_config.cfg')
+        conf = utils.parse_cached(
+            'bee2/vbsp_config.cfg',
+            Property.parse,
+            encoding='utf8',
+        )
     except FileNotFoundError:
         LOGGER.warning('Error: No vbsp_config file!')
         conf = Property(None, [])
@@ -631,12 +636,12 @@ def add_screenshot_logic() -> None:
     if BEE2_config.get_val(
         'Screenshot', 'type', 'PETI'
     ).upper() == 'AUTO' and IS_PREVIEW:
-        VMF.create_ent(
+        conditions.index_inst(VMF.create_ent(
             classname='func_instance',
             file='instances/bee2/logic/screenshot_logic.vmf',
             origin=vbsp_options.get(Vec, 'global_ents_loc'),
             angles='0 0 0',
-        )
+        ))
         LOGGER.info('Added Screenshot Logic')
 
 
@@ -791,7 +796,7 @@ def set_elev_videos() -> None:
         LOGGER.warning('Invalid elevator video type!')
         return
 
-    transition_ents = instanceLocs.resolve('[transitionents]')
+    transition_ents = instanceLocs.resolve_set('[transitionents]')
     for inst in VMF.by_class['func_instance']:
         if inst['file'].casefold() not in transition_ents:
             continue
@@ -1117,7 +1122,7 @@ def calc_rand_seed() -> str:
 
      This ensures textures remain the same when the map is recompiled.
     """
-    amb_light = instanceLocs.resolve('<ITEM_POINT_LIGHT>')
+    amb_light = instanceLocs.resolve_set('<ITEM_POINT_LIGHT>')
     lst = [
         inst['targetname'] or '-'  # If no targ
         for inst in
@@ -1251,8 +1256,8 @@ def set_barrier_frame_type() -> None:
             (pos - grid_pos).norm().as_tuple()
         ] = barrier_type
 
-    barrier_files = instanceLocs.resolve('<ITEM_BARRIER>')
-    glass_file = instanceLocs.resolve('[glass_128]')
+    barrier_files = instanceLocs.resolve_set('<ITEM_BARRIER>')
+    glass_file = instanceLocs.resolve_set('[glass_128]')
     for inst in VMF.by_class['func_instance']:
         if inst['file'].casefold() not in barrier_files:
             continue
@@ -1785,10 +1790,215 @@ def save(path: str) -> None:
     LOGGER.info("Saving New Map...")
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with AtomicWriter(path) as f:
-        VMF.export(dest_file=f, inc_version=True)
+        write_vmf(VMF, f)
     LOGGER.info("Complete!")
 
 
+def write_vmf(vmf: VLib.VMF, file: TextIO) -> None:
+    """Write out the map, in the form VBSP needs.
+
+    This produces the same text as VMF.export(inc_version=True), but brushes
+    are formatted directly into one chunk each. Maps have thousands of
+    generated brushes, so that's most of the time spent saving.
+    Unlike export(), the VMF isn't modified.
+    """
+    map_ver = vmf.map_ver + 1
+    file.write(
+        'versioninfo\n{{\n'
+        '\t"editorversion" "{}"\n'
+        '\t"editorbuild" "{}"\n'
+        '\t"mapversion" "{}"\n'
+        '\t"formatversion" "{}"\n'
+        '\t"prefab" "{}"\n'
+        '}}\n'.format(
+            vmf.hammer_ver,
+            vmf.hammer_build,
+            map_ver,
+            vmf.format_ver,
+            srctools.bool_as_int(vmf.is_prefab),
+        )
+    )
+    file.write('visgroups\n{\n')
+    for vis in vmf.vis_tree:
+        vis.export(file, ind='\t')
+    file.write('}\n')
+
+    file.write(
+        'viewsettings\n{{\n'
+        '\t"bSnapToGrid" "{}"\n'
+        '\t"bShowGrid" "{}"\n'
+        '\t"bShowLogicalGrid" "{}"\n'
+        '\t"nGridSpacing" "{}"\n'
+        '\t"bShow3DGrid" "{}"\n'
+        '}}\n'.format(
+            srctools.bool_as_int(vmf.snap_grid),
+            srctools.bool_as_int(vmf.show_grid),
+            srctools.bool_as_int(vmf.show_logic_grid),
+            vmf.grid_spacing,
+            srctools.bool_as_int(vmf.show_3d_grid),
+        )
+    )
+
+    # The worldspawn version should always match the global value,
+    # and the classname must be worldspawn or VBSP crashes.
+    _write_brush_ent(file, vmf.spawn, 'world', {
+        'mapversion': str(map_ver),
+        'classname': 'worldspawn',
+    })
+
+    for ent in vmf.entities:
+        if ent.is_brush():
+            _write_brush_ent(file, ent, 'entity')
+        else:
+            ent.export(file)
+
+    file.write('cameras\n{\n')
+    file.write('\t"activecamera" "{}"\n'.format(
+        vmf.active_cam if vmf.cameras else -1
+    ))
+    for cam in vmf.cameras:
+        cam.export(file, '\t')
+    file.write('}\n')
+
+    file.write('cordons\n{\n')
+    if vmf.cordons:
+        file.write('\t"active" "{}"\n'.format(
+            srctools.bool_as_int(vmf.cordon_enabled)
+        ))
+        for cord in vmf.cordons:
+            cord.export(file, '\t')
+    else:
+        file.write('\t"active" "0"\n')
+    file.write('}\n')
+
+    if vmf.quickhide_count > 0:
+        file.write('quickhide\n{{\n\t"count" "{}"\n}}\n'.format(
+            vmf.quickhide_count,
+        ))
+
+
+def _write_brush_ent(
+    file: TextIO,
+    ent: Entity,
+    block_name: str,
+    override: Dict[str, str]=srctools.EmptyMapping,
+) -> None:
+    """Write out the worldspawn, or a brush entity.
+
+    Keys in override are written in place of the entity's own values.
+    """
+    ind = '\t' if ent.hidden else ''
+    keys = dict(ent.keys)
+    keys.update(override)
+    chunk = []
+    if ent.hidden:
+        chunk.append('hidden\n{\n')
+    chunk.append('{0}{1}\n{0}{{\n{0}\t"id" "{2}"\n'.format(
+        ind, block_name, ent.id,
+    ))
+    for key, value in sorted(keys.items()):
+        chunk.append('{}\t"{}" "{}"\n'.format(ind, key, value))
+    file.write(''.join(chunk))
+    ent.fixup.export(file, ind)
+
+    for solid in ent.solids:
+        _write_solid(file, solid, ind + '\t')
+
+    chunk = []
+    if ent.outputs:
+        chunk.append(ind + '\tconnections\n' + ind + '\t{\n')
+        for out in ent.outputs:
+            chunk.append(ind + '\t\t' + out.as_keyvalue())
+        chunk.append(ind + '\t}\n')
+
+    chunk.append('{0}\teditor\n{0}\t{{\n{0}\t\t"color" "{1}"\n'.format(
+        ind, ent.editor_color,
+    ))
+    for group in ent.groups:
+        chunk.append('{}\t\t"groupid" "{}"\n'.format(ind, group))
+    for group in ent.visgroup_ids:
+        chunk.append('{}\t\t"visgroupid" "{}"\n'.format(ind, group))
+    chunk.append(
+        '{0}\t\t"visgroupshown" "{1}"\n'
+        '{0}\t\t"visgroupautoshown" "{2}"\n'
+        '{0}\t\t"logicalpos" "{3}"\n'.format(
+            ind,
+            srctools.bool_as_int(ent.vis_shown),
+            srctools.bool_as_int(ent.vis_auto_shown),
+            ent.logical_pos,
+        )
+    )
+    if ent.comments:
+        chunk.append('{}\t\t"comments" "{}"\n'.format(ind, ent.comments))
+    chunk.append(ind + '\t}\n' + ind + '}\n')
+    if ent.hidden:
+        chunk.append('}\n')
+    file.write(''.join(chunk))
+
+
+def _write_solid(file: TextIO, solid: VLib.Solid, ind: str) -> None:
+    """Write out a brush, the same as Solid.export()."""
+    chunk = []
+    if solid.hidden:
+        chunk.append(ind + 'hidden\n' + ind + '{\n')
+        ind += '\t'
+    chunk.append('{0}solid\n{0}{{\n{0}\t"id" "{1}"\n'.format(ind, solid.id))
+    for side in solid.sides:
+        if side.is_disp:
+            # Rare, let srctools handle the details.
+            buf = StringIO()
+            side.export(buf, ind + '\t')
+            chunk.append(buf.getvalue())
+            continue
+        plane_a, plane_b, plane_c = side.planes
+        chunk.append(
+            '{0}\tside\n{0}\t{{\n'
+            '{0}\t\t"id" "{1}"\n'
+            '{0}\t\t"plane" "({2}) ({3}) ({4})"\n'
+            '{0}\t\t"material" "{5}"\n'
+            '{0}\t\t"uaxis" "{6}"\n'
+            '{0}\t\t"vaxis" "{7}"\n'
+            '{0}\t\t"rotation" "{8:g}"\n'
+            '{0}\t\t"lightmapscale" "{9}"\n'
+            '{0}\t\t"smoothing_groups" "{10}"\n'
+            '{0}\t}}\n'.format(
+                ind,
+                side.id,
+                plane_a, plane_b, plane_c,
+                side.mat,
+                side.uaxis,
+                side.vaxis,
+                side.ham_rot,
+                side.lightmap,
+                side.smooth,
+            )
+        )
+
+    chunk.append('{0}\teditor\n{0}\t{{\n{0}\t\t"color" "{1}"\n'.format(
+        ind, solid.editor_color,
+    ))
+    if solid.group_id is not None:
+        chunk.append('{}\t\t"groupid" "{}"\n'.format(ind, solid.group_id))
+    for group in solid.visgroup_ids:
+        chunk.append('{}\t\t"visgroupid" "{}"\n'.format(ind, group))
+    chunk.append(
+        '{0}\t\t"visgroupshown" "{1}"\n'
+        '{0}\t\t"visgroupautoshown" "{2}"\n'.format(
+            ind,
+            srctools.bool_as_int(solid.vis_shown),
+            srctools.bool_as_int(solid.vis_auto_shown),
+        )
+    )
+    if solid.cordon_solid is not None:
+        chunk.append('{}\t\t"cordonsolid" "{}"\n'.format(
+            ind, solid.cordon_solid,
+        ))
+    chunk.append(ind + '\t}\n' + ind + '}\n')
+    if solid.hidden:
+        chunk.append(ind[:-1] + '}\n')
+    file.write(''.join(chunk))
+
+
 def run_vbsp(vbsp_args, path, new_path=None) -> None:
     """Execute the original VBSP, copying files around so it works correctly.
 
@@ -1937,11 +2147,93 @@ def process_vbsp_fail(output: str) -> None:
     BEE2_config.save_check()
 
 
+def convert_map(path: str, new_path: str) -> None:
+    """Convert a PeTI map, and save it to new_path.
+
+    This does everything except running the original VBSP.
+    """
+    global MAP_RAND_SEED
+
+    LOGGER.info("Loading settings...")
+    vbsp_profile.begin_phase('load_settings')
+    ant_floor, ant_wall = load_settings()
+
+    vbsp_profile.begin_phase('load_map')
+    load_map(path)
+    vbsp_profile.begin_phase('instance_traits')
+    instance_traits.set_traits(VMF)
+
+    vbsp_profile.begin_phase('antlines')
+    ant, side_to_antline = antlines.parse_antlines(VMF)
+
+    # Requires instance traits!
+    vbsp_profile.begin_phase('connections')
+    connections.calc_connections(
+        VMF,
+        ant,
+        texturing.OVERLAYS.get_all('shapeframe'),
+        settings['style_vars']['enableshapesignageframe'],
+        ant_floor,
+        ant_wall,
+    )
+
+    vbsp_profile.begin_phase('map_info')
+    MAP_RAND_SEED = calc_rand_seed()
+
+    all_inst = get_map_info()
+
+    vbsp_profile.begin_phase('brushLoc')
+    brushLoc.POS.read_from_map(VMF, settings['has_attr'])
+
+    vbsp_profile.begin_phase('fizzler')
+    fizzler.parse_map(VMF, settings['has_attr'])
+    vbsp_profile.begin_phase('barriers')
+    barriers.parse_map(VMF, settings['has_attr'])
+
+    vbsp_profile.begin_phase('conditions_init')
+    conditions.init(
+        seed=MAP_RAND_SEED,
+        inst_list=all_inst,
+        vmf_file=VMF,
+    )
+
+    vbsp_profile.begin_phase('tiling_analyse')
+    tiling.gen_tile_temp()
+    tiling.analyse_map(VMF, side_to_antline)
+
+    del side_to_antline
+
+    texturing.setup(MAP_RAND_SEED, list(tiling.TILES.values()))
+
+    vbsp_profile.begin_phase('conditions')
+    conditions.check_all()
+    vbsp_profile.begin_phase('extra_ents')
+    add_extra_ents(GAME_MODE)
+
+    change_ents()
+    vbsp_profile.begin_phase('tiling')
+    tiling.generate_brushes(VMF)
+    vbsp_profile.begin_phase('faithplates')
+    faithplate.gen_faithplates(VMF)
+    vbsp_profile.begin_phase('overlays')
+    change_overlays()
+    vbsp_profile.begin_phase('barriers_gen')
+    barriers.make_barriers(VMF)
+    fix_worldspawn()
+
+    # Ensure all VMF outputs use the correct separator.
+    for ent in VMF.entities:
+        for out in ent.outputs:
+            out.comma_sep = False
+
+    vbsp_profile.begin_phase('save')
+    save(new_path)
+
+
 def main() -> None:
     """Main program code.
 
     """
-    global MAP_RAND_SEED
     LOGGER.info("BEE{} VBSP hook initiallised.", utils.BEE_VERSION)
 
     conditions.import_conditions()  # Import all the conditions and
@@ -1979,6 +2271,9 @@ def main() -> None:
             '-verbose: A default VBSP command, has the same effect as above.\n'
             '-force_peti: Force enabling map conversion. \n'
             "-force_hammer: Don't convert the map at all.\n"
+            '-bee2_profile: Time each part of the compile, and write a\n'
+            '  report to bee2/vbsp_profile.json.\n'
+            '-bee2_cprofile: Also run cProfile over the compile.\n'
             '-entity_limit: A default VBSP command, this is inspected to'
             'determine if the map is PeTI or not.'
         )
@@ -2000,12 +2295,25 @@ def main() -> None:
         if a == '-force_peti' or a == '-force_hammer':
             new_args[i] = ''
             old_args[i] = ''
+        if a.casefold() in ('-bee2_profile', '-bee2_cprofile'):
+            new_args[i] = ''
+            old_args[i] = ''
         # Strip the entity limit, and the following number
         if a == '-entity_limit':
             new_args[i] = ''
             if len(new_args) > i+1 and new_args[i+1] == '1750':
                 new_args[i+1] = ''
 
+    use_cprofile = (
+        '-bee2_cprofile' in folded_args or
+        BEE2_config.get_bool('General', 'profile_cprofile')
+    )
+    if (
+        use_cprofile or '-bee2_profile' in folded_args or
+        BEE2_config.get_bool('General', 'profile_compile')
+    ):
+        vbsp_profile.enable(use_cprofile)
+
     LOGGER.info('Map path is "' + path + '"')
     LOGGER.info('New path: "' + new_path + '"')
     if path == "":
@@ -2024,7 +2332,6 @@ def main() -> None:
         # limit to determine if we should convert
         is_hammer = "-entity_limit 1750" not in args
 
-
     if is_hammer:
         LOGGER.warning("Hammer map detected! skipping conversion..")
         run_vbsp(
@@ -2034,62 +2341,8 @@ def main() -> None:
     else:
         LOGGER.info("PeTI map detected!")
 
-        LOGGER.info("Loading settings...")
-        ant_floor, ant_wall = load_settings()
-
-        load_map(path)
-        instance_traits.set_traits(VMF)
-
-        ant, side_to_antline = antlines.parse_antlines(VMF)
-
-        # Requires instance traits!
-        connections.calc_connections(
-            VMF,
-            ant,
-            texturing.OVERLAYS.get_all('shapeframe'),
-            settings['style_vars']['enableshapesignageframe'],
-            ant_floor,
-            ant_wall,
-        )
-
-        MAP_RAND_SEED = calc_rand_seed()
-
-        all_inst = get_map_info()
-
-        brushLoc.POS.read_from_map(VMF, settings['has_attr'])
-
-        fizzler.parse_map(VMF, settings['has_attr'])
-        barriers.parse_map(VMF, settings['has_attr'])
-
-        conditions.init(
-            seed=MAP_RAND_SEED,
-            inst_list=all_inst,
-            vmf_file=VMF,
-        )
-
-        tiling.gen_tile_temp()
-        tiling.analyse_map(VMF, side_to_antline)
-
-        del side_to_antline
-
-        texturing.setup(MAP_RAND_SEED, list(tiling.TILES.values()))
-
-        conditions.check_all()
-        add_extra_ents(GAME_MODE)
-
-        change_ents()
-        tiling.generate_brushes(VMF)
-        faithplate.gen_faithplates(VMF)
-        change_overlays()
-        barriers.make_barriers(VMF)
-        fix_worldspawn()
-
-        # Ensure all VMF outputs use the correct separator.
-        for ent in VMF.entities:
-            for out in ent.outputs:
-                out.comma_sep = False
-
-        save(new_path)
+        convert_map(path, new_path)
+        vbsp_profile.begin_phase('vbsp')
         run_vbsp(
             vbsp_args=new_args,
             path=path,
@@ -2098,7 +2351,9 @@ def main() -> None:
 
     # We always need to do this - VRAD can't easily determine if the map is
     # a Hammer one.
+    vbsp_profile.begin_phase('vrad_config')
     make_vrad_config(is_peti=not is_hammer)
+    vbsp_profile.write_report()
     LOGGER.info("BEE2 VBSP hook finished!")
 
 
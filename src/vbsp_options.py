@@ -322,6 +322,12 @@ DEFAULTS = [
         """The scale on angled/flip panel squarebeams textures.
         """, fallback='edge_scale'),
 
+    Opt('exact_brush_merge', False,
+        """Use a slower algorithm to merge tiles, goo and glass into brushes.
+
+        This produces the fewest possible brushes, instead of an
+        approximation.
+        """),
     Opt('tile_texture_lock', True,
         """If disabled, reset offsets for all white/black brushes.
 
@@ -0,0 +1,161 @@
+"""Records how long each part of the VBSP compile takes.
+
+Phase timings are always collected, since that's cheap. If enabled (via the
+-bee2_profile argument or compile.cfg), conditions, results and flags are
+also timed individually, and a JSON report is written next to the log.
+Optionally cProfile can be run over the whole compile as well.
+"""
+import cProfile
+import json
+import os
+import pstats
+from collections import defaultdict
+from time import perf_counter
+
+import srctools.logger
+
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+LOGGER = srctools.logger.get_logger(__name__)
+
+T = TypeVar('T')
+
+# Where the report is saved, next to vbsp.log.
+REPORT_LOC = 'bee2/vbsp_profile.json'
+CPROFILE_LOC = 'bee2/vbsp_profile.prof'
+# The number of functions from cProfile to include in the JSON report.
+CPROFILE_TOP = 40
+
+# If set, conditions/results/flags are timed.
+ENABLED = False
+
+# The phases in order, and how long each took.
+PHASES: List[Tuple[str, float]] = []
+_cur_phase: Optional[Tuple[str, float]] = None
+
+# Category -> name -> [call count, total time].
+TIMINGS: Dict[str, Dict[str, List]] = defaultdict(
+    lambda: defaultdict(lambda: [0, 0.0])
+)
+
+_profiler: Optional[cProfile.Profile] = None
+
+
+def enable(use_cprofile: bool=False) -> None:
+    """Turn on detailed timing, and optionally cProfile."""
+    global ENABLED, _profiler
+    if not ENABLED:
+        LOGGER.info('Compile profiling enabled.')
+    ENABLED = True
+    if use_cprofile and _profiler is None:
+        LOGGER.info('Running cProfile over the compile.')
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def begin_phase(name: str) -> None:
+    """Start timing a new phase of the compile, ending the previous one."""
+    global _cur_phase
+    end_phase()
+    _cur_phase = name, perf_counter()
+
+
+def end_phase() -> None:
+    """Finish the current phase, if any."""
+    global _cur_phase
+    if _cur_phase is not None:
+        name, start = _cur_phase
+        PHASES.append((name, perf_counter() - start))
+        _cur_phase = None
+
+
+def add_time(category: str, name: str, duration: float) -> None:
+    """Record a single call of something in a category."""
+    timing = TIMINGS[category][name]
+    timing[0] += 1
+    timing[1] += duration
+
+
+def call_timed(category: str, name: str, func: Callable[..., T], *args) -> T:
+    """Call a function, recording the time it took."""
+    start = perf_counter()
+    try:
+        return func(*args)
+    finally:
+        add_time(category, name, perf_counter() - start)
+
+
+def _sorted_timings(timings: Dict[str, List]) -> List[dict]:
+    """Convert a timing category into JSON, slowest first."""
+    return [
+        {'name': name, 'calls': calls, 'time': round(total, 6)}
+        for name, (calls, total) in
+        sorted(timings.items(), key=lambda kv: kv[1][1], reverse=True)
+    ]
+
+
+def _cprofile_stats(profiler: cProfile.Profile) -> List[dict]:
+    """Pull out the slowest functions from the cProfile data."""
+    stats = pstats.Stats(profiler).stats  # type: ignore
+    funcs = sorted(
+        stats.items(),
+        # Cumulative time.
+        key=lambda kv: kv[1][3],
+        reverse=True,
+    )[:CPROFILE_TOP]
+    return [
+        {
+            'func': '{}:{}({})'.format(filename, line, func),
+            'calls': ncalls,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+        }
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in funcs
+    ]
+
+
+def write_report() -> None:
+    """Log the phase timings, and write the report if enabled."""
+    global _profiler
+    end_phase()
+    if not PHASES:
+        return
+    total = sum(duration for name, duration in PHASES)
+    LOGGER.info(
+        'Compile phases ({:.3f}s total):\n{}',
+        total,
+        '\n'.join(
+            '{:>24}: {:.3f}s'.format(name, duration)
+            for name, duration in PHASES
+        ),
+    )
+    if not ENABLED:
+        return
+
+    report = {
+        'total': round(total, 6),
+        'phases': [
+            {'name': name, 'time': round(duration, 6)}
+            for name, duration in PHASES
+        ],
+    }
+    for category, timings in TIMINGS.items():
+        report[category] = _sorted_timings(timings)
+
+    os.makedirs(os.path.dirname(REPORT_LOC), exist_ok=True)
+    if _profiler is not None:
+        _profiler.disable()
+        report['cprofile'] = _cprofile_stats(_profiler)
+        try:
+            _profiler.dump_stats(CPROFILE_LOC)
+        except OSError:
+            LOGGER.warning('Could not save cProfile data:', exc_info=True)
+        _profiler = None
+
+    try:
+        with open(REPORT_LOC, 'w') as f:
+            json.dump(report, f, indent=1)
+    except OSError:
+        LOGGER.warning('Could not save profile report:', exc_info=True)
+    else:
+        LOGGER.info('Profile report written to "{}".', REPORT_LOC)
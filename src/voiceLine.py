@@ -260,13 +260,13 @@ def add_quote(quote: Property, targetname, quote_loc: Vec, use_dings=False):
         name = prop.name.casefold()
 
         if name == 'file':
-            vmf_file.create_ent(
+            conditions.index_inst(vmf_file.create_ent(
                 classname='func_instance',
                 targetname='',
                 file=INST_PREFIX + prop.value,
                 origin=quote_loc,
                 fixup_style='2',  # No fixup
-            )
+            ))
         elif name == 'choreo':
             # If the property has children, the children are a set of sequential
             # voice lines.
@@ -448,14 +448,14 @@ def add_voice(
     quote_loc = get_studio_loc()
     if quote_base:
         LOGGER.info('Adding Base instance!')
-        vmf_file.create_ent(
+        conditions.index_inst(vmf_file.create_ent(
             classname='func_instance',
             targetname='voice',
             file=INST_PREFIX + quote_base,
             angles='0 0 0',
             origin=quote_loc,
             fixup_style='0',
-        )
+        ))
 
     # Either box in with nodraw, or place the voiceline studio.
     has_studio = conditions.monitor.make_voice_studio(vmf_file)
@@ -512,14 +512,14 @@ def add_voice(
     for ind, file in enumerate(QUOTE_EVENTS.values()):
         if not file:
             continue
-        vmf_file.create_ent(
+        conditions.index_inst(vmf_file.create_ent(
             classname='func_instance',
             targetname='voice_event_' + str(ind),
             file=file,
             angles='0 0 0',
             origin=quote_loc,
             fixup_style='0',
-        )
+        ))
 
     # Determine the flags that enable/disable specific lines based on which
     # players are used.